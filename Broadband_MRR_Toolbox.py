@@ -7,6 +7,7 @@ import tkinter as tk
 from tkinter import ttk
 from ttkthemes import ThemedStyle
 import os
+import multiprocessing
 from Pages.EnantiomericExcess import EnantiomericExcess
 from Pages.FFT import FFT
 from Pages.FinalFit import FinalFit
@@ -175,4 +176,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Required for process pools (Spectrum.coadd_fids) in the frozen executable.
+    multiprocessing.freeze_support()
     main()
@@ -16,8 +16,9 @@ from threading import Thread
 import time
 import glob
 import numpy as np
-import scipy
 import os
+import Spectrum
+import Text_Writer
 
 
 def auto_save_fid(directory=None, scope=None, sample_name=None, inst_setup=None, save_every=None,
@@ -93,7 +94,7 @@ def auto_save_fid(directory=None, scope=None, sample_name=None, inst_setup=None,
 
 def auto_save_fft(directory=None, sr=None, ff=None, kb=None, trl=None, fstart=None, fstop=None):
     """
-    Open the newest FID in 'directory' and calculate FFT. Save FFT as *.ft file.
+    Open the newest FID (*.txt or *.fid) in 'directory' and calculate FFT. Save FFT as *.ft file.
 
     Parameters:
         directory (str):
@@ -143,7 +144,9 @@ def auto_save_fft(directory=None, sr=None, ff=None, kb=None, trl=None, fstart=No
         elif sr == 50:
             fstop = 18000
 
-    cwd_file_list = glob.glob(directory + '/*.txt')
+    # Raise if the previous background *.ft write failed, instead of continuing without it.
+    Text_Writer.wait()
+    cwd_file_list = glob.glob(directory + '/*.txt') + glob.glob(directory + '/*.fid')
     newest_file = max(cwd_file_list, key=os.path.getctime)
     waveform = os.path.join(directory, newest_file)
     fid_fname = os.path.basename(waveform)
@@ -154,38 +157,25 @@ def auto_save_fft(directory=None, sr=None, ff=None, kb=None, trl=None, fstart=No
         ext='.ft')
 
     sr = sr * 1E9
-    fid = []
-    with open(waveform, 'r') as f:
-        for row in f:
-            fid.append(float(row.split()[-1]))
-    fid = np.array(fid)
+    fid = np.asarray(Spectrum.FID(waveform, srate=sr).fid[:, -1], dtype=float)
 
-    # ________________________________time_domain_fraction__________________________
+    # ________________time_domain_fraction, kaiser_filtering, zero_padding________________
+    # Window and zero-pad buffer are shared with every other FID of the same length and settings.
     halfway_index = round(len(fid) * ff)
-    partial_fid = fid[0:halfway_index]
-
-    # _______________________________kaiser_filering________________________________
-    kaiser = np.kaiser(halfway_index, kb)
-    window_function = np.multiply(partial_fid, kaiser)
-
-    # _________________________________zero_padding_________________________________
     num_data_points = round(trl * 1E-6 * sr)
-    zp_fid = np.zeros((num_data_points,))
-    zp_fid[0:len(window_function)] = window_function
+    plan = Spectrum.fft_plan(halfway_index, kb, num_data_points)
 
-    fft = scipy.fftpack.fft(zp_fid) / 100
-    freq = scipy.fftpack.fftfreq(len(zp_fid), d=(1 / sr)) / 1E6
+    fft = plan.rfft(fid) / 100
+    # Same axis as scipy.fftpack.fftfreq, so rounding at fstop keeps the archive row count.
+    freq = np.fft.fftfreq(num_data_points, d=(1 / sr))[:len(fft)] / 1E6
 
-    freqs = []
-    ft_magnitude = []
-    for i, row in enumerate(freq):
-        if fstart <= row <= fstop:
-            freqs.append('%.4f' % row)
-            ft_magnitude.append(abs(fft[i]))
+    in_band = (freq >= fstart) & (freq <= fstop)
+    ft_magnitude = np.abs(fft[in_band])
 
-    fft = np.column_stack((freqs, ft_magnitude))
+    fft = np.column_stack((freq[in_band], ft_magnitude))
     os.chdir(directory)
-    np.savetxt(fft_fname, fft, fmt='%s', delimiter=' ')
+    Text_Writer.savetxt(
+        os.path.join(directory, fft_fname), fft, fmt=['%.4f', '%s'], delimiter=' ', background=True)
     # return fft
 
 
@@ -220,6 +210,7 @@ def single(save_every, scope=None, perform_fft=True, **kwargs):
     scope.clear()
     if perform_fft:
         auto_save_fft(**kwargs)
+        Text_Writer.wait()
 
 
 def continuous(event, save_every, scope=None, perform_fft=True, **kwargs):
@@ -259,6 +250,7 @@ def continuous(event, save_every, scope=None, perform_fft=True, **kwargs):
         if perform_fft:
             auto_save_fft(**kwargs)
     scope.stop()
+    Text_Writer.wait()
 
 
 def temperature_sequence(sequence, save_every, scope=None, **kwargs):
@@ -21,6 +21,7 @@ import Pages.PageFormat as page_funcs
 from Instrument_Drivers.Oscilloscope_Driver import OscilloscopeDriver
 import minimalmodbus
 import Spectrum
+import Text_Writer
 
 label_fmt = {'justify': 'right', 'style': 'h10b.TLabel', 'width': 17, 'anchor': 'e'}
 
@@ -130,6 +131,14 @@ class AutoController:
             Default: 80
         self.event (threading.Event):
             self.event.is_set() to abort thread.
+        self.running_coadd (Spectrum.RunningCoAdd):
+            Cumulative spectrum of the current continuous run. None outside continuous().
+            Default: None
+        self.fft_settings (dict):
+            FFT settings (sr, ff, kb, trl, fftlower, fftupper) read when the current continuous
+            run started. Used for the running co-add and every *.ft file of the run, so editing
+            the GUI mid-run does not mix settings. None outside continuous().
+            Default: None
     Methods:
         check_instsetup()
             Confirm oscilloscope is set up for the requested spectral region.
@@ -178,6 +187,12 @@ class AutoController:
             Save waveform in self.pickett_dir folder. File is named using information from GUI.
         auto_save_fft()
             Calculate FFT of most recent waveform saved in self.pickett_dir.
+        read_fft_settings()
+            Return FFT settings in the GUI as dict.
+        check_writes()
+            Wait for background *.ft writes and show an error if any failed.
+        auto_save_running_coadd()
+            Save cumulative spectrum of the current continuous run.
     BUTTONS:
         BROWSE
             Open file explorer to select a directory. Spectra saved in directory.
@@ -221,6 +236,7 @@ class AutoController:
                'awg_chirp_list': 'None'}
 
     def __init__(self, master, scope_module, awg_module, temp_module):
+        self.master = master
         self.scope_module = scope_module
         self.awg_module = awg_module
         self.temp_module = temp_module
@@ -272,6 +288,8 @@ class AutoController:
         self.trl.set(AutoController.default['trl'])
 
         self.event = Event()
+        self.running_coadd = None
+        self.fft_settings = None
 
         h8RB = 'h8.TRadiobutton'
         h8bB = 'h8b.TButton'
@@ -712,7 +730,11 @@ class AutoController:
         elif mode == 'chirp sequence':
             def thread_func():
                 self.chirp_sequence(self.chirpseq.get())
-        t = Thread(name='auto run', target=thread_func)
+
+        def run():
+            thread_func()
+            self.check_writes()  # Report failed *.ft writes before the run is considered done.
+        t = Thread(name='auto run', target=run)
         t.start()
 
     def auto_stop(self, clear_scope=False, awg_stop=False, lower_temp=False):
@@ -795,11 +817,19 @@ class AutoController:
         Save FID waveform after defined number of FIDs signal averaged, clear, restart, repeat
         until self.event.set().
 
+        If auto FFT is on, a cumulative spectrum of the run is updated from each FFT and saved
+        after every waveform. See auto_save_running_coadd().
+
         Pause or abort process using PAUSE and ABORT buttons.
         """
         self.awg_module.run()
         self.scope_module.run(feedback=False)
         self.temp_module.event.set()
+        self.fft_settings = self.read_fft_settings()
+        self.running_coadd = Spectrum.RunningCoAdd(
+            frac=self.fft_settings['ff'], kb=self.fft_settings['kb'],
+            total_time=self.fft_settings['trl'], fstart=self.fft_settings['fftlower'],
+            fstop=self.fft_settings['fftupper'], method='auto')
         while not self.event.is_set():
             trigger_save = self.fid_averaging()
             if trigger_save:  # save if save_every was reached. Pass if self.event was set by abort.
@@ -812,6 +842,8 @@ class AutoController:
                 # trigger_save = False  # Reset trigger_save to False before restarting process
                 else:
                     break
+        self.running_coadd = None
+        self.fft_settings = None
         self.temp_module.conn.configure(
             text='Disconnected', foreground='red', font=('Helvetica', '10', 'bold'))
         self.temp_module.noz1_pv.set(self.temp_module.default['pv'])
@@ -1168,14 +1200,18 @@ class AutoController:
                 file extension. *.ft
         """
         directory = self.dir.get()
-        sr = self.sr.get() * 1E9
-        ff = self.ff.get()
-        kb = self.kb.get()
-        trl = self.trl.get()
-        fftlower = self.fftlower.get()
-        fftupper = self.fftupper.get()
-
-        cwd_file_list = glob.glob(directory + '/*.txt')
+        settings = self.fft_settings
+        if settings is None:
+            settings = self.read_fft_settings()
+        sr = settings['sr'] * 1E9
+        ff = settings['ff']
+        kb = settings['kb']
+        trl = settings['trl']
+        fftlower = settings['fftlower']
+        fftupper = settings['fftupper']
+        self.check_writes()
+
+        cwd_file_list = glob.glob(directory + '/*.txt') + glob.glob(directory + '/*.fid')
         newest_file = max(cwd_file_list, key=os.path.getctime)
         waveform = os.path.join(directory, newest_file)
         fid_fname = os.path.basename(waveform)
@@ -1185,6 +1221,72 @@ class AutoController:
             fname=fid_fname, ff=str(round(ff * 10)), kb=str(round(kb * 10)), zpl=str(round(trl)),
             ext='.ft')
         fid = Spectrum.FID(waveform, srate=sr)
-        fft = fid.quick_fft(frac=ff, kb=kb, total_time=trl, fstart=fftlower, fstop=fftupper)
+        if self.running_coadd is None:
+            fft = fid.quick_fft(
+                frac=ff, kb=kb, total_time=trl, fstart=fftlower, fstop=fftupper, method='auto')
+        else:
+            full_fft = self.running_coadd.add(fid, num_avgs=int(self.save_every.get()))
+            fft = np.column_stack((full_fft[:, 0], np.hypot(full_fft[:, 1], full_fft[:, 2])))
         os.chdir(directory)
-        np.savetxt(fft_fname, fft, fmt='%.4f, %.8f', delimiter=' ')
+        Text_Writer.savetxt(
+            os.path.join(directory, fft_fname), fft, fmt='%.4f, %.8f', delimiter=' ',
+            background=True)
+        if self.running_coadd is not None:
+            self.auto_save_running_coadd()
+
+    def read_fft_settings(self):
+        """ Return FFT settings in the GUI as dict. Keys: sr, ff, kb, trl, fftlower, fftupper. """
+        return {'sr': self.sr.get(), 'ff': self.ff.get(), 'kb': self.kb.get(),
+                'trl': self.trl.get(), 'fftlower': self.fftlower.get(),
+                'fftupper': self.fftupper.get()}
+
+    def check_writes(self):
+        """
+        Wait for background *.ft writes and show an error if any failed.
+
+        Called before each FFT is saved and when a run ends, so a failed write during unattended
+        acquisition is reported instead of being lost in the background thread. Runs on the
+        'auto run' thread, so the dialog is scheduled on the Tk main loop.
+        """
+        try:
+            Text_Writer.wait()
+        except OSError as e:
+            msg = str(e)
+            self.master.after(0, lambda: showerror(title='FFT Not Saved', message=msg))
+
+    def auto_save_running_coadd(self):
+        """
+        Save cumulative spectrum of the current continuous run in self.pickett_dir.
+
+        The file is overwritten after every waveform, so it always holds the weighted average of
+        all waveforms saved so far in the run.
+
+        Naming Convention:
+        CoAdd_{sample}_{setup}_{# FIDs}k_{temp}C_{chirp dur}us_{pressure}psig__FF{FID fraction}_KB{Kaiser-Bessel}_TRL{total record length}_.{ext}
+            # FIDs: total number of FIDs in the run.
+            See auto_save_fid() and auto_save_fft() for other fields.
+        """
+        inst = self.instsetup.get()
+        if inst == '2-8':
+            inst = '2to8'
+        elif inst == '6-18':
+            inst = '6to18'
+        num_avgs = int(self.running_coadd.num_avgs)
+        if num_avgs < 1000:
+            avg_k = num_avgs
+            k = 'fid'
+        else:
+            avg_k = int(num_avgs / 1000)
+            k = 'k'
+        fname = 'CoAdd_{name}_{setup}_{avg}{k}_{temp}C_{chirp}us_{pressure}psig__' \
+                'FF{ff}_KB{kb}_TRL{zpl}_{ext}'
+        fname = fname.format(
+            name=self.fname.get(), setup=inst, avg=avg_k, k=k, temp=self.temp.get(),
+            chirp=self.chirpdur.get(), pressure=self.pressure.get(),
+            ff=str(round(self.fft_settings['ff'] * 10)),
+            kb=str(round(self.fft_settings['kb'] * 10)),
+            zpl=str(round(self.fft_settings['trl'])), ext='.ft')
+        os.chdir(self.dir.get())
+        Text_Writer.savetxt(
+            os.path.join(self.dir.get(), fname), self.running_coadd.magnitude(), fmt='%.4f, %.8f',
+            delimiter=' ', background=True)
@@ -10,7 +10,7 @@ import tkinter as tk
 import tkinter.ttk as ttk
 import Pages.PageFormat as page_funcs
 from Pages.PageFormat import PageFormat
-from Spectrum import Spectrum
+from Spectrum import Spectrum, simulate_spectra
 from Pickett import Cat
 from TkAgg_Plotting import PlotManager
 from tkinter.messagebox import showerror
@@ -919,8 +919,6 @@ class EnantiomericExcess(ttk.Frame):
             dom_lnlst_filter = dom_cat.line_list(dictionary=dom_filter)
             asn = [float("{:.4f}".format(dom[x, 0])) for x in range(len(dom))]
             scale_dom = dom_cat.scale_to_spectrum(rs, asn, dictionary=dom_filter)
-            dom_sim = dom_cat.simulate(line_list=dom_lnlst_filter)
-            dom_sim = np.column_stack((dom_sim[:, 0], dom_sim[:, 1] * scale_dom))
 
             minor_cat = Cat(minor_cat)
             minor_filter = minor_cat.filter(
@@ -928,8 +926,8 @@ class EnantiomericExcess(ttk.Frame):
             minor_lnlst_filter = minor_cat.line_list(dictionary=minor_filter)
             asn = [float("{:.4f}".format(minor[x, 0])) for x in range(len(minor))]
             scale_minor = minor_cat.scale_to_spectrum(rs, asn, dictionary=minor_filter)
-            minor_sim = minor_cat.simulate(line_list=minor_lnlst_filter)
-            minor_sim = np.column_stack((minor_sim[:, 0], minor_sim[:, 1] * scale_minor))
+            sims = simulate_spectra(
+                [dom_lnlst_filter, minor_lnlst_filter], scale_factors=[scale_dom, scale_minor])
         ee, topN_dom, topN_minor = calculate_ee(
             dom, minor, topN=topN, tag_ee=tag_ee, rmin1=dom_min, rmax1=dom_max, rmin2=minor_min,
             rmax2=minor_max, omitted_points=omitted_points)
@@ -957,10 +955,10 @@ class EnantiomericExcess(ttk.Frame):
             enriched_spec[row_num_minor, 0], enriched_spec[row_num_minor, 1], weight=0, marker='.',
             color='blue', label='Minor Peaks')
         self.spec_pm.plot_line(
-            dom_sim[:, 0], dom_sim[:, 1], invert=1, weight=0.75, color='red',
+            sims[:, 0], sims[:, 1], invert=1, weight=0.75, color='red',
             label='Dominant Simulation', picker=self.controller.picker)
         self.spec_pm.plot_line(
-            minor_sim[:, 0], minor_sim[:, 1], invert=1, weight=0.75, color='blue',
+            sims[:, 0], sims[:, 2], invert=1, weight=0.75, color='blue',
             label='Minor Simulation', picker=self.controller.picker)
         try:
             self.spec_pm.plot_line(
@@ -1198,15 +1196,15 @@ def transition_scale_factor(spec1, spec2, spec1_pp, spec2_pp, freq_match=None, s
                 dom_freqs_spec2.append(spec2_pp[x, 0])
             else:
                 minor_freqs_spec2.append(spec2_pp[x, 0])
-    dom_intens_spec1 = [spec1.get_intensity(key) for key in dom_freqs_spec2]
-    dom_intens_spec2 = [spec2.get_intensity(key) for key in dom_freqs_spec2]
-    dom_ratio = [
-        dom_intens_spec1[x] / dom_intens_spec2[x] for x in range(len(dom_intens_spec2))]
+    dom_freqs_spec2 = np.asarray(dom_freqs_spec2, dtype=float)
+    dom_intens_spec1 = spec1.get_intensity(dom_freqs_spec2)
+    dom_intens_spec2 = spec2.get_intensity(dom_freqs_spec2)
+    dom_ratio = dom_intens_spec1 / dom_intens_spec2
     dom_analysis = np.column_stack((dom_freqs_spec2, dom_intens_spec2, dom_intens_spec1, dom_ratio))
-    minor_intens_spec1 = [spec1.get_intensity(key) for key in minor_freqs_spec2]
-    minor_intens_spec2 = [spec2.get_intensity(key) for key in minor_freqs_spec2]
-    minor_ratio = [
-        minor_intens_spec1[x] / minor_intens_spec2[x] for x in range(len(minor_intens_spec2))]
+    minor_freqs_spec2 = np.asarray(minor_freqs_spec2, dtype=float)
+    minor_intens_spec1 = spec1.get_intensity(minor_freqs_spec2)
+    minor_intens_spec2 = spec2.get_intensity(minor_freqs_spec2)
+    minor_ratio = minor_intens_spec1 / minor_intens_spec2
     minor_analysis = np.column_stack(
         (minor_freqs_spec2, minor_intens_spec2, minor_intens_spec1, minor_ratio))
     return dom_analysis, minor_analysis
@@ -7,9 +7,9 @@ Changelog: 12/5/2019
 import tkinter as tk
 from tkinter import messagebox
 import Spectrum
+import Text_Writer
 from Pages.PageFormat import PageFormat
 import os
-import numpy as np
 import tkinter.ttk as ttk
 from TkAgg_Plotting import PlotManager, SpecPlot
 import Pages.PageFormat as page_funcs
@@ -27,7 +27,7 @@ class FFT(ttk.Frame):
             SAVE, LOAD, DEFAULTS, BACK TO NAVIGATOR, EXIT APPLICATION
                 See PageFormat.py
         1.  Upload Time Domain Files
-            -   Select one or more *.txt files from file browser.
+            -   Select one or more *.txt or *.fid files from file browser.
             -   The number of files chosen and total number of FIDs within those files are displayed
                 if files follow naming convention (see Broadband_Controller.Auto_Controller.py)
             -   File names must follow naming convention to perform weighted average correctly.
@@ -269,7 +269,7 @@ class FFT(ttk.Frame):
         A list of file names is generated and displayed in the entry box. Display the number of
         files selected and the total number of FID averages within those files.
         """
-        page_funcs.write_paths(self.files, eb_var=self.files_E, ftype='txt')
+        page_funcs.write_paths(self.files, eb_var=self.files_E, ftype='fid')
         files_list = page_funcs.list_paths(self.files)
         try:
             tot_avg, weights = weights_and_total_avg(files_list)
@@ -296,8 +296,12 @@ class FFT(ttk.Frame):
                 coadd_arr, coadd_fname = coadd_time_domain(files_list, sr, save=True)
                 self.fft(coadd_fname, full_ft=full_ft, plot=True)
             else:
-                for file in files_list:
-                    self.fft(file, full_ft=full_ft, plot=False)
+                try:
+                    quick_fft_files(
+                        files_list, self.freq_start.get(), self.freq_stop.get(), sr,
+                        self.frac.get(), self.KB.get(), self.ZP.get(), full_ft=full_ft)
+                except OSError as e:
+                    messagebox.showerror('FFT Not Saved', message=str(e))
         else:
             self.fft(files_list[0], full_ft=full_ft, plot=True)
 
@@ -325,23 +329,22 @@ class FFT(ttk.Frame):
 
         fid = Spectrum.FID(file, srate=sr)
         fid.gate_kaiser_zeropad(frac=ff, kb=kb, total_time=zp)
-        fid.time_column_fid()
         fft = fid.fft(fstart=fstart, fstop=fstop, full_ft=full_ft)
         self.save_fft(str(os.path.splitext(file)[0]), fft)
         if plot:
-            self.plot_fft(fid.fid, fid.ff_kb_abs_fid, fft, full_ft=full_ft)
+            self.plot_fft(
+                fid.decimated('fid'), fid.decimated('ff_kb_abs_fid'), fft, full_ft=full_ft)
+        fid.release()
 
     def plot_fft(self, fid_time, abs_norm_kaiser, fft, full_ft=False):
         """
         Handles clearing and drawing 3 GUI plots: time series, filtered time series, and fft.
 
         Parameters:
-            fid_time (array):
-                2 column array.
-                Col[0] -> time
-                Col[1] -> magnitude or real.
-            abs_norm_kaiser (array):
-                Col[0] -> Normalized absolute value of the Kaiser filtered intensity.
+            fid_time (tuple):
+                (time, intensity) of the FID. See Spectrum.FID.decimated().
+            abs_norm_kaiser (tuple):
+                (time, normalized absolute value of the Kaiser filtered intensity).
             fft (array):
                 2 or 3 column array.
                 Col[0] -> frequency.
@@ -352,14 +355,14 @@ class FFT(ttk.Frame):
                 True -> real + imaginary fft.
         """
         self.time_pm.ax.cla()
-        self.time_pm.plot_line(fid_time[:, 0], fid_time[:, 1], color='red', weight=0.3)
+        self.time_pm.plot_line(fid_time[0], fid_time[1], color='red', weight=0.3)
         self.time_pm.set_labels()
         self.time_pm.zoom()
         self.time_pm.canvas.draw()
 
         self.window_pm.ax.cla()
         self.window_pm.plot_line(
-            fid_time[:len(abs_norm_kaiser), 0], abs_norm_kaiser, color='red', weight=0.3)
+            abs_norm_kaiser[0], abs_norm_kaiser[1], color='red', weight=0.3)
         self.window_pm.set_labels()
         self.window_pm.zoom()
         self.window_pm.canvas.draw()
@@ -408,10 +411,10 @@ class FFT(ttk.Frame):
             round(zp))
         if fft.shape[1] == 3:
             fname = fname + params + '_full.ft'
-            np.savetxt(fname, fft, fmt=['%.4f', '%.8f', '%.8f'])
+            Text_Writer.savetxt(fname, fft, fmt=['%.4f', '%.8f', '%.8f'])
         elif fft.shape[1] == 2:
             fname = fname + params + '.ft'
-            np.savetxt(fname, fft, fmt=['%.4f', '%.8f'])
+            Text_Writer.savetxt(fname, fft, fmt=['%.4f', '%.8f'])
 
 
 def weights_and_total_avg(files_list):
@@ -433,16 +436,29 @@ def weights_and_total_avg(files_list):
     total_avgs = 0
     weights = []
     for file in files_list:
-        split_name = os.path.basename(file).split('_')
-        endswithk = [x for x in split_name if x.endswith('k')]
-        for x in endswithk:
+        avgs = file_weight(file)
+        if avgs is not None:
+            weights.append(avgs)
+            total_avgs += avgs
+    return total_avgs, weights
+
+
+def file_weight(file):
+    """
+    Return number of FID averages in base 1000 given by a file name. None if not found.
+
+    Parameters:
+        file (str):
+            File path. Underscore delimited, with the number of averages followed by 'k'.
+    """
+    avgs = None
+    for x in os.path.basename(file).split('_'):
+        if x.endswith('k'):
             try:
-                avgs = int(x.split('k')[0])
-                weights.append(avgs)
-                total_avgs += avgs
+                avgs = (avgs or 0) + int(x.split('k')[0])
             except ValueError:
                 continue
-    return total_avgs, weights
+    return avgs
 
 
 def coadd_time_domain(files_list, srate, save=True):
@@ -452,9 +468,12 @@ def coadd_time_domain(files_list, srate, save=True):
     File names must use underscore as delimeter. File name must also provide
     the number of averages in base 1000 and end number with a 'k' (Ex. 100k for 100,000 FIDs).
 
+    Files are co-added in a single streaming pass with Spectrum.coadd_fids(), so memory use does
+    not grow with the number of files.
+
     Parameters:
-        files_list (list of strings):
-            List of file paths.
+        files_list (iterable of strings):
+            File paths. May be a generator, e.g. over an archive directory.
         srate (int):
             Sampling rate of digitizer. Must be the same for all files in files_list.
         save (bool):
@@ -463,15 +482,10 @@ def coadd_time_domain(files_list, srate, save=True):
         coadd_arr (array):
             Weighted average.
         file (str):
-            File name of saved file
+            File name of saved file. Saved as binary *.fid if the chosen file name ends in *.fid.
     """
-    split_name = os.path.basename(files_list[0]).split('_')
-    coadd_arr = np.zeros((len(Spectrum.FID(files_list[0], srate=srate).fid), 1))
-    total_avgs, weightings = weights_and_total_avg(files_list)
-    for x in range(len(files_list)):
-        weight = weightings[x] / total_avgs
-        weighted_fid = Spectrum.FID(files_list[x], srate=srate).fid * weight
-        coadd_arr += weighted_fid
+    coadd_arr, total_avgs, fnames = Spectrum.coadd_fids(files_list, srate=srate, weight=file_weight)
+    split_name = os.path.basename(fnames[0]).split('_')
     coadd_fname = ['CoAdd']
     for x in split_name[1:-7]:
         if not x.endswith('k'):
@@ -486,18 +500,29 @@ def coadd_time_domain(files_list, srate, save=True):
     coadd_fname = '_'.join(coadd_fname)
     if save:
         filename = page_funcs.save_file(
-            initialfile=coadd_fname, ftype='.txt', defaultextension='.txt')
-        if filename != '':
-            np.savetxt(filename, coadd_arr, fmt='%.5E')
+            initialfile=coadd_fname, ftype='fid', defaultextension='.txt')
+        if os.path.splitext(filename)[1] == '.fid':
+            metadata = Spectrum.fid_fname_metadata(coadd_fname)
+            if srate is None and os.path.splitext(fnames[0])[1] == '.fid':
+                srate = Spectrum.read_fid_header(fnames[0])['srate']
+            Spectrum.write_fid(
+                filename, coadd_arr, srate=Spectrum.normalize_srate(srate), **metadata)
+        elif filename != '':
+            Text_Writer.savetxt(filename, coadd_arr, fmt='%.5E')
     else:
         filename = coadd_fname
     return coadd_arr, filename
 
 
-def quick_fft_files(files_list, fstart, fstop, sr, ff, kb, zp, full_ft=False):
+def quick_fft_files(files_list, fstart, fstop, sr, ff, kb, zp, full_ft=False, batch_size=16):
     """
     Perform FFTs for each file in files_list, individually, using the given settings.
 
+    FIDs with the same number of points are transformed together with Spectrum.batch_fft(),
+    batch_size at a time. Each batch is saved before more files are read, so memory use does not
+    grow with the number of files. FIDs of different lengths go into separate batches. Returns
+    after every file is written, and raises the first write error.
+
     File names must use underscore as delimeter. File name must also provide the
     number of averages in base 1000 and end number with a 'k' (Ex. 100k for 100,000 FIDs).
 
@@ -523,19 +548,48 @@ def quick_fft_files(files_list, fstart, fstop, sr, ff, kb, zp, full_ft=False):
         full_ft (bool):
             Set whether magnitude FFT or real + imaginary FFT is saved.
             Default: False
+        batch_size (int):
+            Number of FIDs held and transformed at once.
+            Default: 16
     """
+    params = '_FF' + str(round(ff * 10)) + '_KB' + str(round(kb * 10)) + '_TRL' + str(round(zp))
+    pending = {}
     for file in files_list:
-        fname = os.path.splitext(file)[0]
         fid = Spectrum.FID(file, srate=sr)
-        fft = fid.quick_fft(
-            frac=ff, kb=kb, total_time=zp, fstart=fstart, fstop=fstop, full_ft=full_ft)
-        params = '_FF' + str(round(ff * 10)) + '_KB' + str(round(kb * 10)) + '_TRL' + str(round(zp))
+        batch = pending.setdefault(len(fid.fid), [])
+        batch.append(fid)
+        if len(batch) == batch_size:
+            save_fft_batch(pending.pop(len(fid.fid)), params, fstart, fstop, ff, kb, zp, full_ft)
+    for batch in pending.values():
+        save_fft_batch(batch, params, fstart, fstop, ff, kb, zp, full_ft)
+    Text_Writer.wait()
+
+
+def save_fft_batch(fids, params, fstart, fstop, ff, kb, zp, full_ft=False):
+    """
+    FFT equal-length FIDs with Spectrum.batch_fft() and save one *.ft file per FID.
+
+    Parameters:
+        fids (list of Spectrum.FID):
+            FIDs with the same number of points.
+        params (str):
+            Processing parameters appended to each file name. Ex. '_FF10_KB95_TRL80'.
+        fstart, fstop, ff, kb, zp, full_ft:
+            See quick_fft_files().
+    """
+    fnames, matrix = Spectrum.batch_fft(
+        fids, frac=ff, kb=kb, total_time=zp, fstart=fstart, fstop=fstop, full_ft=full_ft,
+        batch_size=len(fids))
+    for x, file in enumerate(fnames):
+        fname = os.path.splitext(file)[0]
         if not full_ft:
             fname = fname + params + '.ft'
-            np.savetxt(fname, fft, fmt=['%.4f', '%.8f'])
+            fft = matrix[:, [0, x + 1]]
+            Text_Writer.savetxt(fname, fft, fmt=['%.4f', '%.8f'], background=True)
         else:
             fname = fname + params + '_full.ft'
-            np.savetxt(fname, fft, fmt=['%.4f', '%.8f', '%.8f'])
+            fft = matrix[:, [0, 2 * x + 1, 2 * x + 2]]
+            Text_Writer.savetxt(fname, fft, fmt=['%.4f', '%.8f', '%.8f'], background=True)
 
     #
     # coadd_fname = os.path.splitext(file)[0]
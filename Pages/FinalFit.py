@@ -538,12 +538,8 @@ class FinalFit(ttk.Frame):
         sim = cat.simulate(cat_filt_lnlst, freq_min=spectrum.freq_min, freq_max=spectrum.freq_max)
         sim = np.column_stack((sim[:, 0], sim[:, 1] * scale))
 
-        lin_row_nums = [
-            int(round((row - spectrum.freq_min) / spectrum.point_spacing)) for row in lnlst]
-        omitted_row_nums = [
-            int(round((row - spectrum.freq_min) / spectrum.point_spacing)) for row in omit]
-
         spec = spectrum.spectrum
+        assigned = spectrum.get_rows(lnlst)
         self.plot.plot_line(
             spec[:, 0], spec[:, 1], weight=1.5, color='black', label='Spectrum',
             picker=self.controller.picker)
@@ -551,12 +547,11 @@ class FinalFit(ttk.Frame):
             sim[:, 0], sim[:, 1], invert=1, weight=1.5, color='red', label='Simulation',
             picker=self.controller.picker)
         self.plot.plot_line(
-            spec[lin_row_nums, 0], spec[lin_row_nums, 1], weight=0, color='red', marker='.',
-            label='Assigned')
+            assigned[:, 0], assigned[:, 1], weight=0, color='red', marker='.', label='Assigned')
         try:
+            omitted = spectrum.get_rows(omit)
             self.plot.plot_line(
-                spec[omitted_row_nums, 0], spec[omitted_row_nums, 1], weight=0, marker='x',
-                color='green', label='Omitted')
+                omitted[:, 0], omitted[:, 1], weight=0, marker='x', color='green', label='Omitted')
         except IndexError:
             pass
         self.plot.set_labels()
@@ -1032,19 +1027,57 @@ def fit_peak_center(fname, spectrum):
     """
     piform = Pickett.Piform('%s.pi' % fname)
     qns, uncentered, oc = piform.line_list_split(3)
+    centered, max_intensity = fit_centers(spectrum, uncentered)
+    lin = Pickett.Lin('%s.lin' % fname)
+    J1 = lin.lin[:, 0]
+    Ka1 = lin.lin[:, 1]
+    Kc1 = lin.lin[:, 2]
+    J0 = lin.lin[:, 3]
+    Ka0 = lin.lin[:, 4]
+    Kc0 = lin.lin[:, 5]
+    lin = Pickett.Lin()
+    lin.assign_transition(freq=centered, J1=J1, Ka1=Ka1, Kc1=Kc1, J0=J0, Ka0=Ka0, Kc0=Kc0)
+    lin.save(fname=fname)
+    Pickett.spfit_run(fname)
+    Pickett.spcat_run(fname)
+    return centered, max_intensity
+
+
+def fit_centers(spectrum, freqs):
+    """
+    Fit a gaussian to the 5 points around each frequency and return the fitted centers.
+
+    Windows at the ends of the spectrum are cut to the points inside it. If fewer than 3 points
+    remain, the transition itself is outside the spectrum, or the fit fails, the frequency is
+    returned unchanged and no max intensity is recorded.
+
+    Parameters:
+        spectrum (Spectrum object):
+        freqs (list):
+            Transition frequencies.
+            Units: MHz
+    Return:
+        centered (list):
+            Center frequencies of Gaussian fits.
+            Units: MHz
+        max_intensity (list):
+            Maximum intensity of gaussian fit.
+            Units: mV
+    """
     centered = []
     max_intensity = []
-    for x in uncentered:
-        row_num = spectrum.freq_to_row(float(x))
-        row_min = row_num - 2
-        row_max = row_num + 3
-        region_to_fit = spectrum.spectrum[row_min:row_max, :]
-        xmin = region_to_fit[0, 0]
-        xmax = region_to_fit[-1, 0]
+    # 5 point region around each transition, shape (transitions, 5, columns). NaN off the ends.
+    regions = spectrum.get_window(np.asarray(freqs, dtype=float), 2, 2, fill=np.nan)
+    for x, region in zip(freqs, regions):
+        region_to_fit = region[~np.isnan(region[:, 0])]
         try:
+            if len(region_to_fit) < 3 or np.isnan(region[2, 1]):
+                raise RuntimeError('Transition at the end of the spectrum.')
+            xmin = region_to_fit[0, 0]
+            xmax = region_to_fit[-1, 0]
             pars, cov = curve_fit(
                 f=gaussian, xdata=region_to_fit[:, 0], ydata=region_to_fit[:, 1],
-                p0=[spectrum.spectrum[row_num, 1], region_to_fit[0, 0], 0.06],
+                p0=[region[2, 1], region_to_fit[0, 0], 0.06],
                 bounds=(-np.inf, np.inf))
             pre_exponential = pars[0]
             mu = pars[1]
@@ -1052,25 +1085,14 @@ def fit_peak_center(fname, spectrum):
             x_space = np.linspace(xmin, xmax, 50)
             y = gaussian(x_space, pre_exponential, mu, sigma)
             intensity_max = np.max(y)
-            center_freq = x_space[np.where(y == np.max(y))]
+            # First maximum, so a tie between two x_space points still gives one frequency.
+            center_freq = x_space[np.argmax(y)]
             centered.append(round(float(center_freq), 4))
             max_intensity.append(intensity_max)
         except RuntimeError:
             center_freq = x
             print('err:  ', center_freq)
             centered.append(round(float(center_freq), 4))
-    lin = Pickett.Lin('%s.lin' % fname)
-    J1 = lin.lin[:, 0]
-    Ka1 = lin.lin[:, 1]
-    Kc1 = lin.lin[:, 2]
-    J0 = lin.lin[:, 3]
-    Ka0 = lin.lin[:, 4]
-    Kc0 = lin.lin[:, 5]
-    lin = Pickett.Lin()
-    lin.assign_transition(freq=centered, J1=J1, Ka1=Ka1, Kc1=Kc1, J0=J0, Ka0=Ka0, Kc0=Kc0)
-    lin.save(fname=fname)
-    Pickett.spfit_run(fname)
-    Pickett.spcat_run(fname)
     return centered, max_intensity
 
 
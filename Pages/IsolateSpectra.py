@@ -7,12 +7,13 @@ import numpy as np
 import tkinter as tk
 import tkinter.ttk as ttk
 from Pages.PageFormat import PageFormat
-from Spectrum import Spectrum
+from Spectrum import Spectrum, row_ranges_mask
 from Pickett import Cat
 from TkAgg_Plotting import PlotManager, SpecPlot
 import os
 import Pages.PageFormat as page_funcs
 import testing
+import Text_Writer
 
 
 r = tk.RIGHT
@@ -317,16 +318,13 @@ class IsolateSpectra(ttk.Frame):
                     spectrum = Spectrum(path)
                     pp_invert = spectrum.spectrum
                     peak_freqs = spectrum.peak_pick(dyn_range=thresh, sort=True)[:, 0]
-                target_intens = [target.get_intensity(x) for x in peak_freqs]
+                target_intens = target.get_intensity(peak_freqs, fill=0)
                 if (lw / ps) % 2 != 0:
                     lw = lw + ps
-                for peak in peak_freqs:
-                    freq_min = peak - (lw / 2)
-                    freq_max = peak + (lw / 2) + ps
-                    row_min = int((freq_min - fmin) / ps)
-                    row_max = int((freq_max - fmin) / ps)
-                    intensity_slice = target_spec[row_min:row_max, 1]
-                    reveal_array[row_min:row_max, 1] = intensity_slice
+                row_min = ((peak_freqs - (lw / 2) - fmin) / ps).astype(int)
+                row_max = ((peak_freqs + (lw / 2) + ps - fmin) / ps).astype(int)
+                keep = row_ranges_mask(row_min, row_max, len(target_spec))
+                reveal_array[keep, 1] = target_spec[keep, 1]
                 self.pp_pm.plot_lines(
                     [pp_invert[:, 0], peak_freqs[:]], [pp_invert[:, 1], target_intens],
                     invert=[line.invert.get(), marker.invert.get()],
@@ -415,15 +413,12 @@ class IsolateSpectra(ttk.Frame):
                     spectrum = Spectrum(path)
                     pp_invert = spectrum.spectrum
                     peak_freqs = spectrum.peak_pick(dyn_range=thresh, sort=True)[:, 0]
-                target_intens = [target.get_intensity(x) for x in peak_freqs]
+                target_intens = target.get_intensity(peak_freqs, fill=0)
                 if (lw / ps) % 2 != 0:
                     lw = lw + ps
-                for peak in peak_freqs:
-                    freq_min = peak - (lw / 2)
-                    freq_max = peak + (lw / 2) + ps
-                    row_min = int((freq_min - fmin) / ps)
-                    row_max = int((freq_max - fmin) / ps)
-                    copy[row_min:row_max, 1] = 0
+                row_min = ((peak_freqs - (lw / 2) - fmin) / ps).astype(int)
+                row_max = ((peak_freqs + (lw / 2) + ps - fmin) / ps).astype(int)
+                copy[row_ranges_mask(row_min, row_max, len(copy)), 1] = 0
                 self.pp_pm.plot_lines(
                     [pp_invert[:, 0], peak_freqs[:]], [pp_invert[:, 1], target_intens],
                     invert=[line.invert.get(), marker.invert.get()],
@@ -463,7 +458,7 @@ class IsolateSpectra(ttk.Frame):
         fname = page_funcs.save_file(
             ftype='.ft', initialdir=os.path.dirname(self.target_file.get()), defaultextension='.ft')
         fname = os.path.splitext(fname)[0]
-        np.savetxt(fname + '.ft', spec, fmt=['%.4f', '%.8f'])
+        Text_Writer.savetxt(fname + '.ft', spec, fmt=['%.4f', '%.8f'])
 
     def plot_unmod(self, spec_path):
         """
@@ -19,6 +19,7 @@ from sklearn.cluster import DBSCAN
 from sklearn.mixture import GaussianMixture
 import Pages.PageFormat as page_funcs
 import testing
+import Text_Writer
 
 pad2_e = {'padx': 2, 'pady': 2, 'sticky': 'e'}
 pad2_w = {'padx': 2, 'pady': 2, 'sticky': 'w'}
@@ -54,13 +55,15 @@ class MixtureAnalysis(ttk.Frame):
         -   After a new matrix is built, file name entry box updates to the name of the matrix.
         Buttons:
             BROWSE
-                Run page_funcs.write_paths(self.spec_path, ftype='.ft'). Open file explorer where
-                one or more files can be selected. Select > 1 file to build matrix of spectra.
+                Run page_funcs.write_paths(self.spec_path, ftype='matrix'). Open file explorer
+                where one or more files can be selected. Select > 1 file to build matrix of spectra.
             BUILD MATRIX
                 Run build_matrix(*args). Spectra must be over the same frequency region.
                 Build spectra matrix from shared frequency region, keeping a single frequency
                 column. By saving spectra with a single frequency column, memory is saved. After
                 matrix is saved, matrix can be uploaded rather than the set of spectra.
+                Matrices are saved as binary *.mtx with file names embedded. Saving as *.ft writes
+                the text matrix and a *_fnames.txt file instead.
     2A. Characterize Transitions: Specific Component
         -   If the spectrum of a molecular species is known, this section can be used to verify that
             transitions from this species exhibit similar intensity behavior.
@@ -301,7 +304,7 @@ class MixtureAnalysis(ttk.Frame):
         spec_path_E = ttk.Entry(inner_0, textvariable=self.spec_path, justify=c, width=50)
         button_spec_path = ttk.Button(
             inner_0, text='Browse', style='h8b.TButton',
-            command=lambda: page_funcs.write_paths(self.spec_path, eb_var=spec_path_E, ftype='.ft'))
+            command=lambda: page_funcs.write_paths(self.spec_path, eb_var=spec_path_E, ftype='matrix'))
         build_matrix_B = ttk.Button(
             inner_0, text='Build Matrix', style='h8b.TButton', command=self.build_matrix)
         spec_section_L.grid(row=0, column=0, columnspan=3, **x2_y10_w)
@@ -576,24 +579,39 @@ class MixtureAnalysis(ttk.Frame):
         File names of all files selected from file explorer will populate self.spec_path.
         After saving matrix, self.spec_path is changed to the name of the matrix.
         """
+        self.spec_path.set(self.matrix_path())
+
+    def matrix_path(self):
+        """
+        Return path of the spectra matrix, building and saving the matrix first if more than one
+        file name populates self.spec_path.
+
+        *.mtx matrices are built directly in the file (see Spectrum.build_matrix()). For *.ft, the
+        text matrix and a *_fnames.txt list of file names are written.
+
+        Returns:
+            spec_path (str):
+                Matrix file path. '' if the save dialog was cancelled.
+        """
         files_list = page_funcs.list_paths(self.spec_path)
-        if len(files_list) > 1:
+        if len(files_list) == 1:
+            return files_list[0]
+        spec_path = page_funcs.save_file(
+            ftype='matrix', initialdir=os.path.dirname(files_list[0]), defaultextension='.mtx')
+        if spec_path == '':
+            return spec_path
+        if os.path.splitext(spec_path)[1] == '.ft':
             fnames, matrix = build_matrix(files_list)
-            spec_path = page_funcs.save_file(
-                ftype='.ft', initialdir=os.path.dirname(files_list[0]), defaultextension='.ft')
-            fnames_path = os.path.splitext(spec_path)[0] + '_fnames.txt'
-            if spec_path != '':
-                fmt = ['%.4f']
-                for x in range(matrix.shape[1] - 1):
-                    fmt.append('%.8f')
-                np.savetxt(spec_path, matrix, fmt=fmt)
-                with open(fnames_path, 'w') as f:
-                    for fname in fnames:
-                        f.write(fname + '\n')
-                f.close()
+            fmt = ['%.4f']
+            for x in range(matrix.shape[1] - 1):
+                fmt.append('%.8f')
+            Text_Writer.savetxt(spec_path, matrix, fmt=fmt)
+            with open(os.path.splitext(spec_path)[0] + '_fnames.txt', 'w') as f:
+                for fname in fnames:
+                    f.write(fname + '\n')
         else:
-            spec_path = files_list[0]
-        self.spec_path.set(spec_path)
+            build_matrix(files_list, out=spec_path)
+        return spec_path
 
     def characterize_single(self):
         """
@@ -632,24 +650,9 @@ class MixtureAnalysis(ttk.Frame):
                 col[3] -> curve width
         """
         dyn_range = self.dyn_range.get()
-        files_list = page_funcs.list_paths(self.spec_path)
-        if len(files_list) > 1:
-            fnames, matrix = build_matrix(files_list)
-            spec_path = page_funcs.save_file(
-                ftype='.ft', initialdir=os.path.dirname(files_list[0]), defaultextension='.ft')
-            fnames_path = os.path.splitext(spec_path)[0] + '_fnames.txt'
-            if spec_path != '':
-                fmt = ['%.4f']
-                for x in range(matrix.shape[1] - 1):
-                    fmt.append('%.8f')
-                np.savetxt(spec_path, matrix, fmt=fmt)
-                self.spec_path.set(spec_path)
-                with open(fnames_path, 'w') as f:
-                    for fname in fnames:
-                        f.write(fname + '\n')
-                f.close()
-        else:
-            spec_path = files_list[0]
+        spec_path = self.matrix_path()
+        if spec_path != '':
+            self.spec_path.set(spec_path)
         spectra = Spectrum(spec_path)
         cat = Cat(self.cat_path.get())
         cat_filter = cat.filter(
@@ -658,10 +661,8 @@ class MixtureAnalysis(ttk.Frame):
         high_points = spectra.signal_max(
             cat_freqs, delta_freq=2 * spectra.point_spacing)
         exp_pp_freqs = high_points[:, 0]
-        exp_pp_rows = [spectra.freq_to_row(x) for x in exp_pp_freqs]
-        intensity_rows = [spectra.spectrum[x, :].tolist() for x in exp_pp_rows]
-        normalized = np.array([spectra.normalize_transition(intensity_rows[x][0]) for x in
-                               range(len(intensity_rows))])
+        exp_pp_rows = spectra.freq_to_row(exp_pp_freqs)
+        normalized = spectra.normalize_transition(spectra.spectrum[exp_pp_rows, 0])
         mean_x = [mean_x_axis(x) for x in normalized[:, 2:]]
         areas = [area_under_curve(x) for x in normalized[:, 2:]]
         width = [curve_width(x) for x in normalized[:, 2:]]
@@ -705,33 +706,14 @@ class MixtureAnalysis(ttk.Frame):
                 col[2] -> area under curve
                 col[3] -> curve width
         """
-        files_list = page_funcs.list_paths(self.spec_path)
-        if len(files_list) > 1:
-            fnames, matrix = build_matrix(*files_list)
-            spec_path = page_funcs.save_file(
-                ftype='.ft', initialdir=os.path.dirname(files_list[0]), defaultextension='.ft')
-            fnames_path = os.path.splitext(spec_path)[0] + '_fnames.txt'
-            if spec_path != '':
-                fmt = ['%.4f']
-                for x in range(matrix.shape[1] - 1):
-                    fmt.append('%.8f')
-                np.savetxt(spec_path, matrix, fmt=fmt)
-                self.spec_path.set(spec_path)
-                with open(fnames_path, 'w') as f:
-                    for fname in fnames:
-                        f.write(fname + '\n')
-                f.close()
-        else:
-            spec_path = files_list[0]
+        spec_path = self.matrix_path()
+        if spec_path != '':
+            self.spec_path.set(spec_path)
         spectra = Spectrum(spec_path)
-        exp_pp_rows = spectra.peak_pick_sequence_measurement(thresh=self.pp_thresh.get())
-        exp_pp_freqs = []
-        intensity_rows = []
-        for row in exp_pp_rows:
-            exp_pp_freqs.append(spectra.row_to_freq(row))
-            intensity_rows.append(spectra.spectrum[row, :].tolist())
-        norm_list = [
-            spectra.normalize_transition(intensity_rows[x][0]) for x in range(len(intensity_rows))]
+        exp_pp_rows = np.asarray(
+            spectra.peak_pick_sequence_measurement(thresh=self.pp_thresh.get()), dtype=int)
+        exp_pp_freqs = spectra.row_to_freq(exp_pp_rows).tolist()
+        norm_list = spectra.normalize_transition(spectra.spectrum[exp_pp_rows, 0]).tolist()
         mean_x = []
         areas = []
         width = []
@@ -1152,7 +1134,7 @@ class MixtureAnalysis(ttk.Frame):
             group = groups[i]
             freqs = [group[x][0] for x in range(len(group))]
             max_spec = [group[x][1] for x in range(len(group))]
-            center_rows = [spectra_obj.freq_to_row(freqs[int(x)]) for x in range(len(freqs))]
+            center_rows = spectra_obj.freq_to_row(np.asarray(freqs, dtype=float))
             for j in range(len(freqs)):
                 center_row = center_rows[j]
                 row_min = int(center_row - ((lw / ps) / 2))
@@ -1200,7 +1182,7 @@ class MixtureAnalysis(ttk.Frame):
         init_fname = init_fname + '_split_' + projection_fname
         fname = page_funcs.save_file(
             initialfile=init_fname, initialdir=_dir, ftype='ft', defaultextension='.ft')
-        np.savetxt(fname, split_spectrum, fmt=fmt)
+        Text_Writer.savetxt(fname, split_spectrum, fmt=fmt)
 
     def single_update(self):
         """ Change plot projection of 'Characterize Transitions: Specific Component' section. """
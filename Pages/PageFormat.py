@@ -19,6 +19,14 @@ ftype_dict = {None: [('All Files', '*.*')],
               '.ft': [('FT Files', '*.ft'), ('All Files', '*.*')],
               '.txt': [('TXT Files', '*.txt'), ('All Files', '*.*')],
               'txt': [('TXT Files', '*.txt'), ('All Files', '*.*')],
+              'fid': [('FID Files', '*.txt *.fid'), ('TXT Files', '*.txt'),
+                      ('Binary FID Files', '*.fid'), ('All Files', '*.*')],
+              '.fid': [('Binary FID Files', '*.fid'), ('TXT Files', '*.txt'),
+                       ('All Files', '*.*')],
+              'mtx': [('MTX Files', '*.mtx'), ('All Files', '*.*')],
+              '.mtx': [('MTX Files', '*.mtx'), ('All Files', '*.*')],
+              'matrix': [('Spectra Matrices', '*.mtx *.ft'), ('MTX Files', '*.mtx'),
+                         ('FT Files', '*.ft'), ('All Files', '*.*')],
               '.prn': [('PRN Files', '*.prn'), ('All Files', '*.*')],
               'prn': [('PRN Files', '*.prn'), ('All Files', '*.*')],
               '.par': [('PAR Files', '*.par'), ('All Files', '*.*')],
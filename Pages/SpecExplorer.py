@@ -944,6 +944,7 @@ class SpecExplorer(ttk.Frame):
         except AttributeError:
             self.series_dict[x].x = []
             self.series_dict[x].y = []
+            self.series_dict[x].pyramid = None
         if spec.shape[1] > 2:
             bname = os.path.basename(spec_path)
             msg = "Expand matrix using row(s) below? Files in these rows will be overwritten."
@@ -954,6 +955,7 @@ class SpecExplorer(ttk.Frame):
                         series_num = x + c - 1
                         self.series_dict[series_num].x = spec[:, 0]
                         self.series_dict[series_num].y = spec[:, c]
+                        self.series_dict[series_num].pyramid = spectrum.pyramid(c)
                         if c != 1:
                             fpath = 'fpath' + str(x + c - 1)
                             n = bname + '  column  ' + str(c)
@@ -969,12 +971,13 @@ class SpecExplorer(ttk.Frame):
         else:
             self.series_dict[x].x = spec[:, 0]
             self.series_dict[x].y = spec[:, 1]
+            self.series_dict[x].pyramid = spectrum.pyramid(1)
 
     def plot_series(self):
         """ Plot data series using options from the GUI. """
         p = self.controller.picker
-        xs, ys, invert, scale, color, marker, weight, label, label_show, picker = \
-            [], [], [], [], [], [], [], [], [], []
+        xs, ys, invert, scale, color, marker, weight, label, label_show, picker, pyramids = \
+            [], [], [], [], [], [], [], [], [], [], []
         for x in self.series_dict.values():
             if x.show.get() == 1:
                 scale.append(x.scale.get())
@@ -991,9 +994,10 @@ class SpecExplorer(ttk.Frame):
                 if x.fpath.get() != 'None':
                     xs.append(x.x)
                     ys.append(x.y)
+                    pyramids.append(x.pyramid)
         self.plot.plot_lines(
             xs, ys, invert=invert, scale=scale, color=color, marker=marker, weight=weight,
-            label=label, picker=picker)
+            label=label, picker=picker, pyramid=pyramids)
 
     def update_axes(self):
         """ Adjust axes using options from the GUI. """
@@ -1054,6 +1058,7 @@ class SpecExplorer(ttk.Frame):
                 for series, col in updates[root]:
                     self.series_dict[series].x = spec[:, 0]
                     self.series_dict[series].y = spec[:, col]
+                    self.series_dict[series].pyramid = spectrum.pyramid(col)
         except AttributeError:
             pass
         self.plot.ax.cla()
@@ -8,7 +8,9 @@ import shutil
 import numpy as np
 import subprocess
 import pandas as pd
+from collections.abc import Mapping
 import Spectrum
+import Text_Writer
 
 key_dict = {'A': '10000', 'B': '20000', 'C': '30000',
             'DJ': '200', 'DJK': '1100', 'DK': '2000', 'dJ': '40100', 'dK': '41000',
@@ -26,6 +28,9 @@ key_dict = {'A': '10000', 'B': '20000', 'C': '30000',
             '330610000': 'chi_ab_3', '330210000': 'chi_bc_3', '330410000': 'chi_ac_3'}
 spind_dict = {'3': 1, '5': 2, '7': 3, '2': 0.5, '4': 1.5, '6': 2.5}
 dc_list = ['DJ', 'DJK', 'DK', 'dJ', 'dK']
+# Second radiation constant hc/k (cm K), and h/k (K/MHz).
+HC_OVER_K = 1.438776877
+H_OVER_K = 4.799243073e-5
 
 
 class Par_Var:
@@ -821,7 +826,8 @@ class Lin:
                 fname = self.fname
             except AttributeError:
                 fname = 'molecule'
-        np.savetxt('{fname}{ext}'.format(fname=fname, ext='.lin'), self.lin, fmt=self.delimiter)
+        Text_Writer.savetxt(
+            '{fname}{ext}'.format(fname=fname, ext='.lin'), self.lin, fmt=self.delimiter)
 
 
 # f = 'C:\\Users\\chann\\OneDrive\\Graduate School\\Pate Group\\Code\\Rotational Spectroscopy Data Analysis 4_24_2020\\3_1_2021_Testing\\FinalFit\\old\\fenR_Risop1_a_test.lin'
@@ -1006,6 +1012,254 @@ class Int_File:
         f.close()
 
 
+# SPCAT *.cat columns: name, width, dtype. Quantum numbers are float, blank fields are NaN.
+CAT_FIELDS = [
+    ('freq', 13, '<f8'), ('err', 8, '<f8'), ('lgint', 8, '<f8'), ('dr', 2, '<i4'),
+    ('elo', 10, '<f8'), ('gup', 3, '<i4'), ('tag', 7, '<i4'), ('qnfmt', 4, '<i4'),
+    ('N1', 2, '<f8'), ('Ka1', 2, '<f8'), ('Kc1', 2, '<f8'), ('J1', 2, '<f8'), ('F11', 2, '<f8'),
+    ('F1', 2, '<f8'), ('N0', 2, '<f8'), ('Ka0', 2, '<f8'), ('Kc0', 2, '<f8'), ('J0', 2, '<f8'),
+    ('F10', 2, '<f8'), ('F0', 2, '<f8')]
+CAT_DTYPE = np.dtype([(name, dtype) for name, width, dtype in CAT_FIELDS])
+# Fields returned as int in the transition dicts of Cat.dict.
+CAT_INT_FIELDS = ['dr', 'gup', 'tag', 'qnfmt', 'N1', 'Ka1', 'Kc1', 'N0', 'Ka0', 'Kc0']
+
+
+# Lookup tables of characters allowed in a fixed-width number. Short rows are padded with nulls.
+_VALID = np.zeros(256, dtype=bool)
+_VALID[np.frombuffer(b'\x00 .-+0123456789', dtype=np.uint8)] = True
+_VALID_LETTERS = _VALID.copy()
+_VALID_LETTERS[ord('A'):ord('Z') + 1] = True
+_VALID_LETTERS[ord('a'):ord('z') + 1] = True
+
+
+def invalid_rows(chars, letters=False):
+    """
+    Return boolean mask of rows holding characters that parse_fixed_width() cannot parse.
+
+    Parameters:
+        chars (array):
+            uint8 array, shape (rows, width). ASCII characters of the field.
+        letters (bool):
+            Letters are allowed, as SPCAT letter digits.
+            Default: False
+    """
+    return ~(_VALID_LETTERS if letters else _VALID)[chars].all(axis=1)
+
+
+def parse_fixed_width(chars, letters=False):
+    """
+    Parse fixed-point numbers from a block of characters, one number per row.
+
+    Digits are accumulated into an integer mantissa, which is divided by a power of ten, so the
+    result is the same as float() of the text. Rows without digits are NaN.
+
+    SPCAT writes integers too wide for their field with a letter as the leading digit. An upper
+    case letter counts as 10 to 35 (A0 = 100, Z9 = 359, A00 = 1000), and a lower case letter
+    counts as 1 to 26 and makes the number negative (a0 = -10, b5 = -25). Letters are decoded
+    only if letters is True.
+
+    Parameters:
+        chars (array):
+            uint8 array, shape (rows, width). ASCII characters of the field.
+        letters (bool):
+            Decode SPCAT letter digits. Use for integer fields.
+            Default: False
+    Returns:
+        values (array):
+            float64 array, shape (rows,).
+    Raises:
+        ValueError:
+            If a row holds a character that is not part of a number. The message gives the row.
+    """
+    bad = invalid_rows(chars, letters)
+    if bad.any():
+        row = int(np.argmax(bad))
+        raise ValueError('Cannot parse row {}:  {!r}'.format(
+            row, bytes(chars[row]).decode('latin1')))
+    is_digit = (chars >= ord('0')) & (chars <= ord('9'))
+    negative = (chars == ord('-')).any(axis=1)
+    # Value of each character as a digit, looked up only if letter digits are present.
+    values = None
+    if letters and (chars >= ord('A')).any():
+        values = np.arange(256, dtype=np.int64) - ord('0')
+        values[ord('A'):ord('Z') + 1] = np.arange(10, 36)
+        values[ord('a'):ord('z') + 1] = np.arange(1, 27)
+        lower = (chars >= ord('a')) & (chars <= ord('z'))
+        is_digit = is_digit | lower | ((chars >= ord('A')) & (chars <= ord('Z')))
+        negative |= lower.any(axis=1)
+    mantissa = np.zeros(len(chars), dtype=np.int64)
+    for col in range(chars.shape[1]):
+        if values is None:
+            digit = chars[:, col].astype(np.int64) - ord('0')
+        else:
+            digit = values[chars[:, col]]
+        mantissa = np.where(is_digit[:, col], mantissa * 10 + digit, mantissa)
+    is_dot = chars == ord('.')
+    after_dot = np.cumsum(is_dot, axis=1) > 0
+    decimals = (is_digit & after_dot).sum(axis=1)
+    numbers = mantissa / 10.0 ** decimals
+    numbers[negative] *= -1
+    numbers[~is_digit.any(axis=1)] = np.nan
+    return numbers
+
+
+def read_cat(file):
+    """
+    Read SPCAT *.cat file into a structured array, sorted by frequency.
+
+    Fields are cut by column position from the raw bytes and parsed with numpy, without Python
+    objects per line. Quantum numbers and gup written with SPCAT letter codes are decoded (see
+    parse_fixed_width()). Blank J and F fields are NaN.
+
+    Parameters:
+        file (str):
+            File path.
+    Returns:
+        lines (structured array):
+            dtype CAT_DTYPE. One row per transition. Lines at equal frequency keep file order.
+    Raises:
+        ValueError:
+            If a field cannot be parsed, or a field in CAT_INT_FIELDS is blank. The message gives
+            the line number and field.
+    """
+    with open(file, 'rb') as f:
+        rows = [row for row in f.read().splitlines() if row.strip()]
+    width = sum(w for name, w, dtype in CAT_FIELDS)
+    chars = np.array(rows, dtype='S%d' % width).view(np.uint8).reshape((len(rows), width))
+    lines = np.zeros(len(rows), dtype=CAT_DTYPE)
+    start = 0
+    for name, w, dtype in CAT_FIELDS:
+        block = chars[:, start:start + w]
+        letters = name not in ['freq', 'err', 'lgint', 'elo']
+        try:
+            values = parse_fixed_width(block, letters=letters)
+        except ValueError:
+            row = int(np.argmax(invalid_rows(block, letters)))
+            raise ValueError('{}, line {}:  cannot parse {} field {!r}'.format(
+                file, _line_number(file, row), name, bytes(block[row]).decode('latin1')))
+        if name in CAT_INT_FIELDS and np.isnan(values).any():
+            row = int(np.argmax(np.isnan(values)))
+            raise ValueError('{}, line {}:  {} field is blank'.format(
+                file, _line_number(file, row), name))
+        lines[name] = values
+        start += w
+    return lines[np.argsort(lines['freq'], kind='mergesort')]
+
+
+def _line_number(file, row):
+    """ Return line number in file of the row-th non-blank line, for error messages. """
+    with open(file, 'rb') as f:
+        numbers = [num for num, line in enumerate(f.read().splitlines(), 1) if line.strip()]
+    return numbers[row]
+
+
+def line_dict(line):
+    """ Return a row of CAT_DTYPE as the transition dict of Cat.dict. """
+    return {name: int(line[name]) if name in CAT_INT_FIELDS else (
+        float(line[name]) if name in ['freq', 'err', 'lgint', 'elo'] else line[name])
+        for name in CAT_DTYPE.names}
+
+
+def lines_from_dict(dictionary):
+    """
+    Return structured array (CAT_DTYPE) of the transitions in a Cat dictionary.
+
+    Parameters:
+        dictionary (dict or CatView):
+            key: frequency, val: list of transition dicts.
+    Returns:
+        lines (structured array):
+            Sorted by frequency.
+    """
+    if isinstance(dictionary, CatView):
+        return dictionary.lines
+    lines = np.array(
+        [tuple(line[name] for name in CAT_DTYPE.names)
+         for lines in dictionary.values() for line in lines], dtype=CAT_DTYPE)
+    return lines[np.argsort(lines['freq'], kind='mergesort')]
+
+
+def match_frequencies(freqs, ref_freqs, thresh):
+    """
+    Return every pair of freqs and ref_freqs within thresh of each other.
+
+    ref_freqs must be sorted. The window of each frequency is found with searchsorted, so the
+    cost is O((N + M) log M) instead of N * M comparisons. A frequency matching several reference
+    frequencies gives one pair per match.
+
+    Parameters:
+        freqs (array):
+            Frequencies to match, for example a peak pick.
+            Units: MHz
+        ref_freqs (array):
+            Sorted reference frequencies, for example catalog frequencies.
+            Units: MHz
+        thresh (float):
+            Max abs(freq - ref_freq) of a match.
+            Units: MHz
+    Returns:
+        index (array of int):
+            Index into freqs of each pair.
+        ref_index (array of int):
+            Index into ref_freqs of each pair. Pairs are sorted by index, then ref_index.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    ref_freqs = np.asarray(ref_freqs, dtype=float)
+    # Windows are widened by a margin below the frequency resolution, then checked exactly.
+    margin = 1e-6
+    lo = np.searchsorted(ref_freqs, freqs - thresh - margin, 'left')
+    hi = np.searchsorted(ref_freqs, freqs + thresh + margin, 'right')
+    counts = hi - lo
+    index = np.repeat(np.arange(len(freqs)), counts)
+    ref_index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - lo, counts)
+    ref = ref_freqs[ref_index]
+    keep = (ref + thresh >= freqs[index]) & (freqs[index] >= ref - thresh)
+    return index[keep], ref_index[keep]
+
+
+class CatView(Mapping):
+    """
+    Read-only mapping of frequency -> list of transition dicts, over a structured array of lines.
+
+    Same keys and values as the dictionary previously built by Cat.__init__(). Transition dicts
+    are built only when a frequency is looked up, so the catalog itself is held as one array.
+    Keys are the unique frequencies in increasing order.
+
+    Parameters:
+        lines (structured array):
+            dtype CAT_DTYPE, sorted by frequency.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.freqs, self.starts = np.unique(lines['freq'], return_index=True)
+        self.stops = np.append(self.starts[1:], len(lines))
+
+    def index(self, freq):
+        """ Return position of freq in self.freqs. Raise KeyError if freq is not a key. """
+        i = np.searchsorted(self.freqs, freq)
+        if i == len(self.freqs) or self.freqs[i] != freq:
+            raise KeyError(freq)
+        return i
+
+    def __getitem__(self, freq):
+        i = self.index(freq)
+        return [line_dict(line) for line in self.lines[self.starts[i]:self.stops[i]]]
+
+    def __contains__(self, freq):
+        try:
+            self.index(freq)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.freqs)
+
+    def __len__(self):
+        return len(self.freqs)
+
+
 class Cat:
     """
     Class for Piform output files. Accepted file extension: *.pi
@@ -1019,9 +1273,14 @@ class Cat:
            Base name of the file. Not full path.
         fpath (str):
            Full file path.
+        lines (structured array):
+           Transitions of the file, sorted by frequency. dtype CAT_DTYPE, one field per column
+           of the *.cat file: freq, err, lgint, dr, elo, gup, tag, qnfmt, and quantum numbers.
         cat (array):
-           File read into numpy array.
-        dict (dictionary):
+           File as 2-D float array. Built from self.lines when accessed.
+        dict (CatView):
+            Read-only mapping of self.lines, built when first accessed. key: frequency,
+            val: list of transition dicts with the keys below.
             freq (float):
                Transition frequency.
             err (float):
@@ -1044,15 +1303,21 @@ class Cat:
             N1, Ka1, Kc1, J1, F11, F1, N0, Ka0, Kc0, J0, F10, F0 (int):
                Quantum numbers
     Methods:
+        get_lines(dictionary)
+            Return structured array of the transitions in dictionary.
         line_list(dictionary)
             Return two column array. Col[0]: frequency, col[1]: intensity.
+        catalog_temperature()
+            Return TEMP of the *.int file of the catalog.
+        rescale_intensity(temp, cat_temp, dictionary)
+            Return line intensities at other rotational temperature(s).
         max_intensity(dictionary)
             Return frequency and intensity of the strongest predicted transition.
-        filter(dictionary)
+        filter(dictionary, as_dict, **kwargs)
             Filter transitions by various parameters.
         simulate(line_list, freq_min, freq_max, step_size, fwhm, scale_factor, save, fname, **kw)
             Produce a simulated spectrum from the given line_list.
-        spectrum_matches(spec_pp, dictionary, thresh)
+        spectrum_matches(spec_pp, dictionary, thresh, residuals)
             Return line positions of predicted and experimental transitions that satisfy threshold.
         scale_to_spectrum(spectrum, asn, dictionary, thresh)
             Return scale factor that scales the intensity of the predicted spectrum to match an
@@ -1062,52 +1327,54 @@ class Cat:
     def __init__(self, file=None):
         self.delimiter = ['%13.4f', '%8.4f', '%8.4f', '%2.0f', '%10.4f', '%3.0f', '%7.0f',
                           '%4.0f', '%2.0f', '%2.0f', '%2.0f', '%8.0f', '%2.0f', '%2.0f']
+        self.lines = np.zeros(0, dtype=CAT_DTYPE)
+        self._dict = None
         if file is not None:
             self.fname = os.path.basename(str(file)).split('.')[0]
             self.fpath = os.path.abspath(str(file))
-            self.cat = np.genfromtxt(
-                file, delimiter=[13, 8, 8, 2, 10, 3, 7, 4, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2])
-            freq = self.cat[:, 0]
-            err = self.cat[:, 1]
-            lgint = self.cat[:, 2]
-            dr = self.cat[:, 3]
-            elo = self.cat[:, 4]
-            gup = self.cat[:, 5]
-            tag = self.cat[:, 6]
-            qnfmt = self.cat[:, 7]
-            N1 = self.cat[:, 8]
-            Ka1 = self.cat[:, 9]
-            Kc1 = self.cat[:, 10]
-            J1 = self.cat[:, 11]
-            F11 = self.cat[:, 12]
-            F1 = self.cat[:, 13]
-            N0 = self.cat[:, 14]
-            Ka0 = self.cat[:, 15]
-            Kc0 = self.cat[:, 16]
-            J0 = self.cat[:, 17]
-            F10 = self.cat[:, 18]
-            F0 = self.cat[:, 19]
+            self.lines = read_cat(file)
 
-            self.dict = {}
-            for x in range(len(freq)):
-                line_dict = {
-                    'freq': float(freq[x]), 'err': float(err[x]), 'lgint': float(lgint[x]),
-                    'dr': int(dr[x]), 'elo': float(elo[x]), 'gup': int(gup[x]), 'tag': int(tag[x]),
-                    'qnfmt': int(qnfmt[x]), 'N1': int(N1[x]), 'Ka1': int(Ka1[x]),
-                    'Kc1': int(Kc1[x]), 'J1': J1[x], 'F11': F11[x], 'F1': F1[x], 'N0': int(N0[x]),
-                    'Ka0': int(Ka0[x]), 'Kc0': int(Kc0[x]), 'J0': J0[x], 'F10': F10[x], 'F0': F0[x]}
-                if freq[x] in self.dict.keys():
-                    self.dict[freq[x]].append(line_dict)
-                else:
-                    self.dict[freq[x]] = [line_dict]
+    @property
+    def dict(self):
+        """ Compatibility view of self.lines. key: frequency, val: list of transition dicts. """
+        if self._dict is None:
+            self._dict = CatView(self.lines)
+        return self._dict
 
-    def line_list(self, dictionary=None):
+    @property
+    def cat(self):
+        """ Catalog as a 2-D float array, one column per field of CAT_DTYPE. """
+        return np.column_stack([self.lines[name].astype(float) for name in CAT_DTYPE.names])
+
+    def get_lines(self, dictionary=None):
+        """
+        Return structured array (CAT_DTYPE) of the transitions in dictionary.
+
+        Parameters:
+            dictionary (dict or CatView):
+                Optional dictionary. Use for dict other than self.dict.
+        Return:
+            lines (structured array)
+        """
+        if dictionary is None:
+            return self.lines
+        return lines_from_dict(dictionary)
+
+    def line_list(self, dictionary=None, temp=None, cat_temp=None):
         """
         Return array of transition frequencies and predicted intensities.
 
         Parameters:
             dictionary (dictionary):
                 Optional dictionary. Use for dict other than self.dict.
+            temp (float):
+                Rotational temperature of the intensities. See rescale_intensity().
+                Units: K
+                Default: catalog temperature
+            cat_temp (float):
+                Temperature of the catalog intensities, if temp is given.
+                Units: K
+                Default: self.catalog_temperature()
         Return:
             line_list (array):
                  Col[0]: frequency
@@ -1115,17 +1382,71 @@ class Cat:
                  col[1]: intensity.
                     Units: mV
         """
-        if dictionary is None:
-            dictionary = self.dict
-        freq = []
-        intens = []
-        for k, v in dictionary.items():
-            for line in v:
-                freq.append(k)
-                intens.append(10 ** line['lgint'])
-        line_list = np.column_stack((freq, intens))
+        lines = self.get_lines(dictionary)
+        if temp is None:
+            intensity = 10 ** lines['lgint']
+        else:
+            intensity = self.rescale_intensity(temp, cat_temp=cat_temp, dictionary=dictionary)
+        line_list = np.column_stack((lines['freq'], intensity))
         return line_list
 
+    def catalog_temperature(self):
+        """
+        Return temperature at which SPCAT calculated the intensities of the catalog.
+
+        Read from TEMP of the *.int file with the same base name, next to the *.cat file.
+
+        Return:
+            temp (float):
+                Units: K
+        """
+        int_path = os.path.splitext(self.fpath)[0] + '.int'
+        if not os.path.isfile(int_path):
+            raise ValueError('No *.int file found for ' + self.fpath + '. Provide cat_temp.')
+        return float(Int_File(int_path).dict['temp'])
+
+    def rescale_intensity(self, temp, cat_temp=None, dictionary=None):
+        """
+        Return line intensities at rotational temperature temp, without rerunning SPCAT.
+
+        Intensities of the catalog, calculated at cat_temp (T0), are rescaled with the Boltzmann
+        factors of the lower state energy and of the transition, and the partition function:
+            I(T) = I(T0) * (Q(T0) / Q(T)) * exp(-elo * hc/k * (1/T - 1/T0))
+                   * (1 - exp(-h * freq / kT)) / (1 - exp(-h * freq / kT0))
+        Q is proportional to T^1.5, as in Int_File.partition_function(). All lines and all
+        temperatures are rescaled in one broadcast pass, in log space.
+
+        Parameters:
+            temp (float or array):
+                Rotational temperature(s).
+                Units: K
+            cat_temp (float):
+                Temperature of the catalog intensities, the TEMP of the *.int file.
+                Units: K
+                Default: self.catalog_temperature()
+            dictionary (dict or CatView):
+                Optional dictionary. Use for dict other than self.dict.
+        Return:
+            intensity (array):
+                Line intensities in the order of self.line_list(dictionary).
+                Shape (lines,) if temp is a float, (temps, lines) if temp is an array.
+                Units: mV
+        """
+        if cat_temp is None:
+            cat_temp = self.catalog_temperature()
+        lines = self.get_lines(dictionary)
+        temp = np.asarray(temp, dtype=float)
+        t = temp.reshape((-1, 1))
+        log_ratio = (
+            1.5 * np.log10(cat_temp / t)
+            - lines['elo'] * HC_OVER_K * (1 / t - 1 / cat_temp) / np.log(10)
+            + np.log10(np.expm1(-H_OVER_K * lines['freq'] / t)
+                       / np.expm1(-H_OVER_K * lines['freq'] / cat_temp)))
+        intensity = 10 ** (lines['lgint'] + log_ratio)
+        if temp.ndim == 0:
+            intensity = intensity[0]
+        return intensity
+
     def max_intensity(self, dictionary=None):
         """
         Return frequency and intensity of the strongest predicted transition.
@@ -1144,13 +1465,20 @@ class Cat:
         max_int = line_list[np.argmax(line_list[:, 1]), :]
         return max_int
 
-    def filter(self, dictionary=None, **kwargs):
+    def filter(self, dictionary=None, as_dict=False, **kwargs):
         """
         Filter rows of the cat by various parameters.
 
+        All limits and the dynamic range cut are combined into one boolean mask over the lines of
+        the catalog. A frequency is removed with all of its lines if any of its lines fails a
+        limit. Limits set to None or 'None' are ignored.
+
         Parameters:
             dictionary (dictionary):
                 Optional dictionary. Use for dict other than self.dict.
+            as_dict (bool):
+                Return a plain dict instead of a CatView.
+                Default: False
             kwargs['freq_max'] (int):
                 Upper bound frequency.
                 Units: MHz.
@@ -1182,9 +1510,9 @@ class Cat:
             kwargs['F_min'] (int):
                 Lower bound F quantum number.
             kwargs['dyn_range'] (float):
-                dynamic range with respect to the strongest peak.
+                dynamic range with respect to the strongest peak of the full catalog.
         Return:
-            filtered (dictionary):
+            filtered (CatView or dictionary):
                 Key:val pairs from input dictionary which meet filter requirements.
         """
         kwarg_dict = {'freq_max': 'freq', 'N_max': 'N1', 'Ka_max': 'Ka1', 'Kc_max': 'Kc1',
@@ -1193,32 +1521,24 @@ class Cat:
                       'J_min': 'J1', 'F1_min': 'F11', 'F_min': 'F1', 'dyn_range': 'dyn_range'}
         max_kwargs = ['freq_max', 'N_max', 'Ka_max', 'Kc_max', 'J_max', 'F1_max', 'F_max']
         min_kwargs = ['freq_min', 'N_min', 'Ka_min', 'Kc_min', 'J_min', 'F1_min', 'F_min']
-        dyn_range = ['dyn_range']
-        if dictionary is None:
-            filtered = dict(self.dict)
-        else:
-            filtered = dict(dictionary)
-        delete_list = []
-        for freq, lines in filtered.items():
-            for line in lines:
-                for key, param in kwargs.items():
-                    if key not in ['None', None]:
-                        if key in max_kwargs:
-                            if float(line[kwarg_dict[key]]) > float(kwargs[key]):
-                                delete_list.append(freq)
-                        if key in min_kwargs:
-                            if float(line[kwarg_dict[key]]) < float(kwargs[key]):
-                                delete_list.append(freq)
-                        if key in dyn_range:
-                            max_int = self.max_intensity()
-                            lower_limit = max_int[1] / float(kwargs[key])
-                            if float(10 ** line['lgint']) < lower_limit:
-                                delete_list.append(freq)
-        for key in delete_list:
-            try:
-                del filtered[key]
-            except KeyError:
-                pass
+        lines = self.get_lines(dictionary)
+        failed = np.zeros(len(lines), dtype=bool)
+        for key, param in kwargs.items():
+            if param in ['None', None]:
+                continue
+            if key in max_kwargs:
+                failed |= lines[kwarg_dict[key]] > float(param)
+            elif key in min_kwargs:
+                failed |= lines[kwarg_dict[key]] < float(param)
+            elif key == 'dyn_range' and len(self.lines):
+                lower_limit = self.max_intensity()[1] / float(param)
+                failed |= 10 ** lines['lgint'] < lower_limit
+        freqs, inverse = np.unique(lines['freq'], return_inverse=True)
+        failed_freqs = np.zeros(len(freqs), dtype=bool)
+        failed_freqs[inverse[failed]] = True
+        filtered = CatView(lines[~failed_freqs[inverse]])
+        if as_dict:
+            filtered = dict(filtered)
         return filtered
 
     def simulate(self, line_list=None, freq_min=None, freq_max=None, step_size=None, fwhm=None,
@@ -1270,11 +1590,14 @@ class Cat:
             scale_factor=scale_factor, save=save, fname=fname)
         return sim
 
-    def spectrum_matches(self, spec_pp, dictionary=None, thresh=None):
+    def spectrum_matches(self, spec_pp, dictionary=None, thresh=None, residuals=False):
         """
         Return transition frequencies for predicted and experimental transitions that meet the
         cutoff threshold.
 
+        Every pair within thresh is returned, so a peak near several predicted frequencies gives
+        several matches. Pairs are ordered by peak, then by predicted frequency.
+
         Parameters:
             spec_pp (list):
                 Peak pick of an experimental spectrum.
@@ -1286,26 +1609,29 @@ class Cat:
                 a match.
                 Units: MHz.
                 Default: 0.020
+            residuals (bool):
+                Also return experimental - predicted frequency of each match.
+                Default: False
         Return:
              cat_freq (list):
                 List of match frequencies from cat file.
              spec_freq (list):
                 List of match frequencies from experimental spectrum.
+             residual (list):
+                If residuals == True. spec_freq - cat_freq of each match.
+                Units: MHz.
         """
-
         if dictionary is None:
             dictionary = self.dict
         if thresh is None:
             thresh = 0.020
-        cat_freqs = list(dictionary.keys())
-        spec_freqs = spec_pp[:, 0]
-        cat_freq = []
-        spec_freq = []
-        for x in spec_freqs:
-            for y in cat_freqs:
-                if (y + thresh) >= x >= (y - thresh):
-                    cat_freq.append(y)
-                    spec_freq.append(round(x, 4))
+        cat_freqs = np.unique(self.get_lines(dictionary)['freq'])
+        spec_freqs = np.asarray(spec_pp)[:, 0]
+        spec_index, cat_index = match_frequencies(spec_freqs, cat_freqs, thresh)
+        cat_freq = list(cat_freqs[cat_index])
+        spec_freq = list(np.round(spec_freqs[spec_index], 4))
+        if residuals:
+            return cat_freq, spec_freq, list(spec_freqs[spec_index] - cat_freqs[cat_index])
         return cat_freq, spec_freq
 
     def scale_to_spectrum(self, spectrum, asn, dictionary=None, thresh=None):
@@ -1336,35 +1662,26 @@ class Cat:
         if thresh is None:
             thresh = 0.010
         cat_lnlst = self.line_list(dictionary)
-        cat_lnlst = np.array(
-            [cat_lnlst[x, :] for x in range(len(cat_lnlst)) for y in range(len(asn)) if
-             (cat_lnlst[x, 0] + thresh) >= asn[y] >= (cat_lnlst[x, 0] - thresh)])
-        exp_intens = []
-        cat_intens = []
-        for x in range(len(cat_lnlst)):
-            freq = cat_lnlst[x, 0]
-            try:
-                exp_intens.append(spectrum.get_intensity(freq))
-                cat_intens.append(cat_lnlst[x, 1])
-            except (KeyError, IndexError):
-                pass
-        intens = np.column_stack((cat_intens, exp_intens))
-        intens = np.array([intens[x, :] for x in range(len(intens)) if intens[x, 1] != 0])
-        scale_factors = [intens[x, 1] / intens[x, 0] for x in range(len(intens))]
-
-        zscore_check = True
-        while zscore_check:
-            sf_mean = np.mean(scale_factors)
-            sf_stdev = np.std(scale_factors)
-            z_min = sf_mean - 3 * sf_stdev
-            z_max = sf_mean + 3 * sf_stdev
-            len_1 = len(scale_factors)
-            scale_factors = [
-                scale_factor for scale_factor in scale_factors if z_min <= scale_factor <= z_max]
-            len_2 = len(scale_factors)
-            if len_1 == len_2:
-                zscore_check = False
-        scale_factor = np.mean(scale_factors)
+        # One row per (transition, assignment) match, ordered by transition, then assignment.
+        asn_index, line_index = match_frequencies(asn, cat_lnlst[:, 0], thresh)
+        cat_lnlst = cat_lnlst[line_index[np.lexsort((asn_index, line_index))]]
+        # Transitions outside the spectrum get 0 intensity and are dropped with the zeros.
+        exp_intens = spectrum.get_intensity(cat_lnlst[:, 0], fill=0)
+        intens = np.column_stack((cat_lnlst[:, 1], exp_intens))
+        intens = intens[intens[:, 1] != 0]
+        scale_factors = intens[:, 1] / intens[:, 0]
+
+        # Drop scale factors outside mean +/- 3 stdev until none are dropped.
+        keep = np.ones(len(scale_factors), dtype=bool)
+        while True:
+            sf_mean = np.mean(scale_factors[keep])
+            sf_stdev = np.std(scale_factors[keep])
+            inside = keep & (scale_factors >= sf_mean - 3 * sf_stdev) & (
+                scale_factors <= sf_mean + 3 * sf_stdev)
+            if inside.sum() == keep.sum():
+                break
+            keep = inside
+        scale_factor = np.mean(scale_factors[keep])
         return scale_factor
 
 # c = 'C:\\Users\\chann\\OneDrive\\Graduate School\\Pate Group\\Code\\Rotational Spectroscopy Data Analysis 4_24_2020\\3_1_2021_Testing\\FinalFit\\test_RR_1d.cat'
@@ -1372,6 +1689,147 @@ class Cat:
 # f = cat.cat
 
 
+# One row per peak of CatIndex.assign(). species is -1 and cat_freq, residual are NaN when no
+# line of any species is within thresh.
+ASSIGN_DTYPE = np.dtype([
+    ('freq', '<f8'), ('intensity', '<f8'), ('species', '<i4'), ('cat_freq', '<f8'),
+    ('residual', '<f8'), ('num_species', '<i4')])
+
+
+class CatIndex:
+    """
+    Frequency-sorted index over the lines of many catalogs, tagged by species.
+
+    Lines of all catalogs are merged into one sorted array, so a peak pick is matched against
+    every species in a single searchsorted pass (see match_frequencies()). Use to attribute the
+    peaks of a mixture spectrum to known species and to list the lines no species explains.
+
+    Parameters:
+        cats (list of Cat or str):
+            Cat objects or *.cat file paths.
+        dictionaries (list of dict or CatView):
+            Filtered lines of each cat, for example Cat.filter() output. None entries use all
+            lines.
+            Default: all lines of every cat
+        names (list of str):
+            Name of each species.
+            Default: Cat.fname
+    Attributes:
+        names (list of str):
+            Species names. The species number of a line is its position in this list.
+        lines (structured array):
+            Lines of all species, dtype CAT_DTYPE, sorted by frequency.
+        species (array of int):
+            Species number of each row of lines.
+    Methods:
+        matches(spec_pp, thresh)
+            Return every (peak, line) pair within thresh.
+        assign(spec_pp, thresh)
+            Return the species explaining each peak, and how many species could.
+        unassigned(spec_pp, thresh)
+            Return peaks that no species explains.
+    """
+
+    def __init__(self, cats, dictionaries=None, names=None):
+        cats = [cat if isinstance(cat, Cat) else Cat(cat) for cat in cats]
+        if dictionaries is None:
+            dictionaries = [None] * len(cats)
+        if names is None:
+            names = [cat.fname for cat in cats]
+        if not len(cats) == len(dictionaries) == len(names):
+            raise ValueError('Provide one dictionary and one name per cat.')
+        self.names = list(names)
+        lines = [cat.get_lines(dictionary) for cat, dictionary in zip(cats, dictionaries)]
+        species = [np.full(len(x), num, dtype=int) for num, x in enumerate(lines)]
+        lines = np.concatenate(lines) if lines else np.zeros(0, dtype=CAT_DTYPE)
+        species = np.concatenate(species) if species else np.zeros(0, dtype=int)
+        order = np.argsort(lines['freq'], kind='mergesort')
+        self.lines = lines[order]
+        self.species = species[order]
+
+    def matches(self, spec_pp, thresh=None):
+        """
+        Return every pair of peak and catalog line within thresh.
+
+        Parameters:
+            spec_pp (array):
+                Peak pick. col[0] -> freq, col[1] -> intensity.
+            thresh (float):
+                Max abs(exp. - calc.) of a match.
+                Units: MHz
+                Default: 0.020
+        Returns:
+            peak (array of int):
+                Row of spec_pp.
+            line (array of int):
+                Row of self.lines.
+            residual (array):
+                exp. - calc. frequency.
+                Units: MHz
+        """
+        if thresh is None:
+            thresh = 0.020
+        spec_freqs = np.asarray(spec_pp, dtype=float)[:, 0]
+        peak, line = match_frequencies(spec_freqs, self.lines['freq'], thresh)
+        return peak, line, spec_freqs[peak] - self.lines['freq'][line]
+
+    def assign(self, spec_pp, thresh=None):
+        """
+        Attribute each peak to the species with the closest line within thresh.
+
+        Parameters:
+            spec_pp (array):
+                Peak pick. col[0] -> freq, col[1] -> intensity.
+            thresh (float):
+                Max abs(exp. - calc.) of a match.
+                Units: MHz
+                Default: 0.020
+        Returns:
+            assignments (structured array):
+                dtype ASSIGN_DTYPE, one row per peak, in the order of spec_pp.
+                species -> number of the closest species (see self.names), -1 if none.
+                num_species -> number of species with a line within thresh. Peaks with
+                num_species > 1 are ambiguous overlaps.
+        """
+        spec_pp = np.asarray(spec_pp, dtype=float)
+        peak, line, residual = self.matches(spec_pp, thresh)
+        assignments = np.zeros(len(spec_pp), dtype=ASSIGN_DTYPE)
+        assignments['freq'] = spec_pp[:, 0]
+        assignments['intensity'] = spec_pp[:, 1]
+        assignments['species'] = -1
+        assignments['cat_freq'] = np.nan
+        assignments['residual'] = np.nan
+        # Closest line of each peak: first pair after sorting by peak, then abs(residual).
+        order = np.lexsort((np.abs(residual), peak))
+        peaks, first = np.unique(peak[order], return_index=True)
+        best = order[first]
+        assignments['species'][peaks] = self.species[line[best]]
+        assignments['cat_freq'][peaks] = self.lines['freq'][line[best]]
+        assignments['residual'][peaks] = residual[best]
+        peak_species = np.unique(peak * len(self.names) + self.species[line])
+        assignments['num_species'] = np.bincount(
+            peak_species // max(len(self.names), 1), minlength=len(spec_pp))
+        return assignments
+
+    def unassigned(self, spec_pp, thresh=None):
+        """
+        Return peaks that no species explains within thresh.
+
+        Parameters:
+            spec_pp (array):
+                Peak pick. col[0] -> freq, col[1] -> intensity.
+            thresh (float):
+                Max abs(exp. - calc.) of a match.
+                Units: MHz
+                Default: 0.020
+        Returns:
+            unassigned (array):
+                Rows of spec_pp without a match.
+        """
+        spec_pp = np.asarray(spec_pp, dtype=float)
+        return spec_pp[self.assign(spec_pp, thresh)['species'] == -1]
+
+
 class Piform:
     """
     Class for Piform output files. Accepted file extension: *.pi
@@ -8,21 +8,48 @@ import numpy as np
 import math
 import scipy
 import scipy.signal
+import scipy.fftpack
 import os
+import glob
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import Text_Writer
 # import Spectrum_Operations
-from itertools import groupby
-from operator import itemgetter
 
 np.set_printoptions(edgeitems=20)
 
+# Binary FID container (*.fid). Fixed size header followed by raw float32 or float64 samples.
+FID_MAGIC = b'MRRFID'
+FID_VERSION = 1
+FID_HEADER_SIZE = 256
+FID_HEADER = np.dtype([
+    ('magic', 'S8'), ('version', '<u2'), ('dtype', 'S4'), ('npoints', '<u8'), ('srate', '<f8'),
+    ('num_avgs', '<i8'), ('sample', 'S64'), ('setup', 'S16'), ('temp', '<f8'), ('chirp', '<f8'),
+    ('pressure', '<f8')])
+
+# Binary spectra matrix (*.mtx). Fixed size header, newline separated file names, then raw
+# column-major samples starting on a MATRIX_ALIGN byte boundary.
+MATRIX_MAGIC = b'MRRMTX'
+MATRIX_VERSION = 1
+MATRIX_ALIGN = 64
+MATRIX_HEADER = np.dtype([
+    ('magic', 'S8'), ('version', '<u2'), ('dtype', 'S4'), ('nrows', '<u8'), ('ncols', '<u8'),
+    ('names_len', '<u8')])
+
 
 class FID:
     """
     Class for time domain free induction decay data.
 
-    Accepted file types include: *.txt
+    Accepted file types include: *.txt, *.fid
         Default edtension of raw time data is *.txt
+        *.fid is the binary FID container written by write_fid(). Samples are memory-mapped
+        rather than parsed, and srate is read from the file header unless srate is given.
 
     Default parameters of this class reflect the most common parameters used in the Pate Group,
     25 GSa/sec 2-8 GHz, 50 GSa/sec 6-18 GHz.
@@ -33,22 +60,41 @@ class FID:
             Single column array. col[0] -> electric field.
             May be 2 column array if older files are used.
             col[0] -> time, col[1] -> electric field.
+            np.memmap if the file is *.fid.
+        header (dict):
+            Header of a *.fid file. See read_fid_header().
+            Default: None
         srate (int):
             sampling rate.
             Units: Samples/second
             Default: 25E9
+        dtype (np.dtype):
+            Processing precision, float64 or float32. With float32, FIDs, windows and zero-padded
+            buffers are single precision, FFTs are complex64, and spectra are returned as float32.
+            Spectra agree with float64 to ~2E-7 of the spectrum maximum. The frequency column is
+            rounded to within 2.5E-4 MHz below 8 GHz (5E-4 MHz below 16 GHz), well below the
+            point spacing.
+            Default: float64
         point_spacing (float):
             time spacing between samples.
             Units: MHz.
         ff_fid (array):
-            Holds array after running gate().
+            FID after gate(). View of self.fid, no copy.
             Default: None
         ff_kb_fid (array):
-            Holds array after running kaiser_window().
+            FID after kaiser_window().
+            Default: None
+        ff_kb_abs_fid (array):
+            Normalized absolute value of ff_kb_fid.
             Default: None
         ff_kb_zp_fid (array):
-            Holds array after running zeropad().
+            FID after zeropad().
             Default: None
+
+        The processing stages (ff_fid, ff_kb_fid, ff_kb_abs_fid, ff_kb_zp_fid) are lazy.
+        gate(), kaiser_window(), and zeropad() only record their parameters. Each stage is computed
+        the first time it is accessed, kept until release() is called, and recomputed if accessed
+        again. fft() does not build ff_kb_zp_fid, since the FFT zero-pads internally.
     Methods:
         add_time_column(fid, total_time, units)
             Returns 2 column array. col[0] -> time, col[1] -> electric field.
@@ -62,9 +108,11 @@ class FID:
             Functions as a wrapper for gate(), kaiser_window(), and zeropad().
         fft(fid, fstart, fstop, full_ft)
             Performs a fast Fourier transform on a FID.
-        quick_fft(frac, kb, total_time, units, fstart, fstop, full_ft)
+        quick_fft(frac, kb, total_time, units, fstart, fstop, full_ft, method)
             Full FID processing (gate, window filter, zeropad, fft) without creating copies at
             each step.
+        sweep(fracs, kbs, total_times, fstart, fstop, ref_freqs, ref_window, units)
+            Magnitude FFTs and quality metrics for a grid of processing parameters.
         time_column_fid(units):
             Add time column to self.fid. Useful for graphing.
         time_column_ff_fid(units):
@@ -73,35 +121,176 @@ class FID:
             Add time column to self.ff_kb_fid. Useful for graphing.
         time_column_ff_kb_zp_fid(units):
             Add time column to self.ff_kb_zp_fid. Useful for graphing.
+        release(*stages)
+            Free memory held by computed processing stages.
+        decimated(stage, max_points, units)
+            Return min/max decimated time axis and signal of a stage for plotting.
     """
+    stages = ('ff_fid', 'ff_kb_fid', 'ff_kb_abs_fid', 'ff_kb_zp_fid')
 
-    def __init__(self, file, srate=None):
+    def __init__(self, file, srate=None, dtype=None):
         self.fname = file
+        self.header = None
+        self.dtype = processing_dtype(dtype)
         ext = os.path.splitext(file)[1]
-        if ext == '.txt':
+        if ext == '.fid':
+            self.header = read_fid_header(file)
+            self.fid = np.memmap(
+                file, dtype=self.header['dtype'], mode='r', offset=FID_HEADER_SIZE,
+                shape=(self.header['npoints'], 1))
+            if srate is None and self.header['srate'] is not None:
+                srate = self.header['srate']
+        elif ext == '.txt':
             self.fid = pd.read_csv(file, sep='\n', header=None).values
             # Following 4 lines for old file format, with header and time column already appended.
             if type(self.fid[0][0]) == str:
                 for x in range(len(self.fid)):
                     new_x = float(self.fid[x][0].split('\t')[-1])
                     self.fid[x] = new_x
-            if srate is None:
-                self.srate = 25E9
-            elif srate == 25:
-                self.srate = 25E9
-            elif srate == 50:
-                self.srate = 50E9
-            else:
-                self.srate = srate
+            if dtype is not None:
+                self.fid = self.fid.astype(self.dtype)
+        if ext in ['.txt', '.fid']:
+            self.srate = normalize_srate(srate)
             self.point_spacing = 1 / (self.srate * 1E6)
             self.fid_time = len(self.fid) / self.srate
-            self.ff_fid = None
             self.ff = None
-            self.ff_kb_fid = None
-            self.ff_kb_abs_fid = None
             self.kb = None
-            self.ff_kb_zp_fid = None
+            self.abs_norm = True
             self.zp = None
+            self.zp_points = None
+            self._stages = {}
+
+    @property
+    def ff_fid(self):
+        return self._get_stage('ff_fid')
+
+    @ff_fid.setter
+    def ff_fid(self, arr):
+        self._set_stage('ff_fid', arr)
+
+    @property
+    def ff_kb_fid(self):
+        return self._get_stage('ff_kb_fid')
+
+    @ff_kb_fid.setter
+    def ff_kb_fid(self, arr):
+        self._set_stage('ff_kb_fid', arr)
+
+    @property
+    def ff_kb_abs_fid(self):
+        return self._get_stage('ff_kb_abs_fid')
+
+    @ff_kb_abs_fid.setter
+    def ff_kb_abs_fid(self, arr):
+        self._set_stage('ff_kb_abs_fid', arr)
+
+    @property
+    def ff_kb_zp_fid(self):
+        return self._get_stage('ff_kb_zp_fid')
+
+    @ff_kb_zp_fid.setter
+    def ff_kb_zp_fid(self, arr):
+        self._set_stage('ff_kb_zp_fid', arr)
+
+    def _get_stage(self, name):
+        """ Return processing stage, computing it if it has not been computed or was released. """
+        if name in self._stages:
+            return self._stages[name]
+        if name == 'ff_fid':
+            if self.ff is None:
+                return None
+            # View of self.fid. Nothing to cache.
+            return self.fid[0:round(len(self.fid) * self.ff), -1:]
+        elif name == 'ff_kb_fid':
+            if self.kb is None:
+                return None
+            fid = np.asarray(self.ff_fid[:, -1], dtype=self.dtype)
+            arr = np.multiply(fft_plan(len(fid), self.kb, dtype=self.dtype).window, fid,
+                              dtype=self.dtype)
+        elif name == 'ff_kb_abs_fid':
+            if self.kb is None or not self.abs_norm:
+                return None
+            arr = np.abs(self.ff_kb_fid)
+            arr /= arr.max()
+        elif name == 'ff_kb_zp_fid':
+            if self.zp_points is None:
+                return None
+            fid = self.ff_kb_fid
+            arr = np.zeros((self.zp_points,), dtype=self.dtype)
+            arr[:len(fid)] = fid
+        self._stages[name] = arr
+        return arr
+
+    def _set_stage(self, name, arr):
+        """ Replace a processing stage. Computed stages downstream of it are released. """
+        self.release(*self.stages[self.stages.index(name):])
+        if arr is not None:
+            self._stages[name] = arr
+
+    def release(self, *stages):
+        """
+        Free memory held by computed processing stages. Parameters are kept, so a released stage
+        is recomputed if it is accessed again.
+
+        Parameters:
+            stages (str):
+                Any of 'ff_fid', 'ff_kb_fid', 'ff_kb_abs_fid', 'ff_kb_zp_fid'.
+                Default: all stages
+        """
+        if not stages:
+            stages = self.stages
+        for name in stages:
+            self._stages.pop(name, None)
+
+    def decimated(self, stage='fid', max_points=None, units='usec'):
+        """
+        Return time axis and signal of a processing stage, decimated for plotting.
+
+        The stage is split into max_points / 2 blocks and the minimum and maximum of each block
+        are kept, so the envelope of the signal is preserved. Blocks are reshaped views of the
+        stage, so the full stage is never copied.
+
+        Parameters:
+            stage (str):
+                'fid', 'ff_fid', 'ff_kb_fid', 'ff_kb_abs_fid', or 'ff_kb_zp_fid'.
+                Default: 'fid'
+            max_points (int):
+                Maximum number of points returned.
+                Default: 20000
+            units (str):
+                Units of the time axis. 'usec' or 'sec'.
+                Default: 'usec'
+        Returns:
+            time (array):
+                Time axis.
+            signal (array):
+                Decimated signal.
+        Raises:
+            ValueError:
+                If stage is not a processing stage, or has not been computed.
+        """
+        if max_points is None:
+            max_points = 20000
+        if stage != 'fid' and stage not in self.stages:
+            raise ValueError("stage must be 'fid' or one of {}.".format(', '.join(self.stages)))
+        arr = self.fid if stage == 'fid' else getattr(self, stage)
+        if arr is None:
+            raise ValueError(
+                '{} has not been computed. Set its processing parameters first (for example '
+                'gate_kaiser_zeropad()), and abs_norm=True for ff_kb_abs_fid.'.format(stage))
+        if arr.ndim == 2:
+            arr = arr[:, -1]
+        scale = 1E6 if units == 'usec' else 1
+        step = max(1, math.ceil(2 * len(arr) / max_points))
+        if step == 1:
+            return np.arange(len(arr)) * (scale / self.srate), arr
+        num_blocks = len(arr) // step
+        blocks = arr[:num_blocks * step].reshape((num_blocks, step))
+        signal = np.empty(2 * num_blocks)
+        signal[0::2] = blocks.min(axis=1)
+        signal[1::2] = blocks.max(axis=1)
+        time = np.repeat(np.arange(num_blocks) * step, 2) * (scale / self.srate)
+        return time, signal
 
     def gate(self, frac=None, time_column=False):
         """
@@ -118,9 +307,7 @@ class FID:
         """
         if frac is None:
             frac = 1
-        fid = self.fid[:, -1]
-        fid = fid[0:(round(len(fid) * frac))]
-        self.ff_fid = np.reshape(fid, newshape=(len(fid), 1))
+        self.release()
         self.ff = frac
         if time_column:
             self.time_column_ff_fid()
@@ -146,20 +333,13 @@ class FID:
                 Units: microseconds
                 Default: False
         """
-        if self.ff_fid is None:
-            fid_initial = self.fid[:, -1].flatten()
+        if self.ff is None:
             self.ff = 1
-        else:
-            fid_initial = self.ff_fid[:, -1].flatten()
         if kb is None:
             kb = 9.5
-        kaiser_window = np.kaiser(len(fid_initial), kb)
-        fid = np.multiply(kaiser_window, fid_initial)
-        self.ff_kb_fid = fid
-        if abs_norm:
-            abs_norm_kaiser = np.abs(fid)
-            abs_norm_kaiser = abs_norm_kaiser / abs_norm_kaiser.max()
-            self.ff_kb_abs_fid = abs_norm_kaiser
+        self.release('ff_kb_fid', 'ff_kb_abs_fid', 'ff_kb_zp_fid')
+        self.kb = kb
+        self.abs_norm = abs_norm
         if time_column:
             self.time_column_ff_kb_fid()
 
@@ -182,19 +362,15 @@ class FID:
                 Units: microseconds
                 Default: False
         """
-        if self.ff_kb_fid is None:
+        if self.kb is None:
             self.kaiser_window()
-        else:
-            fid = self.ff_kb_fid
         if total_time is None:
             total_time = 80
         if units == 'usec':
             self.zp = total_time
             total_time = total_time * 1E-6
-        point_num = round(total_time * self.srate)
-        zp_fid = np.zeros((point_num,))
-        zp_fid[:len(fid)] = fid
-        self.ff_kb_zp_fid = zp_fid
+        self.release('ff_kb_zp_fid')
+        self.zp_points = round(total_time * self.srate)
         if time_column:
             self.time_column_ff_kb_zp_fid()
 
@@ -226,7 +402,8 @@ class FID:
         """
         Calculate the fast Fourier transform of a FID.
 
-        Complete FID filtering if not done already.
+        Complete FID filtering if not done already. Zero-padding to the zeropad() total time is
+        done inside the FFT, so self.ff_kb_zp_fid is not computed.
 
         Parameters:
             fstart (int):
@@ -247,39 +424,36 @@ class FID:
                 Col[1] -> magnitude or real
                 Col[2] -> imaginary
         """
-        if self.ff_kb_zp_fid is None:
+        if self.kb is None:
+            self.kaiser_window()
+        fid = self.ff_kb_fid
+        if fid.ndim == 2:
+            fid = fid[:, -1]
+        if self.zp_points is None:
             self.zp = 0
-            if self.ff_kb_fid is None:
-                self.kaiser_window()
-            fid = self.ff_kb_fid
+            point_num = len(fid)
         else:
-            fid = self.ff_kb_zp_fid
+            point_num = self.zp_points
         if fstart is None:
             fstart = 2000
         if fstop is None:
             fstop = 8000
 
-        fft = scipy.fftpack.fft(fid) / 100
-        freq = (scipy.fftpack.fftfreq(len(fid), d=(1 / self.srate))) / 1E6
-
-        fid_time = len(fid) / self.srate
-        freq_res = round((1 / fid_time * 1E-6), 4)
-
-        index_start = int(round((fstart - freq[0]) / freq_res))
-        index_stop = int(round((fstop - freq[0]) / freq_res))
-
-        freqs = freq[index_start:index_stop]
+        index_start, index_stop, freqs = fft_band(self.srate, point_num, fstart, fstop)
+        signal = real_fft(fid, n=point_num)[index_start:index_stop] / 100
         if full_ft:
-            ft_real = fft[index_start:index_stop].real
-            ft_imag = fft[index_start:index_stop].imag
-            fft = np.column_stack((freqs, ft_real, ft_imag))
+            fft = np.zeros((len(freqs), 3), dtype=self.dtype)
+            fft[:, 0] = freqs
+            fft[:, 1] = signal.real
+            fft[:, 2] = signal.imag
         else:
-            ft_mag = np.abs(fft[index_start:index_stop])
-            fft = np.column_stack((freqs, ft_mag))
+            fft = np.zeros((len(freqs), 2), dtype=self.dtype)
+            fft[:, 0] = freqs
+            fft[:, 1] = np.absolute(signal)
         return fft
 
     def quick_fft(self, frac=None, kb=None, total_time=None, fstart=None, fstop=None,
-                  full_ft=False, units='usec'):
+                  full_ft=False, units='usec', method=None):
         """
         Full FID processing (gate, window filter, zeropad, fft) without creating copies at each step.
 
@@ -288,6 +462,9 @@ class FID:
         memory intensive. This method is faster and should be used for automated data archiving
         where the instrument is still consuming sample while the data is being saved and processed.
 
+        Computed and returned in self.dtype. The 'czt' method transforms in double precision and
+        stores the result in self.dtype.
+
         Parameters:
             frac (float):
                 Fraction of the FID to keep. Value between 0 and 1.
@@ -313,6 +490,15 @@ class FID:
             full_ft (bool):
                 if True, real and imaginary. If False, magnitude.
                 Default:  False.
+            method (str):
+                'fft': real-input FFT of the full zero-padded record, then slice fstart-fstop.
+                'czt': chirp-z (zoom) transform of only the fstart-fstop band, at the point
+                    spacing zero-padding to total_time would give. Matches 'fft' to ~1E-14
+                    relative. Work scales with FID length + band length instead of total_time,
+                    so it is faster only when the band is narrow compared to the sampling rate
+                    (for example a 100 MHz window, or very long total_time).
+                'auto': 'czt' when its transform is less than 1/6 the length of the full FFT.
+                Default: 'fft'
         Returns:
             fft (array):
                 Shape:
@@ -338,41 +524,138 @@ class FID:
             fstart = 2000
         if fstop is None:
             fstop = 8000
+        if method is None:
+            method = 'fft'
         partial_len = round(len(self.fid) * frac)
-        try:
-            if self.fid.shape[1] == 2:
-                fid = self.fid[0:partial_len, -1]
-        except IndexError:
-            pass
-        fid = self.fid
-        fid = fid.flatten()
-
-        window_filter = np.multiply(fid[0:partial_len], np.kaiser(partial_len, kb))
-
+        fid = np.asarray(self.fid[0:partial_len, -1], dtype=self.dtype)
         point_num = round(total_time * self.srate)
-        fid = np.zeros((point_num,))
-        fid[0:len(window_filter)] = window_filter
-
-        signal = scipy.fftpack.fft(fid) / 100
-        freq = (scipy.fftpack.fftfreq(len(fid), d=(1 / self.srate))) / 1E6
-
-        fid_time = len(fid) / self.srate
-        freq_res = round((1 / fid_time * 1E-6), 4)
-        len_arr = int((fstop - fstart) * len(fid) / (self.srate * 1E-6))
-        index_start = int(round((fstart - freq[0]) / freq_res))
-        index_stop = int(round((fstop - freq[0]) / freq_res))
-        freqs = freq[index_start:index_stop]
+        plan = fft_plan(partial_len, kb, point_num, dtype=self.dtype)
+        index_start, index_stop, freqs = fft_band(self.srate, point_num, fstart, fstop)
+        len_arr = index_stop - index_start
+        if method == 'auto':
+            czt_len = scipy.fftpack.next_fast_len(partial_len + len_arr - 1)
+            method = 'czt' if 6 * czt_len < point_num else 'fft'
+        if method == 'fft':
+            signal = plan.rfft(fid)[index_start:index_stop] / 100
+        elif method == 'czt':
+            signal = plan.czt(fid, index_start, len_arr) / 100
+        else:
+            raise ValueError("method must be 'fft', 'czt', or 'auto'.")
         if full_ft:
-            fft = np.zeros((len_arr, 3))
+            fft = np.zeros((len_arr, 3), dtype=self.dtype)
             fft[:, 0] = freqs
-            fft[:, 1] = signal[index_start:index_stop].real
-            fft[:, 2] = signal[index_start:index_stop].imag
+            fft[:, 1] = signal.real
+            fft[:, 2] = signal.imag
         else:
-            fft = np.zeros((len_arr, 2))
+            fft = np.zeros((len_arr, 2), dtype=self.dtype)
             fft[:, 0] = freqs
-            fft[:, 1] = np.absolute(signal[index_start:index_stop])
+            fft[:, 1] = np.absolute(signal)
         return fft
 
+    def sweep(self, fracs=None, kbs=None, total_times=None, fstart=None, fstop=None,
+              ref_freqs=None, ref_window=None, units='usec'):
+        """
+        Magnitude FFTs for every combination of frac, kb, and total_time, plus quality metrics.
+
+        The FID is loaded once. For each (frac, total_time), the gated FID is multiplied by the
+        windows of every kb at once (windows shared through fft_plan()) and transformed in a
+        single real-input FFT along the time axis.
+
+        Parameters:
+            fracs (list of float):
+                Fractions of the FID to keep.
+                Default: [1]
+            kbs (list of float):
+                Kaiser-Bessel window parameters.
+                Default: [9.5]
+            total_times (list of float):
+                Total times, FID plus zeropadding.
+                Units: microseconds
+                Default: [80]
+            fstart (int):
+                Starting frequency of the fft
+                Units: MHz.
+                Default:  2000.
+            fstop (int):
+                Stopping frequency of the fft
+                Units: MHz.
+                Default:  8000.
+            ref_freqs (list of float):
+                Reference transitions. Peak height is reported for each.
+                Units: MHz.
+                Default: None
+            ref_window (float):
+                Peak height is the maximum within ref_freq +/- ref_window.
+                Units: MHz.
+                Default: 0.05
+            units (str):
+                'usec' or 'sec'. Units of total_times.
+                Default:  'usec'.
+        Returns:
+            spectra (dict):
+                Key: total_time. Frequency spacing depends on total_time, so each total_time has
+                its own matrix.
+                Val: (labels, matrix)
+                    labels (list of tuples): (frac, kb, total_time) for each matrix column
+                        after col[0].
+                    matrix (array): build_matrix() layout. col[0] -> frequency.
+                        col[n] -> magnitude for labels[n - 1].
+            metrics (structured array):
+                One row per combination, in the same order as the labels.
+                frac, kb, total_time: processing parameters.
+                noise: noise floor, taken as the median magnitude over fstart to fstop.
+                peaks: height of each reference transition.
+                snr: peaks / noise.
+        """
+        fracs = [1] if fracs is None else list(np.atleast_1d(fracs))
+        kbs = [9.5] if kbs is None else list(np.atleast_1d(kbs))
+        total_times = [80] if total_times is None else list(np.atleast_1d(total_times))
+        if fstart is None:
+            fstart = 2000
+        if fstop is None:
+            fstop = 8000
+        ref_freqs = [] if ref_freqs is None else list(np.atleast_1d(ref_freqs))
+        if ref_window is None:
+            ref_window = 0.05
+        n_ref = len(ref_freqs)
+        metrics = np.zeros(len(fracs) * len(kbs) * len(total_times), dtype=[
+            ('frac', 'f8'), ('kb', 'f8'), ('total_time', 'f8'), ('noise', 'f8'),
+            ('peaks', 'f8', (n_ref,)), ('snr', 'f8', (n_ref,))])
+        spectra = {}
+        row = 0
+        for total_time in total_times:
+            point_num = round(total_time * (1E-6 if units == 'usec' else 1) * self.srate)
+            index_start, index_stop, freqs = fft_band(self.srate, point_num, fstart, fstop)
+            matrix = np.zeros((len(freqs), len(fracs) * len(kbs) + 1))
+            matrix[:, 0] = freqs
+            labels = []
+            for frac in fracs:
+                partial_len = round(len(self.fid) * frac)
+                fid = np.asarray(self.fid[0:partial_len, -1], dtype=float)
+                windows = np.vstack([fft_plan(partial_len, kb).window for kb in kbs])
+                signal = np.fft.rfft(windows * fid, n=point_num, axis=1)
+                col = len(labels) + 1
+                matrix[:, col:col + len(kbs)] = np.abs(signal[:, index_start:index_stop]).T / 100
+                del signal
+                labels.extend((frac, kb, total_time) for kb in kbs)
+            spectra[total_time] = (labels, matrix)
+
+            block = metrics[row:row + len(labels)]
+            block['frac'], block['kb'], block['total_time'] = np.array(labels).T
+            block['noise'] = np.median(matrix[:, 1:], axis=0)
+            if n_ref:
+                spacing = freqs[1] - freqs[0]
+                half = int(round(ref_window / spacing))
+                for x, ref in enumerate(ref_freqs):
+                    center = int(round((ref - freqs[0]) / spacing))
+                    lower = max(center - half, 0)
+                    upper = min(center + half + 1, len(freqs))
+                    if lower < upper:
+                        block['peaks'][:, x] = matrix[lower:upper, 1:].max(axis=0)
+                block['snr'] = block['peaks'] / block['noise'][:, None]
+            row += len(labels)
+        return spectra, metrics
+
     def time_column_fid(self, units='usec'):
         """
         Add time column to self.fid. Useful for graphing.
@@ -476,13 +759,956 @@ class FID:
         self.ff_kb_zp_fid = time_fid
 
 
+def fft_band(srate, point_num, fstart, fstop):
+    """
+    Return FFT bin range and frequencies between fstart and fstop for a zero-padded record.
+
+    Parameters:
+        srate (float):
+            Sampling rate.
+            Units: Samples/second
+        point_num (int):
+            Number of points in the zero-padded record.
+        fstart (float):
+            Starting frequency.
+            Units: MHz
+        fstop (float):
+            Stopping frequency.
+            Units: MHz
+    Returns:
+        index_start (int):
+            First bin.
+        index_stop (int):
+            Bin after the last bin.
+        freqs (array):
+            Frequency of each bin.
+            Units: MHz
+    """
+    fid_time = point_num / srate
+    freq_res = round((1 / fid_time * 1E-6), 4)
+    index_start = int(round(fstart / freq_res))
+    index_stop = int(round(fstop / freq_res))
+    freqs = np.arange(index_start, index_stop) * (srate / point_num) / 1E6
+    return index_start, index_stop, freqs
+
+
+def czt_factors(x_len, k_start, num, n_fft):
+    """
+    Return the precomputable parts of czt_band() for a given input length and band.
+
+    Parameters:
+        x_len (int):
+            Length of the input signal.
+        k_start (int):
+            First DFT bin.
+        num (int):
+            Number of DFT bins.
+        n_fft (int):
+            Length of the equivalent zero-padded DFT.
+    Returns:
+        premod (array):
+            Chirp and frequency shift applied to the input.
+        kernel_fft (array):
+            FFT of the chirp convolution kernel.
+        postmod (array):
+            Chirp applied to the output.
+    """
+    conv_len = scipy.fftpack.next_fast_len(x_len + num - 1)
+    n = np.arange(x_len, dtype=np.int64)
+    premod = np.exp((-1j * np.pi / n_fft) * ((2 * k_start * n + n * n) % (2 * n_fft)))
+    j = np.arange(max(x_len, num), dtype=np.int64)
+    chirp = np.exp((-1j * np.pi / n_fft) * ((j * j) % (2 * n_fft)))
+    kernel = np.zeros(conv_len, dtype=complex)
+    kernel[:num] = np.conj(chirp[:num])
+    if x_len > 1:
+        kernel[conv_len - x_len + 1:] = np.conj(chirp[1:x_len])[::-1]
+    return premod, np.fft.fft(kernel), chirp[:num]
+
+
+def czt_band(x, k_start, num, n_fft, factors=None):
+    """
+    Return bins k_start to k_start + num of the n_fft point DFT of x, without the full transform.
+
+    Chirp-z transform (Bluestein's algorithm). x is treated as zero-padded to n_fft points. The
+    convolution length is len(x) + num - 1 rather than n_fft. Chirp phases are reduced modulo
+    2 * n_fft with integer arithmetic to keep float64 accuracy for multi-million point records.
+
+    Parameters:
+        x (array):
+            1-D signal. len(x) <= n_fft.
+        k_start (int):
+            First DFT bin.
+        num (int):
+            Number of DFT bins.
+        n_fft (int):
+            Length of the equivalent zero-padded DFT. Sets the bin spacing, srate / n_fft.
+        factors (tuple):
+            Output of czt_factors() for the same arguments. Computed if not given.
+            Default: None
+    Returns:
+        X (array):
+            Complex DFT bins.
+    """
+    if factors is None:
+        factors = czt_factors(len(x), k_start, num, n_fft)
+    premod, kernel_fft, postmod = factors
+    conv = np.fft.ifft(np.fft.fft(x * premod, len(kernel_fft)) * kernel_fft)
+    return postmod * conv[:num]
+
+
+class FFTPlan:
+    """
+    Precomputed window and work buffer for FIDs sharing length, Kaiser-Bessel parameter,
+    zero-padded length, and dtype. Obtain through fft_plan() so plans are shared across FID
+    instances.
+
+    Attributes:
+        length (int):
+            Number of FID points windowed.
+        kb (float):
+            Kaiser-Bessel window parameter.
+        point_num (int):
+            Zero-padded length. None if the plan only holds a window.
+        dtype (np.dtype):
+            float64 or float32. Precision of the window, buffer, and real-input FFT.
+        window (array):
+            Kaiser-Bessel window. Read-only.
+        buffer (array):
+            Zero-padded work buffer. Points past length are never written, so they stay zero.
+            The real-input FFT is taken at point_num, which sets the point spacing. Chirp-z
+            convolutions are padded to fast transform sizes (see czt_factors()).
+    Methods:
+        rfft(fid)
+            Window, zero-pad and real-input FFT the FID using the shared buffer.
+        czt(fid, k_start, num)
+            Window and chirp-z transform DFT bins k_start to k_start + num.
+    """
+
+    def __init__(self, length, kb, point_num=None, dtype=None):
+        self.length = length
+        self.kb = kb
+        self.point_num = point_num
+        self.dtype = processing_dtype(dtype)
+        self.window = np.kaiser(length, kb).astype(self.dtype)
+        self.window.setflags(write=False)
+        self.buffer = None
+        if point_num is not None:
+            self.buffer = np.zeros(point_num, dtype=self.dtype)
+        self._czt = {}
+        self._lock = threading.Lock()
+
+    def rfft(self, fid):
+        """
+        Return real-input FFT of the windowed, zero-padded FID. Positive frequencies only.
+
+        Parameters:
+            fid (array):
+                1-D FID. Only the first self.length points are used.
+        """
+        # Old format .txt FIDs are read as object arrays. Convert before writing into the buffer.
+        fid = np.asarray(fid[:self.length], dtype=self.dtype)
+        with self._lock:
+            np.multiply(fid, self.window, out=self.buffer[:self.length])
+            return real_fft(self.buffer)
+
+    def czt(self, fid, k_start, num):
+        """
+        Return DFT bins k_start to k_start + num of the windowed, zero-padded FID.
+
+        Chirp-z factors are cached on the plan for each band.
+
+        Parameters:
+            fid (array):
+                1-D FID. Only the first self.length points are used.
+            k_start (int):
+                First DFT bin.
+            num (int):
+                Number of DFT bins.
+        """
+        with self._lock:
+            key = (k_start, num)
+            if key not in self._czt:
+                self._czt[key] = czt_factors(self.length, k_start, num, self.point_num)
+            factors = self._czt[key]
+        fid = np.asarray(fid[:self.length], dtype=self.dtype)
+        return czt_band(fid * self.window, k_start, num, self.point_num, factors)
+
+
+class FFTPlanCache:
+    """
+    Least recently used cache of FFTPlan objects keyed by (length, kb, point_num, dtype).
+
+    Attributes:
+        maxsize (int):
+            Maximum number of plans held. Each plan holds a window and a zero-padded buffer
+            (16 MB for 80 microseconds at 25 GSa/s).
+        hits (int):
+            Number of lookups served from the cache.
+        misses (int):
+            Number of lookups that built a new plan.
+    Methods:
+        get(length, kb, point_num)
+            Return cached plan, building it on a miss.
+        info()
+            Return hits, misses, size, and maxsize.
+        clear()
+            Remove all plans and reset counters.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize if maxsize is not None else 4
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, length, kb, point_num=None, dtype=None):
+        """
+        Return FFTPlan for the given settings. Least recently used plan is evicted when full.
+
+        Parameters:
+            length (int):
+                Number of FID points windowed.
+            kb (float):
+                Kaiser-Bessel window parameter.
+            point_num (int):
+                Zero-padded length. None for a window-only plan.
+                Default: None
+            dtype (str):
+                'float64' or 'float32'.
+                Default: 'float64'
+        """
+        key = (int(length), float(kb), None if point_num is None else int(point_num),
+               processing_dtype(dtype).str)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self.hits += 1
+                self._plans.move_to_end(key)
+                return plan
+            self.misses += 1
+            plan = FFTPlan(*key)
+            self._plans[key] = plan
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+            return plan
+
+    def info(self):
+        """ Return dictionary of cache statistics. """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._plans),
+                'maxsize': self.maxsize}
+
+    def clear(self):
+        """ Remove all plans and reset hit and miss counters. """
+        with self._lock:
+            self._plans.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+FFT_PLAN_CACHE = FFTPlanCache()
+
+
+def fft_plan(length, kb, point_num=None, dtype=None):
+    """
+    Return shared FFTPlan from FFT_PLAN_CACHE.
+
+    Parameters:
+        length (int):
+            Number of FID points windowed.
+        kb (float):
+            Kaiser-Bessel window parameter.
+        point_num (int):
+            Zero-padded length. None for a window-only plan.
+            Default: None
+        dtype (str):
+            'float64' or 'float32'.
+            Default: 'float64'
+    """
+    return FFT_PLAN_CACHE.get(length, kb, point_num, dtype)
+
+
+def processing_dtype(dtype=None):
+    """
+    Return np.dtype for FID and spectrum processing. Raise ValueError if not float32 or float64.
+
+    Parameters:
+        dtype (str):
+            'float64' or 'float32'.
+            Default: 'float64'
+    """
+    if dtype is None:
+        return np.dtype('float64')
+    dtype = np.dtype(dtype)
+    if dtype not in [np.float32, np.float64]:
+        raise ValueError('dtype must be float32 or float64.')
+    return dtype
+
+
+def real_fft(x, n=None, axis=-1):
+    """
+    Real-input FFT, positive frequencies only, in the precision of x.
+
+    float64 input uses np.fft.rfft (complex128 output). float32 input uses the single precision
+    scipy.fftpack transform (complex64 output), since np.fft always computes in double precision.
+
+    Parameters:
+        x (array):
+            Real input.
+        n (int):
+            Transform length. x is zero-padded or truncated to n.
+            Default: x.shape[axis]
+        axis (int):
+            Axis of the transform.
+            Default: -1
+    """
+    if x.dtype != np.float32:
+        return np.fft.rfft(x, n=n, axis=axis)
+    if n is None:
+        n = x.shape[axis]
+    signal = scipy.fftpack.fft(x, n=n, axis=axis)
+    index = [slice(None)] * signal.ndim
+    index[axis] = slice(0, n // 2 + 1)
+    return signal[tuple(index)]
+
+
+def fid_fname_metadata(file):
+    """
+    Return acquisition details encoded in a time-domain file name.
+
+    Naming convention (see Broadband_Controller.Auto_Controller.py):
+    {time}_{sample}_{setup}_{# FIDs}k_{temp}C_{chirp dur}us_{pressure}psig_.{ext}
+    Co-added files begin with 'CoAdd' instead of a time stamp. Fields that cannot be found are
+    returned as None.
+
+    Parameters:
+        file (str):
+            File path.
+    Returns:
+        metadata (dict):
+            Keys: num_avgs, sample, setup, temp, chirp, pressure
+    """
+    split_name = os.path.splitext(os.path.basename(file))[0].split('_')
+    metadata = {'num_avgs': None, 'sample': None, 'setup': None, 'temp': None, 'chirp': None,
+                'pressure': None}
+    suffixes = (('psig', 'pressure'), ('us', 'chirp'), ('C', 'temp'))
+    setup_idx = None
+    for i, x in enumerate(split_name):
+        if x in ['2to8', '6to18']:
+            metadata['setup'] = x
+            setup_idx = i
+            continue
+        for suffix, key in suffixes:
+            if x.endswith(suffix):
+                try:
+                    metadata[key] = float(x[:-len(suffix)])
+                except ValueError:
+                    pass
+                break
+        else:
+            try:
+                if x.endswith('k'):
+                    metadata['num_avgs'] = int(x[:-1]) * 1000
+                elif x.endswith('fid'):
+                    metadata['num_avgs'] = int(x[:-3])
+            except ValueError:
+                pass
+    if setup_idx is not None:
+        sample = [x for x in split_name[:setup_idx] if not x.isdigit() and x != 'CoAdd']
+        metadata['sample'] = '_'.join(sample)
+    return metadata
+
+
+def normalize_srate(srate):
+    """
+    Return sampling rate in samples/second, as stored in FID.srate and *.fid headers.
+
+    Parameters:
+        srate (float):
+            Sampling rate. 25 and 50 are read as GSa/s.
+            Default: 25E9
+    """
+    if srate is None or srate == 25:
+        return 25E9
+    elif srate == 50:
+        return 50E9
+    return srate
+
+
+def read_fid_column(file, srate=None):
+    """
+    Return the electric field column of a time-domain file as a 1-D array.
+
+    Module level so it can be sent to worker processes by coadd_fids().
+
+    Parameters:
+        file (str):
+            File path. *.txt or *.fid.
+        srate (float):
+            Sampling rate.
+            Default: None
+    """
+    return FID(file, srate=srate).fid[:, -1]
+
+
+def fid_num_avgs(file):
+    """
+    Return number of FIDs averaged in a time-domain file.
+
+    Read from the header of *.fid files when available, otherwise from the file name
+    (see fid_fname_metadata()).
+
+    Parameters:
+        file (str):
+            File path.
+    Returns:
+        num_avgs (int):
+            Number of averages. None if unknown.
+    """
+    if os.path.splitext(file)[1] == '.fid':
+        num_avgs = read_fid_header(file)['num_avgs']
+        if num_avgs is not None:
+            return num_avgs
+    return fid_fname_metadata(file)['num_avgs']
+
+
+def iter_fid_columns(files, srate=None, processes=None):
+    """
+    Yield (file, fid) for each file, in order. fid is the 1-D electric field column.
+
+    *.fid files are memory-mapped when they are reached. *.txt files are parsed ahead of time
+    in a process pool, with at most `processes` files in flight, so the number of parsed FIDs
+    held in memory is bounded by the pool size.
+
+    Parameters:
+        files (iterable of str):
+            File paths. May be a generator.
+        srate (float):
+            Sampling rate.
+            Default: None
+        processes (int):
+            Worker processes used to parse *.txt files. 1 parses in the calling process.
+            Default: os.cpu_count()
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    executor = None
+    pending = deque()
+    try:
+        for file in files:
+            if processes > 1 and os.path.splitext(file)[1] == '.txt':
+                if executor is None:
+                    executor = ProcessPoolExecutor(max_workers=processes)
+                pending.append((file, executor.submit(read_fid_column, file, srate)))
+            else:
+                pending.append((file, None))
+            while len(pending) > processes:
+                yield _resolve_fid_column(pending.popleft(), srate)
+        while pending:
+            yield _resolve_fid_column(pending.popleft(), srate)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def _resolve_fid_column(item, srate):
+    """ Return (file, fid) from an iter_fid_columns() queue item. """
+    file, future = item
+    if future is None:
+        return file, read_fid_column(file, srate)
+    return file, future.result()
+
+
+def coadd_fids(files, srate=None, weight=None, chunk_size=None, processes=None):
+    """
+    Weighted average of time-domain files, computed in a single streaming pass.
+
+    Each FID is added into one float64 accumulator in chunks of chunk_size points, so peak
+    memory is the accumulator, the FID being read (memory-mapped for *.fid), and one chunk.
+    The running sum is divided by the total weight at the end, so the number of files does not
+    need to be known in advance.
+
+    Parameters:
+        files (iterable of str):
+            File paths (*.txt or *.fid). May be a generator, e.g. over an archive directory.
+        srate (float):
+            Sampling rate. Must be the same for all files.
+            Default: None
+        weight (function):
+            Called with each file path. Returns the weight of that file.
+            Default: fid_num_avgs
+        chunk_size (int):
+            Number of points added per step.
+            Default: 2 ** 18
+        processes (int):
+            Worker processes used to parse *.txt files. See iter_fid_columns().
+            Default: os.cpu_count()
+    Returns:
+        coadd (array):
+            Weighted average. Single column, shape (points, 1).
+        total_weight (float):
+            Sum of weights.
+        fnames (list of str):
+            Files co-added, in order.
+    """
+    if weight is None:
+        weight = fid_num_avgs
+    if chunk_size is None:
+        chunk_size = 2 ** 18
+    coadd = None
+    total_weight = 0
+    fnames = []
+    for file, fid in iter_fid_columns(files, srate=srate, processes=processes):
+        w = weight(file)
+        if w is None:
+            raise ValueError('Number of averages unknown for ' + str(file))
+        if coadd is None:
+            coadd = np.zeros((len(fid), 1))
+            chunk = np.empty(min(chunk_size, len(fid)))
+        elif len(fid) != len(coadd):
+            raise ValueError('All FIDs must have the same number of points.')
+        for start in range(0, len(fid), chunk_size):
+            stop = min(start + chunk_size, len(fid))
+            part = chunk[:stop - start]
+            part[:] = fid[start:stop]
+            part *= w
+            coadd[start:stop, 0] += part
+        total_weight += w
+        fnames.append(file)
+        del fid
+    if coadd is None:
+        raise ValueError('Must provide at least one file.')
+    coadd /= total_weight
+    return coadd, total_weight, fnames
+
+
+def write_fid(fname, fid, srate=None, num_avgs=None, sample=None, setup=None, temp=None,
+              chirp=None, pressure=None, dtype=None):
+    """
+    Save FID to the binary *.fid container.
+
+    File layout: FID_HEADER_SIZE byte header (FID_HEADER fields, zero padded) followed by the
+    raw samples. Files are read back by FID() using np.memmap, so nothing is parsed on load.
+
+    Parameters:
+        fname (str):
+            File path. Extension *.fid is appended if missing.
+        fid (array):
+            FID. Only the last column is saved if 2 columns (time, electric field) are given.
+        srate (float):
+            Sampling rate.
+            Units: Samples/second
+            Default: None (unknown)
+        num_avgs (int):
+            Number of FIDs averaged.
+            Default: None (unknown)
+        sample (str):
+            Name of the chemical compound.
+        setup (str):
+            Instrument setup. Either 2to8 or 6to18.
+        temp (float):
+            Nozzle temperature.
+            Units: Celsius
+        chirp (float):
+            Duration of the microwave chirp.
+            Units: microseconds
+        pressure (float):
+            Backing pressure.
+            Units: psig
+        dtype (str):
+            'float32' or 'float64'. float32 is sufficient for digitizer data and halves file size.
+            Default: 'float64'
+    Returns:
+        fname (str):
+            File path of the saved file.
+    """
+    if dtype is None:
+        dtype = 'float64'
+    dtype = np.dtype(dtype).newbyteorder('<')
+    if dtype.str not in ['<f4', '<f8']:
+        raise ValueError('dtype must be float32 or float64.')
+    if os.path.splitext(fname)[1] != '.fid':
+        fname = fname + '.fid'
+    fid = np.asarray(fid)
+    if fid.ndim == 2:
+        fid = fid[:, -1]
+    fid = fid.astype(dtype)
+
+    header = np.zeros(1, dtype=FID_HEADER)
+    header['magic'] = FID_MAGIC
+    header['version'] = FID_VERSION
+    header['dtype'] = dtype.str.encode()
+    header['npoints'] = len(fid)
+    header['srate'] = srate if srate is not None else 0
+    header['num_avgs'] = num_avgs if num_avgs is not None else -1
+    header['sample'] = (sample if sample is not None else '').encode()[:64]
+    header['setup'] = (setup if setup is not None else '').encode()[:16]
+    header['temp'] = temp if temp is not None else np.nan
+    header['chirp'] = chirp if chirp is not None else np.nan
+    header['pressure'] = pressure if pressure is not None else np.nan
+    with open(fname, 'wb') as f:
+        f.write(header.tobytes().ljust(FID_HEADER_SIZE, b'\0'))
+        f.write(fid.tobytes())
+    return fname
+
+
+def read_fid_header(file):
+    """
+    Return header of a binary *.fid file.
+
+    Parameters:
+        file (str):
+            File path.
+    Returns:
+        header (dict):
+            Keys: version, dtype, npoints, srate, num_avgs, sample, setup, temp, chirp, pressure
+            Unknown values are None.
+    """
+    with open(file, 'rb') as f:
+        raw = f.read(FID_HEADER_SIZE)
+    if len(raw) < FID_HEADER.itemsize:
+        raise ValueError(str(file) + ' is not a binary FID file.')
+    header = np.frombuffer(raw[:FID_HEADER.itemsize], dtype=FID_HEADER)[0]
+    if header['magic'] != FID_MAGIC:
+        raise ValueError(str(file) + ' is not a binary FID file.')
+
+    def known(val):
+        return None if np.isnan(val) else float(val)
+
+    return {'version': int(header['version']), 'dtype': np.dtype(header['dtype'].decode()),
+            'npoints': int(header['npoints']),
+            'srate': float(header['srate']) if header['srate'] > 0 else None,
+            'num_avgs': int(header['num_avgs']) if header['num_avgs'] >= 0 else None,
+            'sample': header['sample'].decode() or None, 'setup': header['setup'].decode() or None,
+            'temp': known(header['temp']), 'chirp': known(header['chirp']),
+            'pressure': known(header['pressure'])}
+
+
+def convert_fid_archive(files, srate=None, dtype=None, remove_txt=False):
+    """
+    Convert *.txt time-domain files to binary *.fid files.
+
+    Header fields are taken from the file name convention (see fid_fname_metadata()). Converted
+    files keep the base name of the original file, so co-add weighting by file name is unchanged.
+
+    Parameters:
+        files (str or list of str):
+            Directory containing *.txt FIDs, a single file path, or list of file paths.
+        srate (float):
+            Sampling rate written to the headers. 25 and 50 are read as GSa/s.
+            Default: 25E9
+        dtype (str):
+            'float32' or 'float64'.
+            Default: 'float64'
+        remove_txt (bool):
+            Delete each *.txt file after it is converted.
+            Default: False
+    Returns:
+        converted (list of str):
+            File paths of the *.fid files.
+    """
+    if isinstance(files, str):
+        if os.path.isdir(files):
+            files = sorted(glob.glob(os.path.join(files, '*.txt')))
+        else:
+            files = [files]
+    converted = []
+    for file in files:
+        fid = FID(file, srate=srate)
+        metadata = fid_fname_metadata(file)
+        fname = write_fid(
+            os.path.splitext(file)[0] + '.fid', fid.fid, srate=fid.srate, dtype=dtype, **metadata)
+        converted.append(fname)
+        del fid
+        if remove_txt:
+            os.remove(file)
+    return converted
+
+
 # file = 'C:\\Users\\chann\\OneDrive\\Graduate School\\Pate Group\\Ethylbenzene\\Christoffers\\CoAdd_christoffers_ethylbenzene_30uL_RS_TFIP_2to8_100k_25C_2us_50in_10outpsig_.txt'
 
+class RunningCoAdd:
+    """
+    Frequency domain weighted average of FIDs, updated one FID at a time.
+
+    The FFT is linear, so the weighted average of the complex spectra of several FIDs equals the
+    complex spectrum of their time-domain weighted average. Each FID is transformed once with
+    FID.quick_fft(full_ft=True) and added to a running complex sum, which is O(band) work, so a
+    cumulative spectrum is available after every FID without re-co-adding the archive.
+
+    Parameters:
+        srate (float):
+            Sampling rate used for file paths passed to add(). 25 and 50 are read as GSa/s.
+            Default: None (see FID)
+        frac, kb, total_time, fstart, fstop, method:
+            Passed to FID.quick_fft(). Must stay fixed for the life of the object.
+    Attributes:
+        freq (array):
+            Frequency axis.
+            Units: MHz
+        spectrum (array):
+            Weighted sum of complex spectra. None until the first FID is added.
+        num_avgs (float):
+            Sum of weights (total number of FID averages).
+        count (int):
+            Number of FIDs added.
+    Methods:
+        add(fid, num_avgs)
+            Transform a FID and add it to the running average.
+        add_spectrum(fft, num_avgs)
+            Add an existing full_ft spectrum to the running average.
+        magnitude()
+            Return 2 column magnitude spectrum of the running average.
+        full()
+            Return 3 column real and imaginary spectrum of the running average.
+        reset()
+            Clear the running average.
+    """
+
+    def __init__(self, srate=None, frac=None, kb=None, total_time=None, fstart=None, fstop=None,
+                 method=None):
+        self.srate = srate
+        self.fft_kwargs = {'frac': frac, 'kb': kb, 'total_time': total_time, 'fstart': fstart,
+                           'fstop': fstop, 'method': method}
+        self.freq = None
+        self.spectrum = None
+        self.num_avgs = 0
+        self.count = 0
+
+    def add(self, fid, num_avgs=None):
+        """
+        Transform a FID and add it to the running average.
+
+        Parameters:
+            fid (str or FID):
+                File path (*.txt or *.fid) or FID object.
+            num_avgs (float):
+                Weight of this FID, i.e. number of FIDs averaged to produce it.
+                Default: fid_num_avgs() of the file, or 1 if unknown.
+        Returns:
+            fft (array):
+                full_ft spectrum of this FID alone.
+                col[0] -> frequency, col[1] -> real, col[2] -> imaginary
+        """
+        if not isinstance(fid, FID):
+            fid = FID(fid, srate=self.srate)
+        if num_avgs is None:
+            num_avgs = fid_num_avgs(fid.fname) or 1
+        fft = fid.quick_fft(full_ft=True, **self.fft_kwargs)
+        self.add_spectrum(fft, num_avgs)
+        return fft
+
+    def add_spectrum(self, fft, num_avgs=None):
+        """
+        Add an existing full_ft spectrum to the running average.
+
+        Parameters:
+            fft (array):
+                col[0] -> frequency, col[1] -> real, col[2] -> imaginary
+            num_avgs (float):
+                Weight of this spectrum.
+                Default: 1
+        """
+        if num_avgs is None:
+            num_avgs = 1
+        if self.spectrum is None:
+            self.freq = np.array(fft[:, 0])
+            self.spectrum = np.zeros(len(fft), dtype=complex)
+        elif len(fft) != len(self.spectrum):
+            raise ValueError('Spectrum does not match the running average frequency axis.')
+        self.spectrum.real += num_avgs * fft[:, 1]
+        self.spectrum.imag += num_avgs * fft[:, 2]
+        self.num_avgs += num_avgs
+        self.count += 1
+
+    def magnitude(self):
+        """
+        Return magnitude spectrum of the running average.
+
+        Returns:
+            fft (array):
+                col[0] -> frequency, col[1] -> magnitude
+        """
+        if self.spectrum is None:
+            raise ValueError('No FIDs have been added.')
+        fft = np.zeros((len(self.spectrum), 2))
+        fft[:, 0] = self.freq
+        fft[:, 1] = np.absolute(self.spectrum) / self.num_avgs
+        return fft
+
+    def full(self):
+        """
+        Return real and imaginary spectrum of the running average.
+
+        Returns:
+            fft (array):
+                col[0] -> frequency, col[1] -> real, col[2] -> imaginary
+        """
+        if self.spectrum is None:
+            raise ValueError('No FIDs have been added.')
+        fft = np.zeros((len(self.spectrum), 3))
+        fft[:, 0] = self.freq
+        fft[:, 1] = self.spectrum.real / self.num_avgs
+        fft[:, 2] = self.spectrum.imag / self.num_avgs
+        return fft
+
+    def reset(self):
+        """ Clear the running average. Processing settings are kept. """
+        self.freq = None
+        self.spectrum = None
+        self.num_avgs = 0
+        self.count = 0
+
+
+PEAK_DTYPE = np.dtype([
+    ('row', '<i8'), ('freq', '<f8'), ('intensity', '<f8'), ('column', '<i4'),
+    ('prominence', '<f8'), ('width', '<f8')])
+
+
+def pick_peaks(matrix, thresh=None, dyn_range=None, noise_mult=None, noise_window=None,
+               columns=None, prominence=False, width=False):
+    """
+    Peak pick every intensity column of a spectra matrix with a single scipy find_peaks pass.
+
+    Columns are laid end to end with +inf between them, so peaks, prominences, and widths never
+    cross from one spectrum into the next and match find_peaks run on each column separately.
+    The threshold is passed to find_peaks per point, so every column has its own threshold.
+
+    Exactly one of thresh, dyn_range, or noise_mult is used, in that order of priority.
+
+    Parameters:
+        matrix (array):
+            col[0] -> frequency, col[1:] -> intensity.
+        thresh (float):
+            Absolute intensity threshold.
+            Units: mV
+            Default: None
+        dyn_range (float):
+            Threshold of each column is its maximum intensity / dyn_range.
+            Default: None
+        noise_mult (float):
+            Threshold is noise_mult times the local noise floor: the median absolute intensity
+            of the surrounding block of noise_window points.
+            Default: None
+        noise_window (int):
+            Block length of the noise floor.
+            Default: 2000
+        columns (list of int):
+            Columns to peak pick.
+            Default: all intensity columns
+        prominence (bool):
+            Calculate prominence of each peak.
+            Default: False
+        width (bool):
+            Calculate full width at half prominence of each peak. Implies prominence.
+            Units: MHz
+            Default: False
+    Returns:
+        peaks (structured array):
+            dtype PEAK_DTYPE. Fields row, freq, intensity, column, prominence, width.
+            prominence and width are NaN unless requested. Sorted by column, then row.
+    """
+    if columns is None:
+        columns = range(1, matrix.shape[1])
+    columns = np.atleast_1d(np.asarray(columns, dtype=int))
+    if noise_window is None:
+        noise_window = 2000
+    num_rows = len(matrix)
+    stride = num_rows + 1
+    signal = np.empty((len(columns), stride))
+    signal[:, :num_rows] = matrix[:, columns].T
+    signal[:, num_rows] = np.inf
+    if thresh is not None:
+        height = thresh
+    elif dyn_range is not None:
+        height = np.empty_like(signal)
+        height[:] = (signal[:, :num_rows].max(axis=1) / dyn_range)[:, None]
+    elif noise_mult is not None:
+        num_blocks = -(-num_rows // noise_window)
+        padded = np.full((len(columns), num_blocks * noise_window), np.nan)
+        padded[:, :num_rows] = np.abs(signal[:, :num_rows])
+        floor = np.nanmedian(padded.reshape((len(columns), num_blocks, noise_window)), axis=2)
+        height = np.empty_like(signal)
+        height[:, :num_rows] = noise_mult * np.repeat(floor, noise_window, axis=1)[:, :num_rows]
+        height[:, num_rows] = 0
+    else:
+        raise ValueError('Must provide intensity threshold, dynamic range, or noise multiple.')
+    signal = signal.ravel()
+    if np.ndim(height) != 0:
+        height = height.ravel()
+    found, _ = scipy.signal.find_peaks(signal, height)
+    found = found[found % stride != num_rows]
+
+    peaks = np.zeros(len(found), dtype=PEAK_DTYPE)
+    peaks['row'] = found % stride
+    peaks['column'] = columns[found // stride]
+    peaks['freq'] = matrix[peaks['row'], 0]
+    peaks['intensity'] = signal[found]
+    peaks['prominence'] = np.nan
+    peaks['width'] = np.nan
+    if prominence or width:
+        prom = scipy.signal.peak_prominences(signal, found)
+        peaks['prominence'] = prom[0]
+        if width:
+            point_spacing = (matrix[-1, 0] - matrix[0, 0]) / (num_rows - 1)
+            peaks['width'] = scipy.signal.peak_widths(signal, found, 0.5, prom)[0] * point_spacing
+    return peaks
+
+
+# Approximate number of line profile points evaluated per block by the simulate functions.
+SIMULATION_BLOCK = 2 ** 20
+
+
+def _add_lines(sim, freqs_intens, columns, freq_min, step_size, hwhm):
+    """
+    Add Gaussian line profiles into columns of sim, in place.
+
+    Every line covers rows floor(freq - 4 * hwhm) to ceil(freq + 4 * hwhm) of the grid. Profiles
+    are evaluated by broadcasting over lines x offsets, about SIMULATION_BLOCK points at a time,
+    and summed into the grid, so overlapping lines add. Points off the grid are dropped.
+
+    Parameters:
+        sim (array):
+            Simulation matrix. col[0] -> freq.
+        freqs_intens (array):
+            col[0] -> line frequency, col[1] -> line intensity.
+        columns (int or array of int):
+            Column of sim receiving each line.
+        freq_min (float):
+            Frequency of row 0.
+            Units: MHz
+        step_size (float):
+            Point spacing.
+            Units: MHz
+        hwhm (float):
+            Half width at half max.
+            Units: MHz
+    """
+    if len(freqs_intens) == 0:
+        return
+    columns = np.broadcast_to(columns, (len(freqs_intens),))
+    row_start = np.floor(((freqs_intens[:, 0] - 4 * hwhm) - freq_min) / step_size).astype(int)
+    row_stop = np.ceil(((freqs_intens[:, 0] + 4 * hwhm) - freq_min) / step_size).astype(int)
+    offsets = np.arange((row_stop - row_start).max() + 1)
+    block = max(1, SIMULATION_BLOCK // len(offsets))
+    for first in range(0, len(freqs_intens), block):
+        last = first + block
+        rows = row_start[first:last, None] + offsets
+        freqs = rows * step_size + freq_min
+        G = np.exp((((freqs - freqs_intens[first:last, 0, None]) / hwhm) ** 2) * -math.log(2))
+        keep = (rows <= row_stop[first:last, None]) & (rows >= 0) & (rows < len(sim))
+        cols = np.broadcast_to(columns[first:last, None], rows.shape)
+        np.add.at(sim, (rows[keep], cols[keep]), (freqs_intens[first:last, 1, None] * G)[keep])
+
+
 def simulate_spectrum(peak_list, freq_min=None, freq_max=None, step_size=None, fwhm=None,
-                      scale_factor=None, save=False, fname=None):
+                      scale_factor=None, save=False, fname=None, dtype=None):
     """
     Simulate spectrum using the peak list.
 
+    Each peak is a Gaussian of width fwhm, evaluated out to 4 * hwhm on each side. Overlapping
+    lines add. All lines are computed by broadcasting, so 100k line catalogs simulate in seconds.
+
     Parameters:
         peak_list (array):
             Two column array of peak positions and intensities.
@@ -511,6 +1737,9 @@ def simulate_spectrum(peak_list, freq_min=None, freq_max=None, step_size=None, f
             Option to save output to external file.
         fname(str):
             file name, if save=True.
+        dtype (str):
+            'float64' or 'float32'. dtype of the simulation. See FID.dtype for float32 accuracy.
+            Default: 'float64'
     Return:
         simulation (array):
             Two column array.
@@ -528,38 +1757,108 @@ def simulate_spectrum(peak_list, freq_min=None, freq_max=None, step_size=None, f
     hwhm = fwhm / 2
 
     num_points = round(((freq_max + step_size) - freq_min) / step_size)
-    sim = np.zeros((int(num_points), 2))
+    sim = np.zeros((int(num_points), 2), dtype=processing_dtype(dtype))
     sim[:, 0] = np.linspace(freq_min, freq_max, num_points)
 
-    freqs_intens = np.array(
-        [peak_list[x, :] for x in range(len(peak_list)) if freq_min < peak_list[x, 0] < freq_max])
-
-    row_start = np.floor(((freqs_intens[:, 0] - 4 * hwhm) - freq_min) / step_size)
-    row_stop = np.ceil(((freqs_intens[:, 0] + 4 * hwhm) - freq_min) / step_size)
+    peak_list = np.asarray(peak_list)
+    freqs_intens = peak_list[(freq_min < peak_list[:, 0]) & (peak_list[:, 0] < freq_max)]
 
-    for x in range(len(freqs_intens)):
-        line = []
-        rstart = row_start[x]
-        rstop = row_stop[x] + 1
-        rows = np.arange(rstart, rstop, 1)
-        freqs = rows * step_size + freq_min
-        for f in freqs:
-            G = math.exp((((f - freqs_intens[x, 0]) / hwhm) ** 2) * (-1 * math.log(2)))
-            line.append(freqs_intens[x, 1] * G)
-        try:
-            sim[int(rows[0]):int(rows[-1] + 1), 1] = line
-        except ValueError:
-            pass
-    sim[:, 1] = np.real(sim[:, 1])
+    _add_lines(sim, freqs_intens, 1, freq_min, step_size, hwhm)
 
     if scale_factor is not None:
         sim[:, 1] = sim[:, 1] * scale_factor
     if save:
-        np.savetxt(str(fname) + '_Simulation.prn', sim, fmt=['%.4f', '%.5e'])
+        Text_Writer.savetxt(str(fname) + '_Simulation.prn', sim, fmt=['%.4f', '%.5e'])
     return sim
 
 
-def build_matrix(*args):
+def simulate_spectra(species, scale_factors=None, freq_min=None, freq_max=None, step_size=None,
+                     fwhm=None, total=False, save=False, fname=None, dtype=None):
+    """
+    Simulate several species onto one shared frequency grid in a single pass.
+
+    One (npoints, nspecies + 1) matrix is allocated, instead of one full grid per species, and all
+    lines of all species are rendered together. Use for overlays of mixture components and for
+    residuals (experiment minus all simulations).
+
+    Parameters:
+        species (list):
+            Cat objects or two column line lists (col[0] -> freq, col[1] -> intensity).
+            Cat objects contribute Cat.line_list().
+        scale_factors (list of float):
+            Scale factor applied to the intensities of each species.
+            Default: 1 for every species
+        freq_min (float):
+            Starting frequency of the simulation.
+            Units: MHz
+            Default: 2000
+        freq_max (float):
+            Stopping frequency of the simulation.
+            Units: MHz
+            Default: 8000
+        step_size (float):
+            Point spacing.
+            Units: MHz
+            Default: 0.0125
+        fwhm (float):
+            Line width.
+            Units: MHz
+            Default: 0.060
+        total (bool):
+            Append a column holding the sum of all species.
+            Default: False
+        save (bool):
+            Option to save output to external file.
+        fname(str):
+            file name, if save=True.
+        dtype (str):
+            'float64' or 'float32'. dtype of the simulation. See FID.dtype for float32 accuracy.
+            Default: 'float64'
+    Return:
+        simulation (array):
+            col[0] -> freq
+            col[1:nspecies + 1] -> intensity of each species, in the order given.
+            col[-1] -> sum of all species, if total=True.
+    """
+    if freq_min is None:
+        freq_min = 2000
+    if freq_max is None:
+        freq_max = 8000
+    if step_size is None:
+        step_size = 0.0125
+    if fwhm is None:
+        fwhm = 0.060
+    if scale_factors is None:
+        scale_factors = [1] * len(species)
+    if len(scale_factors) != len(species):
+        raise ValueError('Provide one scale factor per species.')
+
+    num_points = round(((freq_max + step_size) - freq_min) / step_size)
+    sim = np.zeros((int(num_points), len(species) + 1 + bool(total)), dtype=processing_dtype(dtype))
+    sim[:, 0] = np.linspace(freq_min, freq_max, num_points)
+
+    lines = []
+    columns = []
+    for col, (line_list, scale) in enumerate(zip(species, scale_factors), start=1):
+        if hasattr(line_list, 'line_list'):
+            line_list = line_list.line_list()
+        line_list = np.asarray(line_list, dtype=float)
+        line_list = line_list[(freq_min < line_list[:, 0]) & (line_list[:, 0] < freq_max)]
+        lines.append(np.column_stack((line_list[:, 0], line_list[:, 1] * scale)))
+        columns.append(np.full(len(line_list), col))
+    if lines:
+        _add_lines(sim, np.concatenate(lines), np.concatenate(columns), freq_min, step_size,
+                   fwhm / 2)
+
+    if total:
+        sim[:, -1] = sim[:, 1:-1].sum(axis=1)
+    if save:
+        fmt = ['%.4f'] + ['%.5e'] * (sim.shape[1] - 1)
+        Text_Writer.savetxt(str(fname) + '_Simulation.prn', sim, fmt=fmt)
+    return sim
+
+
+def build_matrix(*args, dtype=None, out=None, processes=None):
     """
     Build matrix of spectra in a shared frequency region, keeping a single frequency column.
 
@@ -567,32 +1866,730 @@ def build_matrix(*args):
     Subsequent columns contain the spectral signals of other spectra. In order to use this function,
     all spectra passed as *args need to be over the same frequency region.
 
+    The frequency axis is read once from the first spectrum and the full (npoints, N + 1) matrix
+    is allocated up front, column-major, so every spectrum is copied exactly once into a contiguous
+    column. Spectra are parsed ahead of time in a process pool, with at most `processes` spectra
+    in flight. If out is given, the matrix is a memory-mapped *.mtx file (see write_matrix()) and
+    memory use does not grow with the number of spectra.
+
     Parameters:
         args (array):
             Spectra. Two col each [freq, int].
+        dtype (str):
+            'float64' or 'float32'. dtype of the matrix. float32 halves the memory of large
+            matrices. See FID.dtype for accuracy.
+            Default: 'float64'
+        out (str):
+            *.mtx file path. If given, the matrix is built in this file, with file names embedded.
+            Default: None (matrix built in memory)
+        processes (int):
+            Worker processes used to parse spectra. 1 parses in the calling process.
+            Default: os.cpu_count()
     Return:
+        fnames (list of str):
+            File names, in column order.
         matrix (array): col[0] -> frequency column.
                         Each subsequent col is the spectral intensity for a single spectrum.
     """
-    first_spec = Spectrum(args[0][0]).spectrum
+    fnames = list(args[0])
+    if not fnames:
+        raise ValueError('Must provide at least one spectrum.')
+    dtype = processing_dtype(dtype)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    first_spec = Spectrum(fnames[0], dtype=dtype).spectrum
     freq = first_spec[:, 0]
-    matrix = freq
+    tolerance = abs(freq[1] - freq[0]) / 2 if len(freq) > 1 else 0
+    shape = (len(freq), len(fnames) + 1)
+    if out is None:
+        matrix = np.empty(shape, dtype=dtype, order='F')
+    else:
+        matrix = open_matrix(out, shape, fnames, dtype=dtype)
+    matrix[:, 0] = freq
+    matrix[:, 1] = first_spec[:, 1]
+    del first_spec
+
+    def fill(col, spec):
+        if len(spec) != len(freq) or np.abs(spec[:, 0] - freq).max() > tolerance:
+            raise ValueError(
+                '{} does not share the frequency axis of {}.'.format(fnames[col - 1], fnames[0]))
+        matrix[:, col] = spec[:, 1]
+
+    executor = None
+    pending = deque()
+    try:
+        for col in range(2, len(fnames) + 1):
+            if processes > 1:
+                if executor is None:
+                    executor = ProcessPoolExecutor(max_workers=processes)
+                pending.append((col, executor.submit(_read_spectrum_array, fnames[col - 1], dtype)))
+                while len(pending) > processes:
+                    col, future = pending.popleft()
+                    fill(col, future.result())
+            else:
+                fill(col, _read_spectrum_array(fnames[col - 1], dtype))
+        while pending:
+            col, future = pending.popleft()
+            fill(col, future.result())
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+    if out is not None:
+        matrix.flush()
+    return fnames, matrix
+
+
+def _read_spectrum_array(file, dtype):
+    """ Return Spectrum(file).spectrum. Module level so it can run in a process pool. """
+    return np.ascontiguousarray(Spectrum(file, dtype=dtype).spectrum)
+
+
+def _matrix_header(shape, fnames, dtype):
+    """ Return header bytes and data offset of a *.mtx file. """
+    names = '\n'.join(str(fname) for fname in fnames).encode('utf-8')
+    header = np.zeros(1, dtype=MATRIX_HEADER)
+    header['magic'] = MATRIX_MAGIC
+    header['version'] = MATRIX_VERSION
+    header['dtype'] = dtype.str.encode()
+    header['nrows'] = shape[0]
+    header['ncols'] = shape[1]
+    header['names_len'] = len(names)
+    raw = header.tobytes() + names
+    offset = -(-len(raw) // MATRIX_ALIGN) * MATRIX_ALIGN
+    return raw + b'\0' * (offset - len(raw)), offset
+
+
+def open_matrix(fname, shape, fnames, dtype=None):
+    """
+    Create *.mtx file and return writable memory map of its (uninitialized) matrix.
+
+    Parameters:
+        fname (str):
+            File path.
+        shape (tuple):
+            (npoints, number of spectra + 1).
+        fnames (list of str):
+            File names embedded in the header.
+        dtype (str):
+            'float64' or 'float32'.
+            Default: 'float64'
+    Returns:
+        matrix (np.memmap):
+            Column-major. Call flush() when done writing.
+    """
+    dtype = processing_dtype(dtype).newbyteorder('<')
+    raw, offset = _matrix_header(shape, fnames, dtype)
+    with open(fname, 'wb') as f:
+        f.write(raw)
+        f.truncate(offset + shape[0] * shape[1] * dtype.itemsize)
+    return np.memmap(fname, dtype=dtype, mode='r+', offset=offset, shape=shape, order='F')
+
+
+def write_matrix(fname, matrix, fnames):
+    """
+    Write spectra matrix and its file names to a binary *.mtx file.
+
+    Parameters:
+        fname (str):
+            File path.
+        matrix (array):
+            col[0] -> frequency, col[1:] -> intensity of each spectrum. float32 or float64.
+        fnames (list of str):
+            File name of each spectrum, in column order.
+    """
+    out = open_matrix(fname, matrix.shape, fnames, dtype=matrix.dtype)
+    out[:] = matrix
+    out.flush()
+    del out
+
+
+def read_matrix(fname):
+    """
+    Read *.mtx file written by write_matrix() or build_matrix().
+
+    Parameters:
+        fname (str):
+            File path.
+    Returns:
+        fnames (list of str):
+            File names, in column order.
+        matrix (np.memmap):
+            Memory-mapped copy-on-write, so in-place changes are not written to the file.
+    """
+    with open(fname, 'rb') as f:
+        raw = f.read(MATRIX_HEADER.itemsize)
+        header = np.frombuffer(raw, dtype=MATRIX_HEADER)[0]
+        if header['magic'] != MATRIX_MAGIC:
+            raise ValueError('{} is not a spectra matrix file.'.format(fname))
+        names = f.read(int(header['names_len'])).decode('utf-8')
+    fnames = names.split('\n') if names else []
+    offset = -(-(MATRIX_HEADER.itemsize + int(header['names_len'])) // MATRIX_ALIGN) * MATRIX_ALIGN
+    matrix = np.memmap(
+        fname, dtype=np.dtype(header['dtype'].decode()), mode='c', offset=offset,
+        shape=(int(header['nrows']), int(header['ncols'])), order='F')
+    return fnames, matrix
+
+
+def batch_fft(fids, srate=None, frac=None, kb=None, total_time=None, fstart=None, fstop=None,
+              full_ft=False, units='usec', batch_size=None, dtype=None):
+    """
+    FFT a series of equal-length FIDs with shared settings in a single vectorized pass.
+
+    FIDs are stacked into a 2-D array (one FID per row) batch_size at a time. The shared
+    Kaiser-Bessel window is broadcast across the stack and one real-input FFT is taken along the
+    time axis, with zero-padding to total_time. Output matches FID.quick_fft() for each FID.
+
+    Parameters:
+        fids (list):
+            File paths (*.txt or *.fid) or FID objects. All must have the same number of points.
+        srate (float):
+            Sampling rate. 25 and 50 are read as GSa/s.
+            Default: 25E9, or the srate of the FID objects passed.
+        frac (float):
+            Fraction of the FID to keep. Value between 0 and 1.
+            Default:  1.
+        kb (float):
+            Kaiser-Bessel window parameter.
+            Default:  9.5.
+        total_time (float):
+            Total time, FID plus zeropadding.
+            Units: microseconds
+            Default:  80
+        fstart (int):
+            Starting frequency of the fft
+            Units: MHz.
+            Default:  2000.
+        fstop (int):
+            Stopping frequency of the fft
+            Units: MHz.
+            Default:  8000.
+        full_ft (bool):
+            if True, real and imaginary. If False, magnitude.
+            Default:  False.
+        units (str):
+            'usec' or 'sec'.
+            Default:  'usec'.
+        batch_size (int):
+            Number of FIDs transformed per stacked FFT. Bounds peak memory.
+            Default: 16
+        dtype (str):
+            'float64' or 'float32'. Precision of the FFT and dtype of the matrix. See FID.dtype.
+            Default: 'float64'
+    Returns:
+        fnames (list of str):
+            File names, in column order. None for FID objects without fname.
+        matrix (array):
+            Same layout as build_matrix().
+            col[0] -> frequency.
+            If full_ft == False:
+                col[n] -> magnitude of the nth FID.
+            If full_ft == True:
+                col[2n - 1] -> real, col[2n] -> imaginary of the nth FID.
+    """
+    if frac is None:
+        frac = 1
+    if kb is None:
+        kb = 9.5
+    if total_time is None:
+        total_time = 80
+    if units == 'usec':
+        total_time = total_time * 1E-6
+    if fstart is None:
+        fstart = 2000
+    if fstop is None:
+        fstop = 8000
+    if batch_size is None:
+        batch_size = 16
+    dtype = processing_dtype(dtype)
+    fids = list(fids)
+    if not fids:
+        raise ValueError('Must provide at least one FID.')
+
     fnames = []
-    for arg in args[0]:
-        fnames.append(arg)
-        spec = Spectrum(arg).spectrum
-        matrix = np.column_stack((matrix, spec[:, 1]))
+    matrix = None
+    fid_len = None
+    window = None
+    cols_per_fid = 2 if full_ft else 1
+    for batch_start in range(0, len(fids), batch_size):
+        batch = []
+        for fid in fids[batch_start:batch_start + batch_size]:
+            if not isinstance(fid, FID):
+                fid = FID(fid, srate=srate)
+            if fid_len is None:
+                fid_len = len(fid.fid)
+                srate = fid.srate
+                partial_len = round(fid_len * frac)
+                point_num = round(total_time * srate)
+                window = fft_plan(partial_len, kb, dtype=dtype).window
+                index_start, index_stop, freqs = fft_band(srate, point_num, fstart, fstop)
+                matrix = np.zeros((len(freqs), len(fids) * cols_per_fid + 1), dtype=dtype)
+                matrix[:, 0] = freqs
+            elif len(fid.fid) != fid_len:
+                raise ValueError('All FIDs must have the same number of points.')
+            fnames.append(getattr(fid, 'fname', None))
+            batch.append(np.asarray(fid.fid[:partial_len, -1], dtype=dtype))
+        stack = np.vstack(batch) * window
+        signal = real_fft(stack, n=point_num, axis=1)[:, index_start:index_stop] / 100
+        del stack
+        col = batch_start * cols_per_fid + 1
+        if full_ft:
+            matrix[:, col:col + 2 * len(batch):2] = signal.real.T
+            matrix[:, col + 1:col + 2 * len(batch):2] = signal.imag.T
+        else:
+            matrix[:, col:col + len(batch)] = np.abs(signal).T
     return fnames, matrix
 
 
+def row_ranges_mask(row_min, row_max, num_rows):
+    """
+    Return boolean mask of num_rows that is True inside any [row_min, row_max) range.
+
+    Ranges are clipped to [0, num_rows), and may overlap.
+
+    Parameters:
+        row_min (array of int):
+            First row of each range.
+        row_max (array of int):
+            Row after the last row of each range.
+        num_rows (int):
+            Length of the mask.
+    Returns:
+        mask (array of bool)
+    """
+    row_min = np.clip(np.asarray(row_min, dtype=int), 0, num_rows)
+    row_max = np.clip(np.asarray(row_max, dtype=int), 0, num_rows)
+    keep = row_max > row_min
+    edges = np.zeros(num_rows + 1, dtype=int)
+    np.add.at(edges, row_min[keep], 1)
+    np.add.at(edges, row_max[keep], -1)
+    return np.cumsum(edges[:-1]) > 0
+
+
+# Approximate number of matrix values gathered per block by Spectrum.signal_max().
+SIGNAL_MAX_BLOCK = 2 ** 22
+
+
+def _window_max(matrix, start, stop):
+    """ Return (freq, intensity, column) of the strongest signal in matrix[start:stop]. """
+    with_freq = matrix[start:stop, :]
+    without_freq = with_freq[:, 1:]
+    col_shape = np.shape(without_freq)[1]
+    max_index = np.argmax(without_freq.flatten(), axis=0)
+    max_row = math.floor(max_index / col_shape)
+    max_col_with_freq = max_index % col_shape + 1
+    return with_freq[max_row, 0], with_freq[max_row, max_col_with_freq], max_col_with_freq
+
+
+class SpectrumCache:
+    """
+    Binary cache of parsed *.ft and *.prn spectra.
+
+    The first time a text spectrum is loaded, the parsed array is saved as *.npy in directory.
+    Later loads memory-map the *.npy copy-on-write instead of reparsing the text file. Entries are
+    keyed by absolute path, file size, modification time, and columns read, so an edited file is
+    reparsed. When the cache grows past max_bytes, least recently used entries are removed.
+
+    Attributes:
+        directory (str):
+            Cache location. Set by the MRR_SPECTRUM_CACHE_DIR environment variable if given.
+            Default: ~/.mrr_toolbox/spectrum_cache
+        max_bytes (int):
+            Size cap of the cache.
+            Default: 2 GB
+        enabled (bool):
+            If False, load() and store() do nothing. Set by the MRR_SPECTRUM_CACHE environment
+            variable if given: '1', 'on' or 'true' to enable, '0', 'off' or 'false' to disable.
+            Other values give a warning and leave the cache enabled.
+            Default: True
+    Methods:
+        load(file, cols)
+            Return cached array, or None if not cached.
+        store(file, cols, arr)
+            Cache parsed array, then evict old entries if over max_bytes.
+        evict()
+            Remove least recently used entries until the cache is under max_bytes.
+        info()
+            Return number of entries and total size.
+        clear()
+            Remove all entries.
+    """
+
+    def __init__(self, directory=None, max_bytes=None, enabled=None):
+        if enabled is None:
+            env = (os.environ.get('MRR_SPECTRUM_CACHE') or '1').strip().lower()
+            if env not in ['1', 'on', 'true', '0', 'off', 'false']:
+                # Runs when Spectrum is imported, so an unknown value must not stop the program.
+                warnings.warn(
+                    "MRR_SPECTRUM_CACHE={!r} not recognized. Use '1', 'on', 'true', '0', 'off', or "
+                    "'false'; MRR_SPECTRUM_CACHE_DIR sets the cache location. Cache "
+                    "enabled.".format(os.environ.get('MRR_SPECTRUM_CACHE')))
+            enabled = env not in ['0', 'off', 'false']
+        if directory is None:
+            directory = os.environ.get('MRR_SPECTRUM_CACHE_DIR')
+            if directory:
+                directory = os.path.abspath(os.path.expanduser(directory))
+            else:
+                directory = os.path.join(os.path.expanduser('~'), '.mrr_toolbox', 'spectrum_cache')
+        if max_bytes is None:
+            max_bytes = 2 * 1024 ** 3
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def _entry(self, file, cols):
+        """ Return cache file path for the current state of file. """
+        stat = os.stat(file)
+        key = '{}|{}|{}|{}'.format(
+            os.path.abspath(file), stat.st_size, stat.st_mtime_ns,
+            'all' if cols is None else sorted(cols))
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.npy')
+
+    def load(self, file, cols=None):
+        """
+        Return memory-mapped array of a cached spectrum. None if disabled or not cached.
+
+        The array is opened copy-on-write, so in-place changes never reach the cache.
+
+        Parameters:
+            file (str):
+                Spectrum file path.
+            cols (list of int):
+                Columns read from file.
+                Default: None (all columns)
+        """
+        if not self.enabled:
+            return None
+        try:
+            entry = self._entry(file, cols)
+            arr = np.load(entry, mmap_mode='c')
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        return arr.view(np.ndarray)
+
+    def store(self, file, cols, arr):
+        """
+        Cache parsed spectrum. Failures to write (read-only or full disk) are ignored.
+
+        Parameters:
+            file (str):
+                Spectrum file path.
+            cols (list of int):
+                Columns read from file. None for all columns.
+            arr (array):
+                Parsed spectrum. Only numeric arrays are cached.
+        """
+        if not self.enabled or arr.dtype.kind not in 'fiu':
+            return
+        tmp = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entry = self._entry(file, cols)
+            tmp = entry + '.{}.{}.tmp'.format(os.getpid(), threading.get_ident())
+            with open(tmp, 'wb') as f:
+                np.save(f, arr)
+            os.replace(tmp, entry)
+        except OSError:
+            # os.replace() fails on Windows while entry is memory-mapped by a live Spectrum.
+            # *.tmp files are not counted by evict(), so the partial file must not be left.
+            if tmp is not None and os.path.exists(tmp):
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+            return
+        self.evict()
+
+    def _entries(self):
+        """ Return list of (last use, size, path) of cache entries, oldest first. """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """ Remove least recently used entries until the cache is no larger than max_bytes. """
+        with self._lock:
+            entries = self._entries()
+            total = sum(entry[1] for entry in entries)
+            for mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+
+    def info(self):
+        """ Return dictionary with number of entries, total bytes, and max_bytes. """
+        entries = self._entries()
+        return {'entries': len(entries), 'bytes': sum(entry[1] for entry in entries),
+                'max_bytes': self.max_bytes, 'enabled': self.enabled}
+
+    def clear(self):
+        """ Remove all cache entries. """
+        with self._lock:
+            for mtime, size, path in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+SPECTRUM_CACHE = SpectrumCache()
+
+
+class SpectrumView(Mapping):
+    """
+    Read-only mapping of frequency -> intensity over one column of a spectrum.
+
+    Same lookups as the dictionary previously returned by Spectrum.spectrum_dictionary(): keys
+    are frequencies rounded to 4 decimals, and frequencies that are not on the grid raise
+    KeyError. No dictionary is built. The row of a frequency is computed from freq_min and
+    point_spacing, so lookups are O(1) and the view holds no copy of the data.
+
+    Parameters:
+        spectrum (Spectrum):
+            Spectrum object.
+        spec_num (int):
+            Column of the spectrum.
+            Default: 1
+    Methods:
+        lookup(freqs)
+            Vector lookup. Return array of intensities.
+        irange(freq_min, freq_max)
+            Iterate (freq, intensity) pairs between freq_min and freq_max.
+    """
+    # Rows converted to Python floats at a time while iterating.
+    block_rows = 65536
+
+    def __init__(self, spectrum, spec_num=None):
+        self.spectrum = spectrum
+        self.spec_num = spec_num if spec_num is not None else 1
+
+    def __getitem__(self, freq):
+        if np.ndim(freq) != 0:
+            return self.lookup(freq)
+        # Keys were rounded with np.round, as round() does for numpy floats.
+        key = np.round(float(freq), 4)
+        row = self.spectrum.freq_to_row(key)
+        arr = self.spectrum.spectrum
+        if not 0 <= row < len(arr) or np.round(float(arr[row, 0]), 4) != key:
+            raise KeyError(freq)
+        return arr[row, self.spec_num]
+
+    def __iter__(self):
+        freqs = self.spectrum.spectrum[:, 0]
+        for start in range(0, len(freqs), self.block_rows):
+            for freq in np.round(freqs[start:start + self.block_rows], 4).tolist():
+                yield freq
+
+    def __len__(self):
+        return len(self.spectrum.spectrum)
+
+    def __contains__(self, freq):
+        try:
+            self[freq]
+        except KeyError:
+            return False
+        return True
+
+    def lookup(self, freqs):
+        """
+        Return intensities at an array of frequencies. Raise KeyError if any are not on the grid.
+
+        Parameters:
+            freqs (array):
+                Frequencies.
+                Units: MHz
+        """
+        freqs = np.round(np.asarray(freqs, dtype=float), 4)
+        rows = self.spectrum.freq_to_row(freqs)
+        arr = self.spectrum.spectrum
+        missing = (rows < 0) | (rows >= len(arr))
+        rows = np.where(missing, 0, rows)
+        missing |= np.abs(np.round(arr[rows, 0], 4) - freqs) > 1E-6
+        if np.any(missing):
+            raise KeyError(freqs[missing][0])
+        return arr[rows, self.spec_num]
+
+    def irange(self, freq_min=None, freq_max=None):
+        """
+        Iterate (freq, intensity) pairs with freq_min <= freq <= freq_max, in frequency order.
+
+        Parameters:
+            freq_min (float):
+                Units: MHz
+                Default: first frequency
+            freq_max (float):
+                Units: MHz
+                Default: last frequency
+        """
+        arr = self.spectrum.spectrum
+        start = 0 if freq_min is None else max(0, int(math.ceil(
+            (freq_min - self.spectrum.freq_min) / self.spectrum.point_spacing - 1E-9)))
+        stop = len(arr) if freq_max is None else min(len(arr), int(math.floor(
+            (freq_max - self.spectrum.freq_min) / self.spectrum.point_spacing + 1E-9)) + 1)
+        for block in range(start, stop, self.block_rows):
+            rows = arr[block:min(block + self.block_rows, stop)]
+            for freq, intensity in zip(
+                    np.round(rows[:, 0], 4).tolist(), rows[:, self.spec_num].tolist()):
+                yield freq, intensity
+
+
+def read_spectrum(file, cols=None, cache=True):
+    """
+    Return array of a *.ft or *.prn spectrum, using SPECTRUM_CACHE when possible.
+
+    Parameters:
+        file (str):
+            Spectrum file path.
+        cols (list of int):
+            Columns to read.
+            Default: None (all columns)
+        cache (bool):
+            If False, always parse the text file and do not write to the cache.
+            Default: True
+    Returns:
+        spectrum (array):
+            Memory-mapped (copy-on-write) if loaded from the cache.
+    """
+    if cache:
+        arr = SPECTRUM_CACHE.load(file, cols)
+        if arr is not None:
+            return arr
+    arr = pd.read_csv(file, sep=' ', header=None, usecols=cols).values
+    if cache:
+        SPECTRUM_CACHE.store(file, cols, arr)
+    return arr
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max decimation of one spectrum, for plotting.
+
+    Level 0 is the full spectrum. Every following level merges factor blocks of the previous
+    level, keeping the index of the minimum and maximum of each block, until a level has at most
+    min_points blocks. A level drawn as (min, max) pairs has the same envelope as the full
+    spectrum, and each extreme is drawn at its own frequency, so peaks stay visible and in place
+    at every zoom. view() picks the finest level that covers a frequency range in at most
+    max_points points, so the cost of a redraw depends on the plot width, not on the length of
+    the spectrum.
+
+    Parameters:
+        x (array):
+            Frequency. Must be increasing.
+        y (array):
+            Intensity.
+        factor (int):
+            Blocks merged per level.
+            Default: 4
+        min_points (int):
+            Length of the coarsest level.
+            Default: 1024
+    Methods:
+        view(x_min, x_max, max_points)
+            Return x, y of the finest level covering x_min to x_max in max_points or fewer.
+    """
+
+    def __init__(self, x, y, factor=None, min_points=None):
+        if factor is None:
+            factor = 4
+        if min_points is None:
+            min_points = 1024
+        self.x0 = np.asarray(x)
+        self.y0 = np.asarray(y)
+        # Per level: first frequency of each block, and indices of its minimum and maximum.
+        # Level 0 is the spectrum itself, so its indices are not stored.
+        self.x = [self.x0]
+        self.low = [None]
+        self.high = [None]
+        while len(self.x[-1]) > min_points:
+            starts = np.arange(0, len(self.x[-1]), factor)
+            self.x.append(self.x[-1][starts])
+            self.low.append(self._merge(self.low[-1], factor, np.argmin, np.inf))
+            self.high.append(self._merge(self.high[-1], factor, np.argmax, -np.inf))
+
+    def _merge(self, index, factor, arg, fill):
+        """ Return index of the extreme of every factor consecutive blocks of a level. """
+        size = len(self.y0) if index is None else len(index)
+        num = -(-size // factor)
+        values = np.full(num * factor, fill)
+        values[:size] = self.y0 if index is None else self.y0[index]
+        pick = arg(values.reshape((num, factor)), axis=1) + np.arange(0, num * factor, factor)
+        return pick if index is None else index[pick]
+
+    def view(self, x_min=None, x_max=None, max_points=None):
+        """
+        Return decimated spectrum between x_min and x_max.
+
+        One point beyond each end of the range is included, so lines reach the plot edges.
+        Decimated levels return two points per block, the minimum and the maximum, each at its
+        own frequency and in frequency order, and end with the last point of the spectrum.
+
+        Parameters:
+            x_min (float):
+                Lower bound.
+                Units: MHz
+                Default: first frequency
+            x_max (float):
+                Upper bound.
+                Units: MHz
+                Default: last frequency
+            max_points (int):
+                Maximum number of points returned, unless the coarsest level holds more.
+                Default: 4000
+        Returns:
+            x (array):
+                Frequency.
+            y (array):
+                Intensity.
+        """
+        if max_points is None:
+            max_points = 4000
+        for level, x in enumerate(self.x):
+            start = 0 if x_min is None else max(np.searchsorted(x, x_min, 'right') - 1, 0)
+            stop = len(x) if x_max is None else min(np.searchsorted(x, x_max, 'right') + 1, len(x))
+            if level == 0:
+                if stop - start <= max_points:
+                    return x[start:stop], self.y0[start:stop]
+            elif 2 * (stop - start) <= max_points or level == len(self.x) - 1:
+                break
+        low = self.low[level][start:stop]
+        high = self.high[level][start:stop]
+        # The last block is closed with the last point, so lines reach the end of the spectrum.
+        end = int(stop == len(x))
+        index = np.empty(2 * (stop - start) + end, dtype=low.dtype)
+        index[0:2 * (stop - start):2] = np.minimum(low, high)
+        index[1:2 * (stop - start):2] = np.maximum(low, high)
+        if end:
+            index[-1] = len(self.x0) - 1
+        return self.x0[index], self.y0[index]
+
+
 class Spectrum(FID):
     """
     Class for rotational spectra.
 
-    Accepted file types include: *.ft, *.prn, and *.txt
+    Accepted file types include: *.ft, *.prn, *.mtx, and *.txt
         - Default extension of experimental spectra is *.ft
         - Default extension of simulated spectra is *.prn
         - Default edtension of raw time data is *.txt
+        - Binary time data (*.fid) is handled the same as *.txt.
+        - *.ft and *.prn files are cached in binary form after the first load. See SpectrumCache.
+        - Binary spectra matrices (*.mtx) written by build_matrix() or write_matrix() are
+            memory-mapped. Their file names are stored in self.fnames.
         - Class inherits from FID class, so if a *.txt file is passed as the file arg,
             an FFT of the file is performed and used as the spectrum. Be sure to pass the
             relevant **kwargs for the fft if you want params other than the defaults.
@@ -606,9 +2603,20 @@ class Spectrum(FID):
         cols (list of int):
             columns to extract from file.
             Default: None
+        dtype (str):
+            'float64' or 'float32'. dtype of self.spectrum, and precision of the FFT for time
+            data. See FID.dtype for float32 accuracy.
+            Default: 'float64'
+        cache (bool):
+            Load *.ft and *.prn files through SPECTRUM_CACHE. See SpectrumCache.
+            Default: True
+        kwargs:
+            srate and FID.quick_fft() parameters, used for time data.
     Attributes:
         fname (str):
             file path
+        fnames (list of str):
+            File name of each spectrum column. *.mtx only, otherwise None.
         spectrum (array):
             col[0] -> frequency
             col[1] -> intensity spec 1
@@ -627,15 +2635,23 @@ class Spectrum(FID):
             Units: mV
     Methods:
         freq_to_row(freq)
-            Return the closest row number associated with freq.
+            Return the closest row number associated with freq. Accepts arrays.
         row_to_freq(row)
-            Return the frequency associated with the row.
-        get_intensity(freq, spec_num)
-            Return the intensity of the spectrum at freq.
+            Return the frequency associated with the row. Accepts arrays.
+        get_intensity(freq, spec_num, fill)
+            Return the intensity of the spectrum at freq. Accepts arrays of frequencies and lists
+            of columns.
+        get_window(freqs, before, after, spec_num, fill, matrix)
+            Return intensities in a window of points around each frequency.
         spectrum_dictionary(spec_num)
-            Return spectrum as a dictionary using frequencies as keys and intensities as vals.
+            Return spectrum as a mapping (SpectrumView) with frequencies as keys and intensities
+            as vals.
+        pyramid(spec_num)
+            Return min/max decimation pyramid (MinMaxPyramid) of a spectrum, for plotting.
         peak_pick(thresh, dyn_range, sort, spec_num)
             Perform a peak pick on the spectrum.
+        pick_peaks(thresh, dyn_range, noise_mult, noise_window, columns, prominence, width)
+            Peak pick every spectrum of the matrix. Return structured array.
         peak_pick_sequence_measurement(matrix, thresh)
             Perform a peak pick on matrix of multiple spectra.
         simulate_peak_pick(thresh, dyn_rang, freq_min, freq_max, step_size, fwhm,
@@ -651,16 +2667,30 @@ class Spectrum(FID):
             Use with spectra matrix. Normalize transition intensity across columns of the matrix.
     """
 
-    def __init__(self, file, cols=None, **kwargs):
+    def __init__(self, file, cols=None, dtype=None, cache=True, **kwargs):
         self.fname = file
+        self.dtype = processing_dtype(dtype)
+        self.fnames = None
+        self._pyramids = {}
         ext = os.path.splitext(file)[1]
-        if ext in ['.ft', '.prn']:
-            self.spectrum = pd.read_csv(file, sep=' ', header=None, usecols=cols).values
-        elif ext == '.txt':
-            fid = FID(file)
-            fid.gate_kaiser_zeropad(**kwargs)
-            self.spectrum = fid.fft(fid, **kwargs)
-        self.point_spacing = self.spectrum[1, 0] - self.spectrum[0, 0]
+        if ext == '.mtx':
+            self.fnames, matrix = read_matrix(file)
+            self.spectrum = matrix.view(np.ndarray)
+            if dtype is not None and self.spectrum.dtype != self.dtype:
+                self.spectrum = self.spectrum.astype(self.dtype)
+        elif ext in ['.ft', '.prn']:
+            self.spectrum = read_spectrum(file, cols=cols, cache=cache)
+            if dtype is not None:
+                self.spectrum = self.spectrum.astype(self.dtype)
+        elif ext in ['.txt', '.fid']:
+            fid = FID(file, srate=kwargs.pop('srate', None), dtype=self.dtype)
+            self.spectrum = fid.quick_fft(**kwargs)
+        if self.spectrum.dtype == np.float32:
+            # Spacing of two float32 frequencies is only good to ~1%. Use the full span.
+            self.point_spacing = float(self.spectrum[-1, 0] - self.spectrum[0, 0]) / (
+                len(self.spectrum) - 1)
+        else:
+            self.point_spacing = self.spectrum[1, 0] - self.spectrum[0, 0]
         self.freq_min = self.spectrum[0, 0]
         self.freq_max = self.spectrum[-1, 0]
         self.max_intensity = [
@@ -671,52 +2701,131 @@ class Spectrum(FID):
         Return closest row number associated with the provided frequency.
 
         Parameters:
-            freq (float):
-                frequency
+            freq (float or array):
+                frequency, or array of frequencies.
         Return:
-            row (int):
-                row index corresponding to the provided frequency.
+            row (int or array of int):
+                row index corresponding to the provided frequency. Array if freq is an array.
+                Rows are not bounds checked.
         """
-        row = int(round((freq - self.freq_min) / self.point_spacing))
-        return row
+        if np.ndim(freq) == 0:
+            row = int(round((freq - self.freq_min) / self.point_spacing))
+            return row
+        rows = np.rint((np.asarray(freq, dtype=float) - self.freq_min) / self.point_spacing)
+        return rows.astype(int)
 
     def row_to_freq(self, row):
         """
         Return frequency associated with the provided row number.
 
         Parameters:
-            row (int):
-                row index
+            row (int or array of int):
+                row index, or array of row indices.
         Returns:
-            freq (float):
+            freq (float or array):
                 frequency corresponding to the provided row index.
         """
-        freq = round((row * self.point_spacing) + self.freq_min, 4)
-        return freq
+        if np.ndim(row) == 0:
+            freq = round((row * self.point_spacing) + self.freq_min, 4)
+            return freq
+        return np.round(np.asarray(row) * self.point_spacing + self.freq_min, 4)
 
-    def get_intensity(self, freq, spec_num=None):
+    def _checked_rows(self, freqs, fill):
+        """
+        Return rows of freqs and mask of rows inside the spectrum.
+
+        Raise IndexError for rows outside the spectrum if fill is None.
+        """
+        rows = self.freq_to_row(freqs)
+        in_bounds = (rows >= 0) & (rows < len(self.spectrum))
+        if fill is None and not np.all(in_bounds):
+            raise IndexError('Frequency outside of spectrum ({} - {} MHz).'.format(
+                self.freq_min, self.freq_max))
+        return np.where(in_bounds, rows, 0), in_bounds
+
+    def get_intensity(self, freq, spec_num=None, fill=None):
         """
         Return spectrum intensity at the provided frequency.
 
         Parameters:
-            freq (float):
-                frequency
+            freq (float or array):
+                frequency, or array of frequencies.
                 Units: MHz
-            spec_num (int):
+            spec_num (int or list of int):
                 Used to specify which column, i.e. which spectrum, to get intensity from if the file
                 is a matrix of multiple spectra. For example, spec_num=1 would give the intensity of
-                the first spectrum in the matrix.
+                the first spectrum in the matrix. A list gathers several columns at once.
                 Default: 1
+            fill (float):
+                Intensity returned for frequencies outside the spectrum. If None, IndexError is
+                raised instead.
+                Default: None
         Return:
-            intensity (float):
+            intensity (float or array):
                 spectral intensity at provided frequency.
+                Shape (len(freq),) for an array of frequencies, (len(freq), len(spec_num)) if
+                spec_num is a list.
         """
         if spec_num is None:
             spec_num = 1
-        num = self.freq_to_row(freq)
-        intensity = self.spectrum[num, spec_num]
+        if np.ndim(freq) == 0 and fill is None:
+            num = self.freq_to_row(freq)
+            intensity = self.spectrum[num, spec_num]
+            return intensity
+        rows, in_bounds = self._checked_rows(np.atleast_1d(freq), fill)
+        intensity = self.spectrum[rows][:, spec_num]
+        if fill is not None:
+            intensity = np.asarray(intensity, dtype=float)
+            intensity[~in_bounds] = fill
+        if np.ndim(freq) == 0:
+            return intensity[0]
         return intensity
 
+    def get_window(self, freqs, before, after=None, spec_num=None, fill=None, matrix=None):
+        """
+        Return intensities in a window of rows around each frequency.
+
+        Parameters:
+            freqs (float or array):
+                Center frequencies.
+                Units: MHz
+            before (int):
+                Number of points before each center.
+            after (int):
+                Number of points after each center.
+                Default: before
+            spec_num (int or list of int):
+                Column(s) of the matrix. 0 is frequency.
+                Default: all columns
+            fill (float):
+                Value returned for points outside the spectrum. If None, IndexError is raised
+                instead.
+                Default: None
+            matrix (array):
+                Spectra matrix. col[0] freq. col[1:] intensity.
+                Default: self.spectrum
+        Returns:
+            window (array):
+                Shape (len(freqs), before + after + 1) if spec_num is an int, otherwise
+                (len(freqs), before + after + 1, number of columns).
+        """
+        if matrix is None:
+            matrix = self.spectrum
+        if after is None:
+            after = before
+        if spec_num is None:
+            spec_num = slice(None)
+        rows = self.freq_to_row(np.atleast_1d(freqs))[:, None] + np.arange(-before, after + 1)
+        in_bounds = (rows >= 0) & (rows < len(matrix))
+        if fill is None and not np.all(in_bounds):
+            raise IndexError('Window extends outside of spectrum ({} - {} MHz).'.format(
+                self.freq_min, self.freq_max))
+        window = matrix[np.where(in_bounds, rows, 0)][..., spec_num]
+        if fill is not None:
+            window = np.asarray(window, dtype=float)
+            window[~in_bounds] = fill
+        return window
+
     def spectrum_dictionary(self, spec_num=None):
         """
         Return dictionary with frequencies as keys and intensities as vals.
@@ -728,14 +2837,31 @@ class Spectrum(FID):
                 spectrum in the matrix as a attributes.
                 Default: 1
         Return:
-            dictionary (attributes):
-                dictionary of self.spectrum.
+            dictionary (SpectrumView):
+                Read-only mapping of self.spectrum. Looked up arithmetically, nothing is copied.
         """
-        spec_num = spec_num if spec_num is not None else 1
-        dictionary = {}
-        for x in range(len(self.spectrum)):
-            dictionary[round(self.spectrum[x, 0], 4)] = self.spectrum[x, spec_num]
-        return dictionary
+        return SpectrumView(self, spec_num)
+
+    def pyramid(self, spec_num=None):
+        """
+        Return min/max decimation pyramid of a spectrum, for plotting. See MinMaxPyramid.
+
+        Built on the first call and cached, so later calls are free. The pyramid reflects
+        self.spectrum at the time of the first call.
+
+        Parameters:
+            spec_num (int):
+                Column of the spectrum.
+                Default: 1
+        Return:
+            pyramid (MinMaxPyramid)
+        """
+        if spec_num is None:
+            spec_num = 1
+        if spec_num not in self._pyramids:
+            self._pyramids[spec_num] = MinMaxPyramid(
+                self.spectrum[:, 0], self.spectrum[:, spec_num])
+        return self._pyramids[spec_num]
 
     def peak_pick(self, thresh=None, dyn_range=None, sort=False, spec_num=None):
         """
@@ -769,28 +2895,29 @@ class Spectrum(FID):
                     list of peaks sorted from highest to lowest intensity.
         """
         spec_num = spec_num if spec_num is not None else 1
-        if thresh is None:
-            if dyn_range is None:
-                raise ValueError('Must provide either intensity threshold or dynamic range.')
-            else:
-                param = self.max_intensity[spec_num - 1] / dyn_range
-        else:
-            param = thresh
-        peaks, _ = scipy.signal.find_peaks(self.spectrum[:, spec_num], param)
+        if thresh is None and dyn_range is None:
+            raise ValueError('Must provide either intensity threshold or dynamic range.')
+        peaks = self.pick_peaks(thresh=thresh, dyn_range=dyn_range, columns=[spec_num])
         if sort is False:
-            pp = {}
-            for x in peaks:
-                pp[self.spectrum[x, 0]] = self.spectrum[x, spec_num]
+            pp = dict(zip(peaks['freq'].tolist(), peaks['intensity'].tolist()))
         else:
-            freqs = []
-            intens = []
-            for x in peaks:
-                freqs.append(self.spectrum[x, 0])
-                intens.append(self.spectrum[x, spec_num])
-            pp = np.column_stack((freqs, intens))
+            pp = np.column_stack((peaks['freq'], peaks['intensity']))
             pp = pp[(-pp[:, 1]).argsort()]
         return pp
 
+    def pick_peaks(self, thresh=None, dyn_range=None, noise_mult=None, noise_window=None,
+                   columns=None, prominence=False, width=False):
+        """
+        Peak pick all spectra in self.spectrum at once. See pick_peaks() for parameters.
+
+        Returns:
+            peaks (structured array):
+                dtype PEAK_DTYPE. Fields row, freq, intensity, column, prominence, width.
+        """
+        return pick_peaks(
+            self.spectrum, thresh=thresh, dyn_range=dyn_range, noise_mult=noise_mult,
+            noise_window=noise_window, columns=columns, prominence=prominence, width=width)
+
     def peak_pick_sequence_measurement(self, matrix=None, thresh=None):
         """
         Perform peak pick for sequence of spectra. Used for time evolution and temperature ramp.
@@ -808,47 +2935,43 @@ class Spectrum(FID):
                 Units: mV.
                 Default: None
         Returns:
-            full_pp (array):
-                Matrix of all identified peaks. Frequency and intensity in all spectra.
-                col[0] freq. col[1:] intensity.
+            final_pp (list of int):
+                Rows of all identified peaks. Isolated rows in ascending order, followed by the
+                strongest row of each run of consecutive rows.
         """
         if matrix is None:
             matrix = self.spectrum
         if thresh is None:
             thresh = 0.001
 
-        full_pp = []
-        for x in range(1, matrix.shape[1]):
-            signal = matrix[:, x]
-            peaks, _ = scipy.signal.find_peaks(signal, thresh)
-            for peak in peaks:
-                full_pp.append(peak)
-                if peak % 2 == 0:
-                    full_pp.append(peak + 1)
-        full_pp = list(dict.fromkeys(full_pp))
-        full_pp = sorted(full_pp)
-
-        plus_minus_one = []
-        good_for_final = []
-        for x in range(len(full_pp) - 1):
-            if int(full_pp[x] + 1) == int(full_pp[x + 1]):
-                plus_minus_one.append(full_pp[x])
-                plus_minus_one.append(full_pp[x + 1])
-            elif int(full_pp[x] + 1) != int(full_pp[x + 1]) and int(full_pp[x] - 1) != int(
-                    full_pp[x - 1]):
-                good_for_final.append(full_pp[x])
-        plus_minus_one = sorted(list(dict.fromkeys(plus_minus_one)))
-
-        consecutives = []
-        for k, g in groupby(enumerate(plus_minus_one), lambda ix: ix[0] - ix[1]):
-            consecutives.append(list(map(itemgetter(1), g)))
-        final_pp = good_for_final
-        for x in consecutives:
-            freq_x = [self.row_to_freq(y) for y in x]
-            high_point = self.signal_max(
-                freq_x, matrix=matrix, delta_freq=0, mode='group')
-            final_pp.append(self.freq_to_row(float(high_point[0, 0])))
-        return final_pp
+        # Every peak of every column, plus the following row of peaks on even rows.
+        rows = pick_peaks(matrix, thresh=thresh)['row']
+        full_pp = np.unique(np.concatenate((rows, rows[rows % 2 == 0] + 1)))
+        if len(full_pp) < 2:
+            return []
+
+        # Rows adjacent to the next or previous picked row form runs of consecutive rows.
+        # Isolated rows are final as they are. The last picked row is never isolated-final.
+        next_adjacent = np.diff(full_pp) == 1
+        prev_adjacent = np.concatenate(([False], next_adjacent))
+        next_adjacent = np.append(next_adjacent, False)
+        in_run = next_adjacent | prev_adjacent
+        isolated = ~in_run
+        isolated[-1] = False
+        good_for_final = full_pp[isolated]
+
+        # Each run is replaced by the first row holding the run maximum, across all spectra.
+        run_rows = full_pp[in_run]
+        if len(run_rows) == 0:
+            return good_for_final.tolist()
+        starts = np.flatnonzero(in_run[in_run] & ~prev_adjacent[in_run])
+        envelope = matrix[run_rows, 1:].max(axis=1)
+        run_max = np.maximum.reduceat(envelope, starts)
+        lengths = np.diff(np.append(starts, len(run_rows)))
+        position = np.arange(len(run_rows))
+        position = np.where(envelope == np.repeat(run_max, lengths), position, len(run_rows))
+        run_peaks = run_rows[np.minimum.reduceat(position, starts)]
+        return good_for_final.tolist() + run_peaks.tolist()
 
     def simulate_peak_pick(self, thresh=None, dyn_range=None, freq_min=None, freq_max=None,
                            step_size=None, fwhm=None, scale_factor=None, spec_num=None):
@@ -895,7 +3018,7 @@ class Spectrum(FID):
                 simulation of the peak pick.
         """
         pp = self.peak_pick(thresh=thresh, dyn_range=dyn_range, spec_num=spec_num, sort=False)
-        pp_array = np.column_stack((list(pp.keys()), list(pp.vals())))
+        pp_array = np.column_stack((list(pp.keys()), list(pp.values())))
         sim = simulate_spectrum(
             pp_array, freq_min=freq_min, freq_max=freq_max, step_size=step_size, fwhm=fwhm,
             scale_factor=scale_factor, save=False)
@@ -906,7 +3029,7 @@ class Spectrum(FID):
         Create submatrix rows corresponding to the freqs input.
 
         Parameters:
-            freqs (list):
+            freqs (list or array):
                 list of frequecies.
             matrix (array):
                 Spectra matrix. col[0] freq. col[1:] intensity.
@@ -917,10 +3040,7 @@ class Spectrum(FID):
         """
         if matrix is None:
             matrix = self.spectrum
-        submatrix = np.zeros((len(freqs), matrix.shape[1]))
-        for x in range(len(freqs)):
-            row = self.freq_to_row(freqs[x])
-            submatrix[x, :] = matrix[row, :]
+        submatrix = matrix[self.freq_to_row(np.asarray(freqs, dtype=float)), :]
         return submatrix
 
     def signal_max(self, freqs, matrix=None, delta_freq=None, mode='singles'):
@@ -934,6 +3054,8 @@ class Spectrum(FID):
         signal in the buffered region is taken as the accepted frequency.
         Three values are returned: the accepted frequency, the intensity of the strongest signal,
         and the column number (i.e. spectrum) containing the strongest signal.
+        In singles mode, all windows are reduced together through a strided view of the matrix, so
+        thousands of frequencies are evaluated at once.
 
         Parameters:
             freqs (list or array):
@@ -964,37 +3086,43 @@ class Spectrum(FID):
             matrix = self.spectrum
         if delta_freq is None:
             delta_freq = 0
-        if type(freqs) != list:
-            freqs = [freqs]
-        else:
-            freqs = sorted(freqs)
-        if mode == 'singles':
-            pass
-        elif mode == 'group':
-            freqs = [freqs]
-
-        freq = []
-        intensity = []
-        spectrum = []
         pos_buffer = int(round(delta_freq / self.point_spacing) + 1)
         neg_buffer = int(round(delta_freq / self.point_spacing))
-        for x in freqs:
-            if mode == 'singles':
-                target_row = self.freq_to_row(x)
-                with_freq = matrix[target_row - neg_buffer:target_row + pos_buffer, :]
-            elif mode == 'group':
-                upper_row = self.freq_to_row(x[-1])
-                lower_row = self.freq_to_row(x[0])
-                with_freq = matrix[lower_row - neg_buffer:upper_row + pos_buffer, :]
-            without_freq = with_freq[:, 1:]
-            col_shape = np.shape(without_freq)[1]
-            flattened_without_freq = without_freq.flatten()
-            max_index = np.argmax(flattened_without_freq, axis=0)
-            max_row = math.floor(max_index / col_shape)
-            max_col_with_freq = max_index % col_shape + 1
-            freq.append(with_freq[max_row, 0])
-            intensity.append(with_freq[max_row, max_col_with_freq])
-            spectrum.append(max_col_with_freq)
+        if mode == 'group':
+            freqs = sorted(freqs) if isinstance(freqs, (list, np.ndarray)) else [freqs]
+            upper_row = self.freq_to_row(freqs[-1])
+            lower_row = self.freq_to_row(freqs[0])
+            high_point = _window_max(matrix, lower_row - neg_buffer, upper_row + pos_buffer)
+            return np.array([high_point], dtype=float)
+
+        freqs = np.sort(np.atleast_1d(np.asarray(freqs, dtype=float)))
+        starts = np.atleast_1d(self.freq_to_row(freqs)) - neg_buffer
+        length = neg_buffer + pos_buffer
+        freq = np.zeros(len(freqs), dtype=matrix.dtype)
+        intensity = np.zeros(len(freqs), dtype=matrix.dtype)
+        spectrum = np.zeros(len(freqs), dtype=int)
+
+        # Windows inside the matrix are reduced together through a strided view, in blocks of
+        # about SIGNAL_MAX_BLOCK values. Windows crossing the ends keep python slice semantics.
+        inside = (starts >= 0) & (starts + length <= len(matrix))
+        for x in np.flatnonzero(~inside):
+            freq[x], intensity[x], spectrum[x] = _window_max(matrix, starts[x], starts[x] + length)
+        inside = np.flatnonzero(inside)
+        if len(inside):
+            values = matrix[:, 1:]
+            num_cols = values.shape[1]
+            windows = np.lib.stride_tricks.as_strided(
+                values, shape=(len(values) - length + 1, length, num_cols),
+                strides=(values.strides[0],) + values.strides, writeable=False)
+            block = max(1, SIGNAL_MAX_BLOCK // (length * num_cols))
+            for first in range(0, len(inside), block):
+                index = inside[first:first + block]
+                flat = windows[starts[index]].reshape((len(index), -1))
+                max_index = np.argmax(flat, axis=1)
+                rows = starts[index] + max_index // num_cols
+                freq[index] = matrix[rows, 0]
+                intensity[index] = flat[np.arange(len(index)), max_index]
+                spectrum[index] = max_index % num_cols + 1
         high_points = np.column_stack((freq, intensity, spectrum))
         high_points = np.array(high_points[(-high_points[:, 1]).argsort()])
         return high_points
@@ -1004,11 +3132,11 @@ class Spectrum(FID):
         Use with matrix of spectra. Normalize transition intensity across the columns of the matrix.
 
         Parameters:
-            freq (float):
-                Transition frequency.
+            freq (float or array):
+                Transition frequency, or array of frequencies.
                 Units: MHz
         Returns:
-            norm_intensities (array):
+            norm_intensities (list or array):
                 col[0]
                     Frequency.
                     Units: MHz
@@ -1017,7 +3145,13 @@ class Spectrum(FID):
                     Units: mV
                 col[2:]
                     Remaining columns contain normalized intensities.
+                List for a single frequency. 2-D array, one row per frequency, for an array.
         """
+        if np.ndim(freq) != 0:
+            freq = np.asarray(freq, dtype=float)
+            intensities = self.spectrum[self.freq_to_row(freq), 1:]
+            max_intensity = np.max(intensities, axis=1)
+            return np.column_stack((freq, max_intensity, intensities / max_intensity[:, None]))
         row = self.freq_to_row(freq)
         intensities = self.spectrum[row, 1:]
         norm_intensities = []
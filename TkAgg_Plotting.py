@@ -9,6 +9,7 @@ from matplotlib.figure import Figure
 import matplotlib.patches as patches
 from mpl_toolkits.mplot3d import Axes3D
 from Pages.Settings import Settings
+from Spectrum import MinMaxPyramid
 
 color_dict = {None: None, 'None': None, 'none': None,
               'black': '0', '0': '0',
@@ -23,6 +24,9 @@ color_dict = {None: None, 'None': None, 'none': None,
               'lime': 'lime', 'gold': 'gold', 'teal': 'teal',
               'salmon': 'salmon', 'darkblue': 'darkblue', 'sienna': 'sienna'}
 
+# Series longer than this are drawn decimated. See plot_line().
+DECIMATE_POINTS = 20000
+
 
 class SpecPlot:
     """
@@ -49,6 +53,8 @@ class SpecPlot:
             Line weight of data series.
         legend (tk.StringVar):
             Displayed phrase in plot legend.
+        pyramid (MinMaxPyramid):
+            Decimation pyramid of the data series, used for plotting. See plot_line().
     """
 
     def __init__(self, subplot, fpath=None, show=None, invert=None, scale=None,
@@ -82,6 +88,8 @@ class SpecPlot:
         self.legend = tk.StringVar()
         self.legend.set(legend) if legend is not None else None
 
+        self.pyramid = None
+
 
 class PlotManager(SpecPlot):
     """
@@ -284,7 +292,7 @@ class PlotManager(SpecPlot):
             self.toolbar.update()
 
     def plot_line(self, x, y, invert=False, scale_factor=None, color=None, marker=None, weight=None,
-                  label=None, linestyle=None, picker=None):
+                  label=None, linestyle=None, picker=None, pyramid=None):
         """
         Plot a data series on a plot Figure.
 
@@ -292,10 +300,10 @@ class PlotManager(SpecPlot):
         """
         plot_line(
             self.ax, x, y, invert=invert, scale=scale_factor, color=color, marker=marker,
-            weight=weight, label=label, linestyle=linestyle, picker=picker)
+            weight=weight, label=label, linestyle=linestyle, picker=picker, pyramid=pyramid)
 
     def plot_lines(self, x, y, invert=None, scale=None, color=None, marker=None, weight=None,
-                   label=None, linestyle=None, picker=None):
+                   label=None, linestyle=None, picker=None, pyramid=None):
         """
         Plot multiple data series on a plot Figure.
 
@@ -303,7 +311,7 @@ class PlotManager(SpecPlot):
         """
         plot_lines(
             self.ax, x, y, invert=invert, scale=scale, color=color, marker=marker, weight=weight,
-            label=label, linestyle=linestyle, picker=picker)
+            label=label, linestyle=linestyle, picker=picker, pyramid=pyramid)
 
     def scatter_3d_single(self, x, y, z, color=None, marker=None, label=None):
         """
@@ -482,13 +490,18 @@ def plot_labels(
 
 
 def plot_line(ax, x, y, invert=False, scale=None, color=None, marker=None,
-              weight=None, label=None, linestyle=None, picker=None):
+              weight=None, label=None, linestyle=None, picker=None, pyramid=None):
     """
     Plot a single data series on a plot Figure.
 
     For an instance of PlotManager, run plot.ax.cla() before running this function. Run
     plot.canvas.draw() and plot.toolbar.update() after running this fuction.
 
+    Series longer than DECIMATE_POINTS with increasing x are drawn from a min/max pyramid (see
+    Spectrum.MinMaxPyramid). Only about 2 points per pixel of the current x-range are drawn, and
+    the line is redecimated when the x-axis limits change, so peaks stay visible and redraws do
+    not slow down with the length of the series.
+
     Parameters:
         ax (matplotlib axes):
             axes object.
@@ -513,6 +526,8 @@ def plot_line(ax, x, y, invert=False, scale=None, color=None, marker=None,
         picker (int):
             Makes the series selectable. Mouse can be this many pixels away from feature and still
             select.
+        pyramid (MinMaxPyramid):
+            Prebuilt pyramid of x, y, such as Spectrum.pyramid(). Built here if None and needed.
     """
     if type(x) is list:
         x = np.array(x)
@@ -521,37 +536,47 @@ def plot_line(ax, x, y, invert=False, scale=None, color=None, marker=None,
     if invert:  # Inverts spectrum
         if scale in [None, 1]:  # Inverted but no additional scale factor applied
             scale = -1
-            y = y * scale
-        else:
-            if scale > 0:  # Inverted with positive scale factor
-                scale = scale * -1
-                y = y * scale
-            else:  # Inverted with negative scale factor
-                y = y * scale
+        elif scale > 0:  # Inverted with positive scale factor
+            scale = scale * -1
     else:  # Upright spectrum
         if scale in [None, 1]:  # Upright with no scale factor applied
-            y = y
-        else:  # Upright with scale factor applied
-            if scale > 0:  # Upright with positive scale factor applied
-                y = y * scale
-            else:
-                scale = scale * -1
-                y = y * scale
+            scale = 1
+        elif scale < 0:  # Upright with negative scale factor applied
+            scale = scale * -1
+    color = color_dict[color]
+    if pyramid is None and len(x) > DECIMATE_POINTS and np.all(np.diff(x) > 0):
+        pyramid = MinMaxPyramid(x, y)
+    if pyramid is not None:
+        x, y = pyramid.view(max_points=decimate_points(ax))
+        line2d, = ax.plot(
+            x, y * scale, color=color, marker=marker, linewidth=weight, label=label,
+            picker=picker, linestyle=linestyle)
+
+        def redecimate(ax):
+            x_min, x_max = sorted(ax.get_xlim())
+            x, y = pyramid.view(x_min, x_max, max_points=decimate_points(ax))
+            line2d.set_data(x, y * scale)
+
+        # ax.cla() replaces ax.callbacks, so callbacks of cleared lines are dropped with them.
+        ax.callbacks.connect('xlim_changed', redecimate)
+        return line2d
+    if scale != 1:
+        y = y * scale
     if len(y) == 1:  # I believe this was necessary for plotting a single point (think omitted point).
         y = [y, y]
-    else:
-        y = y
     if len(x) == 1:  # I believe this was necessary for plotting a single point (think omitted point).
         x = [x, x]
-    else:
-        x = x
-    color = color_dict[color]
     line2d, = ax.plot(
         x, y, color=color, marker=marker, linewidth=weight, label=label, picker=picker,
         linestyle=linestyle)
     return line2d
 
 
+def decimate_points(ax):
+    """ Return number of points drawn by decimated lines: 2 per pixel of the axes width. """
+    return 2 * max(int(ax.get_window_extent().width), 100)
+
+
 def plot_histogram(ax, data, bins=None, border=True, color=None, plot_mean=True):
     """
     Plot histogram with common histogram options.
@@ -779,7 +804,7 @@ def scatter_3d_multiple(ax, x, y, z, color=None, marker=None, label=None):
 
 
 def plot_lines(ax, x, y, invert=None, scale=None, color=None, marker=None, weight=None, label=None,
-               linestyle=None, picker=None):
+               linestyle=None, picker=None, pyramid=None):
     """
     Plot a multiple series on the same plot Figure.
 
@@ -810,6 +835,8 @@ def plot_lines(ax, x, y, invert=None, scale=None, color=None, marker=None, weigh
         picker (list of ints):
             Makes the series selectable. Mouse can be this many pixels away from feature and still
             select.
+        pyramid (list of MinMaxPyramid):
+            Prebuilt pyramids of the series. See plot_line().
     """
     if invert is None:
         invert = [None for x in range(len(x))]
@@ -827,10 +854,12 @@ def plot_lines(ax, x, y, invert=None, scale=None, color=None, marker=None, weigh
         linestyle = [None for x in range(len(x))]
     if picker is None:
         picker = [None for x in range(len(x))]
+    if pyramid is None:
+        pyramid = [None for x in range(len(x))]
     for s in range(len(x)):
         plot_line(
             ax, x[s], y[s], invert[s], scale[s], color[s], marker[s], weight[s], label[s],
-            linestyle[s], picker[s])
+            linestyle[s], picker[s], pyramid[s])
 
 
 def manual_axis_zoom(ax, axis, min=None, max=None, ticks=None):
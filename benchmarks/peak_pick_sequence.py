@@ -0,0 +1,206 @@
+"""
+Author: Channing West
+Changelog: 10/17/2026
+
+Benchmark and equivalence check of Spectrum.peak_pick_sequence_measurement().
+
+legacy_peak_pick_sequence() is the row-by-row implementation the vectorized method replaced. Both
+are run on synthetic spectra matrices (gaussian noise plus sparse lines, 0.0125 MHz spacing) and
+must return the same rows in the same order.
+
+Run from the repository root:
+    python benchmarks/peak_pick_sequence.py
+    python benchmarks/peak_pick_sequence.py --trials 200 --rows 20000 200000 480000 --cols 100
+"""
+
+import os
+import sys
+import gc
+import math
+import time
+import argparse
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+import numpy as np
+import scipy.signal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Spectrum
+
+
+def synthetic_matrix(rows, cols, rng, ties=False):
+    """
+    Return spectra matrix of noise plus sparse lines.
+
+    Parameters:
+        rows (int):
+            Number of frequency points.
+        cols (int):
+            Number of spectra.
+        rng (np.random.Generator):
+            Random number generator.
+        ties (bool):
+            Round intensities to 0.01 mV, so equal neighbouring intensities are common.
+            Default: False
+    Returns:
+        matrix (array):
+            col[0] freq. col[1:] intensity.
+            Units: MHz and mV
+    """
+    freqs = 2000 + np.arange(rows) * 0.0125
+    noise = np.abs(rng.normal(0, 0.0003, (rows, cols)))
+    lines = (rng.random((rows, cols)) < 0.002) * rng.random((rows, cols)) * 0.05
+    intensity = noise + lines
+    if ties:
+        intensity = np.round(intensity, 2)
+    return np.column_stack((freqs, intensity))
+
+
+def legacy_peak_pick_sequence(matrix, thresh=None):
+    """
+    Row-by-row peak pick of a spectra matrix, as in Spectrum.peak_pick_sequence_measurement()
+    before it was vectorized. Includes the group mode of signal_max() and the row/frequency
+    conversions it used.
+
+    Parameters:
+        matrix (array):
+            Spectra matrix. col[0] freq. col[1:] intensity.
+        thresh (float):
+            threshold.
+            Units: mV.
+            Default: 0.001
+    Returns:
+        final_pp (list of int):
+            Rows of all identified peaks.
+    """
+    if thresh is None:
+        thresh = 0.001
+    freq_min = matrix[0, 0]
+    point_spacing = matrix[1, 0] - matrix[0, 0]
+
+    full_pp = []
+    for x in range(1, matrix.shape[1]):
+        signal = matrix[:, x]
+        peaks, _ = scipy.signal.find_peaks(signal, thresh)
+        for peak in peaks:
+            full_pp.append(peak)
+            if peak % 2 == 0:
+                full_pp.append(peak + 1)
+    full_pp = list(dict.fromkeys(full_pp))
+    full_pp = sorted(full_pp)
+
+    plus_minus_one = []
+    good_for_final = []
+    for x in range(len(full_pp) - 1):
+        if int(full_pp[x] + 1) == int(full_pp[x + 1]):
+            plus_minus_one.append(full_pp[x])
+            plus_minus_one.append(full_pp[x + 1])
+        elif int(full_pp[x] + 1) != int(full_pp[x + 1]) and int(full_pp[x] - 1) != int(
+                full_pp[x - 1]):
+            good_for_final.append(full_pp[x])
+    plus_minus_one = sorted(list(dict.fromkeys(plus_minus_one)))
+
+    consecutives = []
+    for k, g in groupby(enumerate(plus_minus_one), lambda ix: ix[0] - ix[1]):
+        consecutives.append(list(map(itemgetter(1), g)))
+    final_pp = good_for_final
+    for x in consecutives:
+        freq_x = [round((y * point_spacing) + freq_min, 4) for y in x]
+        lower_row = int(round((freq_x[0] - freq_min) / point_spacing))
+        upper_row = int(round((freq_x[-1] - freq_min) / point_spacing))
+        with_freq = matrix[lower_row:upper_row + 1, :]
+        without_freq = with_freq[:, 1:]
+        col_shape = np.shape(without_freq)[1]
+        max_index = np.argmax(without_freq.flatten(), axis=0)
+        max_row = math.floor(max_index / col_shape)
+        final_pp.append(int(round((float(with_freq[max_row, 0]) - freq_min) / point_spacing)))
+    return final_pp
+
+
+def spectrum_from_matrix(matrix, directory):
+    """ Write matrix to a *.mtx file in directory and return it loaded as a Spectrum. """
+    fname = os.path.join(directory, 'synthetic.mtx')
+    Spectrum.write_matrix(fname, matrix, ['spec_{}'.format(x) for x in range(matrix.shape[1] - 1)])
+    return Spectrum.Spectrum(fname)
+
+
+def check_equivalence(trials, rng, directory):
+    """
+    Compare both implementations on random matrices. Return number of mismatched trials.
+
+    Parameters:
+        trials (int):
+            Number of random matrices.
+        rng (np.random.Generator):
+            Random number generator.
+        directory (str):
+            Folder for the temporary *.mtx file.
+    """
+    mismatches = 0
+    for trial in range(trials):
+        rows = int(rng.integers(100, 20000))
+        cols = int(rng.integers(1, 12))
+        matrix = synthetic_matrix(rows, cols, rng, ties=trial % 4 == 0)
+        spec = spectrum_from_matrix(matrix, directory)
+        new = spec.peak_pick_sequence_measurement()
+        del spec
+        gc.collect()
+        old = legacy_peak_pick_sequence(matrix)
+        if [int(x) for x in old] != [int(x) for x in new]:
+            mismatches += 1
+            print('Mismatch:  trial {}, {} rows x {} spectra'.format(trial, rows, cols))
+    return mismatches
+
+
+def benchmark(rows_list, cols, rng, directory):
+    """
+    Print run time of both implementations for each number of rows.
+
+    Parameters:
+        rows_list (list of int):
+            Numbers of frequency points.
+        cols (int):
+            Number of spectra.
+        rng (np.random.Generator):
+            Random number generator.
+        directory (str):
+            Folder for the temporary *.mtx file.
+    """
+    print('{:>8} {:>6} {:>10} {:>10} {:>8} {:>6}'.format(
+        'rows', 'cols', 'legacy s', 'new s', 'speedup', 'equal'))
+    for rows in rows_list:
+        matrix = synthetic_matrix(rows, cols, rng)
+        spec = spectrum_from_matrix(matrix, directory)
+        start = time.perf_counter()
+        new = spec.peak_pick_sequence_measurement()
+        new_time = time.perf_counter() - start
+        del spec
+        gc.collect()
+        start = time.perf_counter()
+        old = legacy_peak_pick_sequence(matrix)
+        old_time = time.perf_counter() - start
+        equal = [int(x) for x in old] == [int(x) for x in new]
+        print('{:>8} {:>6} {:>10.3f} {:>10.3f} {:>7.1f}x {:>6}'.format(
+            rows, cols, old_time, new_time, old_time / new_time, str(equal)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--trials', type=int, default=200, help='random equivalence trials')
+    parser.add_argument('--rows', type=int, nargs='+', default=[20000, 200000, 480000],
+                        help='benchmark matrix lengths')
+    parser.add_argument('--cols', type=int, default=100, help='benchmark number of spectra')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        mismatches = check_equivalence(args.trials, rng, directory)
+        print('Equivalence:  {} of {} random matrices match'.format(
+            args.trials - mismatches, args.trials))
+        benchmark(args.rows, args.cols, rng, directory)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
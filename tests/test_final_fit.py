@@ -0,0 +1,43 @@
+"""
+Tests of the gaussian line center fit in Pages/FinalFit.py.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip('matplotlib')
+pytest.importorskip('tkinter')
+import Spectrum
+from Pages import FinalFit
+
+
+def spectrum_with_lines(tmp_path, centers):
+    """ Return Spectrum of gaussian lines at centers on a 2000-2010 MHz, 0.0125 MHz grid. """
+    freqs = 2000 + np.arange(801) * 0.0125
+    intensity = sum(FinalFit.gaussian(freqs, 1.0, center, 0.06) for center in centers)
+    fname = str(tmp_path / 'lines.ft')
+    np.savetxt(fname, np.column_stack((freqs, intensity)), fmt=['%.4f', '%.8f'])
+    return Spectrum.Spectrum(fname, cache=False)
+
+
+def test_fit_centers_lines_at_spectrum_edges(tmp_path):
+    # First row, between rows, and last row. Edge windows hold only 3 of the 5 points.
+    centers = [2000.0, 2005.005, 2010.0]
+    spectrum = spectrum_with_lines(tmp_path, centers)
+    centered, max_intensity = FinalFit.fit_centers(spectrum, centers)
+    assert len(centered) == 3
+    assert len(max_intensity) == 3
+    np.testing.assert_allclose(centered, centers, atol=0.001)
+
+
+def test_fit_centers_line_outside_spectrum(tmp_path):
+    spectrum = spectrum_with_lines(tmp_path, [2005.0])
+    centered, max_intensity = FinalFit.fit_centers(spectrum, [2005.0, 2011.0])
+    assert centered[1] == 2011.0
+    assert len(max_intensity) == 1
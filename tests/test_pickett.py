@@ -0,0 +1,66 @@
+"""
+Tests of SPCAT *.cat parsing in Pickett.py.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Pickett
+
+
+def cat_row(freq, qns, gup=' 15'):
+    """ Return one *.cat line. qns is a list of 12 two character quantum number fields. """
+    return '%13.4f%8.4f%8.4f%2d%10.4f%3s%7d%4d' % (
+        freq, 0.0123, -3.5, 3, 12.3456, gup, -12345, 303) + ''.join(qns)
+
+
+def write_cat(path, rows):
+    path.write_text('\n'.join(rows) + '\n')
+    return str(path)
+
+
+def test_read_cat_decodes_spcat_letter_codes(tmp_path):
+    rows = [
+        cat_row(5000.1, ['A0', ' 3', '97', '  ', '  ', '  ', '99', ' 2', '98', '  ', '  ', '  ']),
+        cat_row(4000.2, [' 5', ' 3', ' 2', '  ', '  ', '  ', ' 4', 'a1', ' 1', '  ', '  ', '  '],
+                gup='A00'),
+        cat_row(3500.3, ['Z9', ' 0', 'b5', ' 1', ' 2', ' 3', ' 4', ' 2', ' 1', ' 1', ' 2', '-3'])]
+    lines = Pickett.read_cat(write_cat(tmp_path / 'encoded.cat', rows))
+    assert lines['freq'].tolist() == [3500.3, 4000.2, 5000.1]
+    assert lines['N1'].tolist() == [359, 5, 100]
+    assert lines['Kc1'].tolist() == [-25, 2, 97]
+    assert lines['Ka0'].tolist() == [2, -11, 2]
+    assert lines['gup'].tolist() == [15, 1000, 15]
+    assert lines['F0'][0] == -3
+    assert np.isnan(lines['J1'][1])
+    line = Pickett.Cat(str(tmp_path / 'encoded.cat')).dict[5000.1][0]
+    assert (line['N1'], line['Ka1'], line['Kc1']) == (100, 3, 97)
+
+
+def test_read_cat_numeric_fields_match_genfromtxt(tmp_path):
+    rows = [cat_row(2000 + x * 1.5, [' 5', ' 3', ' 2', '  ', '  ', '  ', ' 4', ' 2', ' 1', '  ',
+                                      '  ', '  ']) for x in range(5)]
+    fname = write_cat(tmp_path / 'numeric.cat', rows)
+    lines = Pickett.read_cat(fname)
+    expected = np.genfromtxt(fname, delimiter=[w for name, w, dtype in Pickett.CAT_FIELDS])
+    for col, name in enumerate(Pickett.CAT_DTYPE.names):
+        np.testing.assert_array_equal(lines[name].astype(float), expected[:, col])
+
+
+def test_read_cat_rejects_blank_integer_field(tmp_path):
+    qns = [' 5', ' 3', '  ', '  ', '  ', '  ', ' 4', ' 2', ' 1', '  ', '  ', '  ']
+    rows = [cat_row(3000.1, [' 5', ' 3', ' 2'] + qns[3:]), cat_row(3000.2, qns)]
+    with pytest.raises(ValueError, match='line 2:  Kc1 field is blank'):
+        Pickett.read_cat(write_cat(tmp_path / 'blank.cat', rows))
+
+
+def test_read_cat_rejects_unparseable_field(tmp_path):
+    row = cat_row(3000.1, [' 5', ' 3', ' 2', '  ', '  ', '  ', ' 4', ' 2', ' 1', '  ', '  ', '  '])
+    with pytest.raises(ValueError, match='line 1:  cannot parse freq field'):
+        Pickett.read_cat(write_cat(tmp_path / 'bad.cat', [row.replace('3000.1000', '3000.1x00')]))